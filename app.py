@@ -1,27 +1,70 @@
-from decimal import Decimal
-from flask import Flask,request,jsonify
+import click
+import base64
+import io
+import json
+import os
+import tempfile
+import uuid
+from datetime import date, datetime
+from flask import Flask,Response,request,jsonify,stream_with_context
+from flask.cli import with_appcontext
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from config import Config
-from models import Income, Investment, db,Expense,User,Currency
+from models import Income, Investment, db,Expense,User,Currency,RecurringRule,RecurringException,Transaction
 from flask_cors import CORS
-from flask_bcrypt import Bcrypt
 from flask_login import LoginManager, current_user, login_required,login_user,logout_user
-from customExceptions import InternalServerException
+from customExceptions import InternalServerException, ValidationException, HashingOverloadedException, WriteBehindFullException
+from queries import totalsByTypeAndCurrency, listingQuery, userExists, availableCurrencies
+from search import searchQuery
+from validation import parseRangeArgs, parseUserId, parseTransaction, parsePageArgs, parseTimeseriesArgs, parseSearchArgs, parseRecurring, encodeCursor, encodeSearchCursor, decodeSearchCursor
+from ingest import insertTransactions
+from rollups import totalInRange, dailyTotals, bucketTotals, rebuildRollups
+from rates import convertTotals, loadRates
+import metrics
+from caches import userCache
+from routing import readReplica, noteWrite
+from responseCache import cachedResponse, noteWrittenUsers
+import writeBehind
+import partitions
+from money import amountExponents, amountOf, jsonAmount, defaultExponent, unitScale
+from models import MINOR_UNITS
+from encoders import dumps, negotiate
+import exports
+import imports
+import profiling
+import timeseries
+import userStats
+import recurring
+from werkzeug.wsgi import wrap_file
 from flask_migrate import Migrate
-from datetime import datetime
 
 app= Flask(__name__)
 CORS(app,supports_credentials=True)
 app.config.from_object(Config)
 
 db.init_app(app)
-bcrypt=Bcrypt(app)
 login_manager=LoginManager(app)
 migrate = Migrate(app,db)
 
+@app.errorhandler(ValidationException)
+def handleValidationException(e):
+    return jsonify({'error':e.message}),e.status
+
+@app.errorhandler(HashingOverloadedException)
+def handleHashingOverloadedException(e):
+    return jsonify({'error':'Server is busy, try again shortly'}),503,{'Retry-After':'1'}
+
+@app.errorhandler(WriteBehindFullException)
+def handleWriteBehindFullException(e):
+    return jsonify({'error':'Too many writes are pending, try again shortly'}),503,{'Retry-After':'1'}
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(user_id)
+    user_id = parseUserId(user_id)
+    if user_id is None:
+        return None
+    return userCache.get(user_id)
 
 def usernameExists(username):
     if User.query.filter_by(name=username).first():
@@ -62,7 +105,10 @@ def login():
 
         user = User.query.filter_by(name=username).first()
         if user and user.checkPlainText(plainText):
-            if login_user(user) :
+            if user.hashNeedsUpgrade():
+                user.setHashText(plainText)
+                db.session.commit()
+            if login_user(userCache.put(user)) :
                 return jsonify({"message": "Logged in successfully."}), 200
             return jsonify({"message": "Invalid username or password."}), 401
         return jsonify({'error':'Failed login as user is inactive'}),403
@@ -88,319 +134,711 @@ def get_current_user():
     }
     return jsonify(user), 200
 
-@app.route('/addExpense',methods=['POST'])
-@login_required
-def addExpense():
+def payloadUser(data):
+    user_id = parseUserId(data.get('user'))
+    if user_id is None or not userExists(user_id):
+        raise ValidationException('User not found',404)
+    return user_id
 
+def addTransaction(model,noun):
     data = request.get_json()
-
     if data is None:
         return jsonify({'error':'No data is provided'}),400
-    
 
-    user_id=data.get('user')
-    amount=data.get('amount')
-    currency=data.get('currency')
-    date=data.get('date')
-    description = data.get('description', '')
+    user_id = payloadUser(data)
+    row = parseTransaction(data,noun,availableCurrencies([data.get('currency')]),amountExponents())
+    row['user_id'] = user_id
 
-    if user_id is None :
-        return jsonify({'error':'User not found'}),404
-    if User.query.filter_by(id=user_id).first() is None:
-        return jsonify({'error':'User not found'}),404
-    if amount is None:
-        amount=0
-    if currency is None:
-        return jsonify({'error':'Currency is required'}),400
-    if Currency.query.filter_by(currency=currency).first() is None:
-        return jsonify({'error': 'Selected currency not available'}),500
-    if date:
+    if app.config['WRITE_BEHIND_ENABLED']:
+        writeBehind.enqueue(model,[row])
+        noteWrite()
+        return jsonify({'message':f'{noun.capitalize()} queued'}),202
+
+    insertTransactions(model,[row])
+    db.session.commit()
+    noteWrite()
+    return jsonify({'message':f'{noun.capitalize()} added'}),201
+
+def addTransactions(model,noun):
+    """Batch variant of addTransaction for {'user': ..., 'records': [...]} payloads.
+
+    The user and every currency are validated once for the whole batch and all
+    valid records go in with one INSERT. Invalid records are reported per index
+    and do not stop the others from being added.
+    """
+    data = request.get_json()
+    if data is None:
+        return jsonify({'error':'No data is provided'}),400
+
+    user_id = payloadUser(data)
+    records = data.get('records')
+    if not isinstance(records,list) or not records:
+        return jsonify({'error':'Records are required'}),400
+    if len(records) > app.config['MAX_BATCH_SIZE']:
+        return jsonify({'error':f"At most {app.config['MAX_BATCH_SIZE']} records are allowed per batch"}),413
+
+    currencies = availableCurrencies(record.get('currency') for record in records if isinstance(record,dict))
+    exponents = amountExponents()
+    results = []
+    rows = []
+    for index,record in enumerate(records):
         try:
-            date=datetime.fromisoformat(date)
-            print(date)
-        except ValueError:
-            return jsonify({'error':'Invalid date format'}),400
-    else :
-        return jsonify({'error':'Date of expense is required'}),400
+            if not isinstance(record,dict):
+                raise ValidationException('Invalid record')
+            row = parseTransaction(record,noun,currencies,exponents)
+        except ValidationException as e:
+            results.append({'index':index,'status':'error','error':e.message})
+            continue
+        row['user_id'] = user_id
+        rows.append(row)
+        results.append({'index':index,'row':row})
+
+    if app.config['WRITE_BEHIND_ENABLED']:
+        writeBehind.enqueue(model,rows)
+        accepted,status = 'queued',202
+    else:
+        insertTransactions(model,rows)
+        db.session.commit()
+        accepted,status = 'created',201
+    noteWrite()
+
+    for result in results:
+        if 'row' in result:
+            result['id'] = str(result.pop('row')['id'])
+            result['status'] = accepted
+    failed = len(results)-len(rows)
+    if failed:
+        status = 207
+    return jsonify({accepted:len(rows),'failed':failed,'results':results}),status
+
+def rangeTotalResponse(model,key):
+    """Total of model over the requested range, converted when target_currency is given."""
+    data = request.get_json()
+    user_id,start_date,end_date = parseRangeArgs(data)
+    target_currency = data.get('target_currency')
 
-    expense= Expense(user_id=user_id,amount=Decimal(amount),currency=currency,date=date,description=description)
+    identity = model.__mapper__.polymorphic_identity
 
-    db.session.add(expense)
-    db.session.commit()
-    return jsonify({'message':'Expense added'}),201
+    if target_currency is None:
+        total = totalInRange(model,user_id,start_date,end_date)+recurring.recurringTotal(identity,user_id,start_date,end_date)
+        return jsonify({'user_id':user_id,key:jsonAmount(total)}),200
+
+    if not availableCurrencies([target_currency]):
+        return jsonify({'error':'Selected currency not available'}),400
+    rows = dailyTotals(model,user_id,start_date,end_date)+recurring.dailyOccurrences(identity,user_id,start_date,end_date)
+    total = convertTotals(rows,target_currency)
+    return jsonify({'user_id':user_id,key:total,'currency':target_currency}),200
+
+@app.route('/addExpense',methods=['POST'])
+@login_required
+def addExpense():
+    return addTransaction(Expense,'expense')
+
+@app.route('/addExpenses',methods=['POST'])
+@login_required
+def addExpenses():
+    return addTransactions(Expense,'expense')
 
 @app.route('/getExpense',methods=['GET'])
 @login_required
+@cachedResponse
+@readReplica
 def getExpense():
     try:
-        data = request.get_json()
-        if data is None:
-            return jsonify({'error':'No data is provided'}),400
-        user_id = data.get('user_id')
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
-        
-        
-        if user_id is None :
-            return jsonify({'error':'User not found'}),404
-        
-        if start_date is None or end_date is None:
-            return jsonify({'error': 'Start date and end date are required.'}), 400
-        
-        try:
-            start_date = datetime.fromisoformat(start_date)
-            end_date = datetime.fromisoformat(end_date)
-        except ValueError:
-            return jsonify({'error':'Datetime format is wrong'}),400
-        
-        total_expense = db.session.query(db.func.sum(Expense.amount)).filter(
-            Expense.user_id==user_id,
-            Expense.date>=start_date,
-            Expense.date<=end_date
-            ).scalar()
-        
-        if total_expense is None:
-            total_expense = 0
-        return jsonify({'user_id':user_id,'total_expense':float(total_expense)}),200
-        
-
+        return rangeTotalResponse(Expense,'total_expense')
     except InternalServerException:
         return jsonify({'error':'Internal server error'}),500
 
 @app.route('/addIncome',methods=['POST'])
 @login_required
 def addIncome():
+    return addTransaction(Income,'income')
 
-    data = request.get_json()
+@app.route('/addIncomes',methods=['POST'])
+@login_required
+def addIncomes():
+    return addTransactions(Income,'income')
 
+@app.route('/getIncome',methods=['GET'])
+@login_required
+@cachedResponse
+@readReplica
+def getIncome():
+    try:
+        return rangeTotalResponse(Income,'total_income')
+    except InternalServerException:
+        return jsonify({'error':'Internal server error'}),500
+
+@app.route('/addInvestment',methods=['POST'])
+@login_required
+def addInvestment():
+    return addTransaction(Investment,'investment')
+
+@app.route('/addInvestments',methods=['POST'])
+@login_required
+def addInvestments():
+    return addTransactions(Investment,'investment')
+
+@app.route('/getInvestment',methods=['GET'])
+@login_required
+@cachedResponse
+@readReplica
+def getInvestment():
+    try:
+        return rangeTotalResponse(Investment,'total_investment')
+    except InternalServerException:
+        return jsonify({'error':'Internal server error'}),500
+
+def ownedRule(user_id,rule_id):
+    rule_id = parseUserId(rule_id)
+    rule = db.session.get(RecurringRule,rule_id) if rule_id is not None else None
+    if rule is None or rule.user_id != user_id:
+        raise ValidationException('Recurring rule not found',404)
+    return rule
+
+def ruleJson(rule):
+    return {
+        'id':str(rule.id),
+        'type':rule.type,
+        'amount':jsonAmount(amountOf(rule.amount,rule.currency)),
+        'currency':rule.currency,
+        'description':rule.description,
+        'start':rule.start.isoformat(),
+        'rrule':recurring.formatRecurrenceRule(rule),
+    }
+
+@app.route('/addRecurring',methods=['POST'])
+@login_required
+def addRecurring():
+    """Add a transaction repeating on an RRULE schedule such as 'FREQ=MONTHLY;COUNT=12'.
+
+    Payload keys are those of /addExpense plus type ('expense', 'income' or
+    'investment') and rrule; date is the first occurrence. Occurrences are
+    not stored but expanded into the get* totals, /summary and /getAll.
+    """
+    data = request.get_json()
     if data is None:
         return jsonify({'error':'No data is provided'}),400
-    
 
-    user_id=data.get('user')
-    amount=data.get('amount')
-    currency=data.get('currency')
-    date=data.get('date')
-    description = data.get('description', '')
+    user_id = payloadUser(data)
+    columns = parseRecurring(data,availableCurrencies([data.get('currency')]),amountExponents())
+    rule = RecurringRule(id=uuid.uuid4(),user_id=user_id,**columns)
+    db.session.add(rule)
+    noteWrittenUsers(db.session,{user_id})
+    db.session.commit()
+    noteWrite()
+    return jsonify({'message':f"Recurring {columns['type']} added",'id':str(rule.id)}),201
 
-    if user_id is None :
-        return jsonify({'error':'User not found'}),404
-    if User.query.filter_by(id=user_id).first() is None:
+@app.route('/getRecurring',methods=['GET'])
+@login_required
+@readReplica
+def getRecurring():
+    """The user's recurring rules, oldest first."""
+    data = request.get_json()
+    if data is None:
+        return jsonify({'error':'No data is provided'}),400
+    user_id = parseUserId(data.get('user_id'))
+    if user_id is None:
         return jsonify({'error':'User not found'}),404
-    if amount is None:
-        amount=0
-    if currency is None:
-        return jsonify({'error':'Currency is required'}),400
-    if Currency.query.filter_by(currency=currency).first() is None:
-        return jsonify({'error': 'Selected currency not available'}),500
-    if date:
-        try:
-            date=datetime.fromisoformat(date)
-            print(date)
-        except ValueError:
-            return jsonify({'error':'Invalid date format'}),400
-    else :
-        return jsonify({'error':'Date of income is required'}),400
+    rules = RecurringRule.query.filter_by(user_id=user_id).order_by(RecurringRule.start,RecurringRule.id)
+    return jsonify({'user_id':user_id,'rules':[ruleJson(rule) for rule in rules]}),200
 
-    income= Income(user_id=user_id,amount=Decimal(amount),currency=currency,date=date,description=description)
+@app.route('/editOccurrence',methods=['POST'])
+@login_required
+def editOccurrence():
+    """Change or delete one occurrence of a recurring rule.
+
+    Payload keys: user, rule_id and occurrence, the occurrence's scheduled
+    date. With delete set to true the occurrence is dropped; otherwise it is
+    materialized as an ordinary transaction with the rule's values, replaced
+    by whichever of amount, currency, date and description are given.
+    Either way the rule stops expanding it. Each occurrence can be changed
+    once; the materialized transaction is a regular one from then on.
+    """
+    data = request.get_json()
+    if data is None:
+        return jsonify({'error':'No data is provided'}),400
 
-    db.session.add(income)
+    user_id = payloadUser(data)
+    rule = ownedRule(user_id,data.get('rule_id'))
+    try:
+        occurrence = datetime.fromisoformat(data.get('occurrence'))
+    except (TypeError,ValueError):
+        raise ValidationException('Invalid occurrence date')
+    if recurring.occurrenceIndex(rule,occurrence) is None:
+        raise ValidationException('No occurrence of this rule at that date')
+    if db.session.get(RecurringException,(rule.id,occurrence)) is not None:
+        raise ValidationException('Occurrence was already changed',409)
+    delete = data.get('delete',False)
+    if not isinstance(delete,bool):
+        raise ValidationException('Delete must be true or false')
+
+    exception = RecurringException(rule_id=rule.id,occurrence=occurrence)
+    if not delete:
+        record = {
+            'amount':data.get('amount',str(amountOf(rule.amount,rule.currency))),
+            'currency':data.get('currency',rule.currency),
+            'date':data.get('date',occurrence.isoformat()),
+            'description':data.get('description',rule.description),
+        }
+        row = parseTransaction(record,rule.type,availableCurrencies([record['currency']]),amountExponents())
+        row['user_id'] = user_id
+        insertTransactions(Transaction.__mapper__.polymorphic_map[rule.type].class_,[row])
+        exception.transaction_id = row['id']
+    db.session.add(exception)
+    noteWrittenUsers(db.session,{user_id})
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise ValidationException('Occurrence was already changed',409)
+    noteWrite()
+    if delete:
+        return jsonify({'message':'Occurrence deleted'}),200
+    return jsonify({'message':'Occurrence materialized','id':str(exception.transaction_id)}),201
+
+@app.route('/endRecurring',methods=['POST'])
+@login_required
+def endRecurring():
+    """Stop a recurring rule after until (an ISO datetime); occurrences after it disappear, earlier ones stay."""
+    data = request.get_json()
+    if data is None:
+        return jsonify({'error':'No data is provided'}),400
+
+    user_id = payloadUser(data)
+    rule = ownedRule(user_id,data.get('rule_id'))
+    try:
+        until = datetime.fromisoformat(data.get('until'))
+    except (TypeError,ValueError):
+        raise ValidationException('Invalid until date')
+    if until < rule.start:
+        raise ValidationException('Until is before the first occurrence')
+    if rule.until is None or until < rule.until:
+        rule.until = until
+    noteWrittenUsers(db.session,{user_id})
     db.session.commit()
-    return jsonify({'message':'Income added'}),201
+    noteWrite()
+    return jsonify({'message':'Recurring rule ended','rule':ruleJson(rule)}),200
+
+LISTING_COLUMNS = ('date','amount','currency','description','transactionType')
+
+def transactionRows(rows):
+    """LISTING_COLUMNS tuples of listingQuery rows, ready for any response encoder."""
+    if not MINOR_UNITS:
+        return [row[1:] for row in rows]
+    return [(row.date,jsonAmount(amountOf(row.amount,row.currency)),row.currency,row.description,row.transactionType) for row in rows]
+
+def streamTransactions(query,ndjson,merge=None):
+    """Encode query rows incrementally, fetching them in STREAM_BATCH_SIZE chunks from a server-side cursor.
+
+    merge, if given, re-cuts the stream of batches, e.g. to merge in recurring occurrences.
+    """
+    batches = db.session.execute(query.statement.execution_options(yield_per=app.config['STREAM_BATCH_SIZE'])).partitions()
+    if merge is not None:
+        batches = merge(batches)
+    if ndjson:
+        for batch in batches:
+            with profiling.encoding():
+                chunk = b''.join(dumps(dict(zip(LISTING_COLUMNS,row)))+b'\n' for row in transactionRows(batch))
+            yield chunk
+        return
+    separator = b'['
+    for batch in batches:
+        with profiling.encoding():
+            chunk = b','.join(dumps(dict(zip(LISTING_COLUMNS,row))) for row in transactionRows(batch))
+        yield separator+chunk
+        separator = b','
+    yield b'[]' if separator == b'[' else b']'
 
-@app.route('/getIncome',methods=['GET'])
+@app.route('/getAll', methods=['GET'])
 @login_required
-def getIncome():
+@cachedResponse
+@readReplica
+def get_all():
+    """All transactions in the range ordered by date, recurring occurrences included.
+
+    Optional payload keys: limit and cursor page through the listing by
+    (date, id), returning {'items': [...], 'next_cursor': ...}; stream set to
+    'json' or 'ndjson' streams the range, or the page limit and cursor select,
+    instead of building it in memory.
+    Unstreamed listings are encoded in the format the Accept header asks for,
+    see encoders.py.
+    """
     try:
         data = request.get_json()
-        if data is None:
-            return jsonify({'error':'No data is provided'}),400
-        user_id = data.get('user_id')
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
-        
-        if user_id is None :
-            return jsonify({'error':'User not found'}),404
-        
-        if start_date is None or end_date is None:
-            return jsonify({'error': 'Start date and end date are required.'}), 400
-        
-        try:
-            start_date = datetime.fromisoformat(start_date)
-            end_date = datetime.fromisoformat(end_date)
-        except ValueError:
-            return jsonify({'error':'Datetime format is wrong'}),400
-        
-        total_income = db.session.query(db.func.sum(Income.amount)).filter(
-            Income.user_id==user_id,
-            Income.date>=start_date,
-            Income.date<=end_date
-            ).scalar()
-        
-        if total_income is None:
-            total_income = 0
-        return jsonify({'user_id':user_id,'total_income':float(total_income)}),200
-        
+        user_id,start_date,end_date = parseRangeArgs(data)
+        limit,after = parsePageArgs(data,app.config['MAX_PAGE_SIZE'])
+        stream = data.get('stream')
+        if stream not in (None,'json','ndjson'):
+            return jsonify({'error':'Stream must be json or ndjson'}),400
+
+        query = listingQuery(user_id,start_date,end_date,after=after,limit=limit)
+        rules = recurring.rulesInRange(user_id,start_date,end_date)
+
+        if stream is not None:
+            mimetype = 'application/x-ndjson' if stream == 'ndjson' else 'application/json'
+            merge = None
+            if rules:
+                merge = lambda batches: recurring.mergeBatches(batches,rules,start_date,end_date,app.config['STREAM_BATCH_SIZE'],after,limit)
+            return Response(stream_with_context(streamTransactions(query,stream == 'ndjson',merge)),mimetype=mimetype),200
+
+        result = query.all()
+        if rules:
+            result = recurring.mergeListing(result,rules,start_date,end_date,after,limit)
+        encoder = negotiate(request.accept_mimetypes)
+        extra = None
+        if limit is not None or after is not None:
+            extra = {'next_cursor':encodeCursor(result[-1]) if len(result) == limit else None}
+        with profiling.encoding():
+            body = encoder.encode(LISTING_COLUMNS,transactionRows(result),extra)
+        return Response(body,mimetype=encoder.mimetype,headers={'Vary':'Accept'}),200
 
     except InternalServerException:
         return jsonify({'error':'Internal server error'}),500
 
-@app.route('/addInvestment',methods=['POST'])
+@app.route('/summary', methods=['GET'])
 @login_required
-def addInvestment():
-
-    data = request.get_json()
+@cachedResponse
+@readReplica
+def getSummary():
+    """Expense, income and investment totals plus net balance in one query.
+
+    net_balance is income minus expenses and investments. Recurring
+    occurrences in the range are counted in.
+    """
+    try:
+        user_id,start_date,end_date = parseRangeArgs(request.get_json())
 
-    if data is None:
-        return jsonify({'error':'No data is provided'}),400
-    
+        rows = [(row.transactionType,row.currency,row.total) for row in totalsByTypeAndCurrency(user_id,start_date,end_date)]
+        rows += [(transactionType,currency,total) for (transactionType,currency),(total,_) in recurring.recurringTotals(user_id,start_date,end_date).items()]
 
-    user_id=data.get('user')
-    amount=data.get('amount')
-    currency=data.get('currency')
-    date=data.get('date')
-    description = data.get('description', '')
+        totals = {'expense':0,'income':0,'investment':0}
+        by_currency = {}
+        for transactionType,currency,stored in rows:
+            total = amountOf(stored,currency)
+            totals[transactionType] += total
+            currency_totals = by_currency.setdefault(currency,{'expense':0,'income':0,'investment':0})
+            currency_totals[transactionType] += total
 
-    if user_id is None :
-        return jsonify({'error':'User not found'}),404
-    if User.query.filter_by(id=user_id).first() is None:
-        return jsonify({'error':'User not found'}),404
-    if amount is None:
-        amount=0
-    if currency is None:
-        return jsonify({'error':'Currency is required'}),400
-    if Currency.query.filter_by(currency=currency).first() is None:
-        return jsonify({'error': 'Selected currency not available'}),500
-    if date:
-        try:
-            date=datetime.fromisoformat(date)
-            print(date)
-        except ValueError:
-            return jsonify({'error':'Invalid date format'}),400
-    else :
-        return jsonify({'error':'Date of investment is required'}),400
+        def withNet(values,currency=None):
+            result = {'total_'+key:jsonAmount(value,currency) for key,value in values.items()}
+            result['net_balance'] = jsonAmount(values['income']-values['expense']-values['investment'],currency)
+            return result
 
-    investment = Investment(user_id=user_id,amount=Decimal(amount),currency=currency,date=date,description=description)
+        summary = withNet(totals)
+        summary['user_id'] = user_id
+        summary['by_currency'] = {currency:withNet(values,currency) for currency,values in by_currency.items()}
+        return jsonify(summary),200
 
-    db.session.add(investment)
-    db.session.commit()
-    return jsonify({'message':'Investment added'}),201
+    except InternalServerException:
+        return jsonify({'error':'Internal server error'}),500
 
-@app.route('/getInvestment',methods=['GET'])
+@app.route('/timeseries', methods=['GET'])
 @login_required
-def getInvestment():
+@cachedResponse
+@readReplica
+def getTimeseries():
+    """Totals per day, week, month or year for each transaction type and currency.
+
+    Optional payload keys: granularity ('day', 'week', 'month' (default) or
+    'year'), moving_average, a number of periods to average each series
+    over, and running_balance, true to add the cumulative income minus
+    expenses and investments per currency since start_date. Every series has
+    one value per entry of buckets, the first days of the periods. Recurring
+    occurrences are counted in the periods they fall in.
+    """
     try:
         data = request.get_json()
-        if data is None:
-            return jsonify({'error':'No data is provided'}),400
-        user_id = data.get('user_id')
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
-        
-        if user_id is None :
-            return jsonify({'error':'User not found'}),404
-        
-        if start_date is None or end_date is None:
-            return jsonify({'error': 'Start date and end date are required.'}), 400
-        
-        try:
-            start_date = datetime.fromisoformat(start_date)
-            end_date = datetime.fromisoformat(end_date)
-        except ValueError:
-            return jsonify({'error':'Datetime format is wrong'}),400
-        
-        total_investment = db.session.query(db.func.sum(Investment.amount)).filter(
-            Investment.user_id==user_id,
-            Investment.date>=start_date,
-            Investment.date<=end_date
-            ).scalar()
-        
-        if total_investment is None:
-            total_investment = 0
-        return jsonify({'user_id':user_id,'total_investment':float(total_investment)}),200
-        
+        user_id,start_date,end_date = parseRangeArgs(data)
+        granularity,window,runningBalance = parseTimeseriesArgs(data)
+        if timeseries.bucketCount(granularity,start_date,end_date) > app.config['MAX_TIMESERIES_BUCKETS']:
+            return jsonify({'error':f"At most {app.config['MAX_TIMESERIES_BUCKETS']} periods are allowed, use a coarser granularity"}),400
+
+        periods = timeseries.bucketRanges(granularity,start_date,end_date)
+        rows = bucketTotals(user_id,start_date,end_date,granularity)+recurring.recurringBucketTotals(user_id,periods)
+        body = timeseries.buildSeries(rows,[period[0] for period in periods],window,runningBalance)
+        return jsonify({'user_id':user_id,'granularity':granularity,**body}),200
 
     except InternalServerException:
         return jsonify({'error':'Internal server error'}),500
 
-@app.route('/getAll', methods=['GET'])
+SEARCH_COLUMNS = LISTING_COLUMNS+('score',)
+
+@app.route('/search', methods=['GET'])
 @login_required
-def get_all():
+@cachedResponse
+@readReplica
+def searchTransactions():
+    """The user's transactions whose description matches every word of query, best match first.
+
+    Optional payload keys: start_date, end_date and type ('expense',
+    'income' or 'investment') narrow the results; limit (default
+    SEARCH_PAGE_SIZE) and cursor page through them, returning
+    {'items': [...], 'next_cursor': ...} in the format the Accept header
+    asks for. Each item carries the match score it was ranked by. Words
+    match as prefixes, see search.py.
+    """
     try:
         data = request.get_json()
-        if data is None:
-            return jsonify({'error':'No data is provided'}),400
-        user_id = data.get('user_id')
-        start_date = data.get('start_date')
-        end_date = data.get('end_date')
+        user_id,terms,start_date,end_date,transactionType = parseSearchArgs(data)
+        limit,after = parsePageArgs(data,app.config['MAX_PAGE_SIZE'],decodeSearchCursor)
+        if limit is None:
+            limit = app.config['SEARCH_PAGE_SIZE']
+
+        result = searchQuery(user_id,terms,start_date,end_date,transactionType,after=after,limit=limit).all()
+        rows = [(*values[:len(LISTING_COLUMNS)],row.score) for row,values in zip(result,transactionRows(result))]
+        encoder = negotiate(request.accept_mimetypes)
+        extra = {'next_cursor':encodeSearchCursor(result[-1]) if len(result) == limit else None}
+        with profiling.encoding():
+            body = encoder.encode(SEARCH_COLUMNS,rows,extra)
+        return Response(body,mimetype=encoder.mimetype,headers={'Vary':'Accept'}),200
 
+    except InternalServerException:
+        return jsonify({'error':'Internal server error'}),500
 
-        
-        if user_id is None :
-            return jsonify({'error':'User not found'}),404
-        
-        if start_date is None or end_date is None:
-            return jsonify({'error': 'Start date and end date are required.'}), 400
-        
+@app.route('/export', methods=['GET'])
+@login_required
+@readReplica
+def exportTransactions():
+    """All of a user's transactions as a CSV, Arrow IPC or Parquet file.
+
+    Payload keys: user_id, format ('csv', 'arrow' or 'parquet', default csv)
+    and optionally since, the X-Export-Watermark of a previous export, to only
+    get rows added after it. The file is written batch by batch into a
+    temporary file and then streamed back with its row count and SHA-256.
+    """
+    data = request.get_json()
+    if data is None:
+        return jsonify({'error':'No data is provided'}),400
+    user_id = parseUserId(data.get('user_id'))
+    if user_id is None or not userExists(user_id):
+        return jsonify({'error':'User not found'}),404
+    exportFormat = data.get('format','csv')
+    if exportFormat not in exports.WRITERS:
+        return jsonify({'error':f"Format must be one of {', '.join(sorted(exports.WRITERS))}"}),400
+    since = data.get('since')
+    if since is not None:
         try:
-            start_date = datetime.fromisoformat(start_date)
-            end_date = datetime.fromisoformat(end_date)
-        except ValueError:
+            since = datetime.fromisoformat(since)
+        except (TypeError, ValueError):
             return jsonify({'error':'Datetime format is wrong'}),400
 
-        
-        expenses_query = db.session.query(
-            Expense.date,
-            Expense.amount,
-            Expense.currency,
-            Expense.description,
-            db.literal('expense').label('transactionType')
-            ).filter(
-                Expense.user_id==user_id,
-                Expense.date>=start_date,
-                Expense.date<=end_date
-            )
-        
-        incomes_query = db.session.query(
-            Income.date,
-            Income.amount,
-            Income.currency,
-            Income.description,
-            db.literal('income').label('transactionType')
-            ).filter(
-                Income.user_id==user_id,
-                Income.date>=start_date,
-                Income.date<=end_date
-            )
-        
-        investment_query = db.session.query(
-            Investment.date,
-            Investment.amount,
-            Investment.currency,
-            Investment.description,
-            db.literal('investment').label('transactionType')
-            ).filter(
-                Investment.user_id==user_id,
-                Investment.date>=start_date,
-                Investment.date<=end_date
-        )
-
-        combined_queries = expenses_query.union(incomes_query).union(investment_query).order_by(Expense.date)
-        result= combined_queries.all()
-
-        finances_data=[]
-        for row in result:
-            finances_data.append({
-                'date':row.date.isoformat(),
-                'amount':float(row.amount),
-                'currency':row.currency,
-                'description':row.description,
-                'transactionType':row.transactionType
-            })
-        return jsonify(finances_data),200
+    spool = tempfile.TemporaryFile()
+    try:
+        manifest = exports.writeExport(spool,exportFormat,user_id,since)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    writer = exports.WRITERS[exportFormat]
+    headers = {
+        'Content-Disposition':f'attachment; filename=transactions.{writer.extension}',
+        'Content-Length':str(manifest['bytes']),
+        'Digest':'sha-256='+base64.b64encode(bytes.fromhex(manifest['sha256'])).decode(),
+        'X-Export-Rows':str(manifest['rows']),
+        'X-Export-Watermark':manifest['until'],
+    }
+    return Response(wrap_file(request.environ,spool),mimetype=writer.mimetype,headers=headers,direct_passthrough=True),200
 
-    except InternalServerException:
-        return jsonify({'error':'Internal server error'}),500
+@app.route('/import', methods=['POST'])
+@login_required
+def importTransactions():
+    """Import a CSV or OFX bank statement uploaded as the multipart field file.
+
+    Form fields: user and optionally format ('csv' or 'ofx'), otherwise taken
+    from the file name. The upload is parsed as a stream and inserted in
+    batches; rows imported before are skipped. Responds with the import
+    statistics, including the first invalid rows and why they were rejected.
+    """
+    user_id = payloadUser(request.form)
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error':'No file is provided'}),400
+    importFormat = imports.importFormat(upload.filename or '',request.form.get('format'))
+    if importFormat is None:
+        return jsonify({'error':f"Format must be one of {', '.join(sorted(imports.READERS))}"}),400
+    stream = io.TextIOWrapper(upload.stream,encoding='utf-8-sig',errors='replace',newline='')
+    try:
+        stats = imports.importStatement(user_id,imports.READERS[importFormat](stream))
+    finally:
+        stream.detach()
+    noteWrite()
+    return jsonify(stats),200
+
+@app.route('/metrics', methods=['GET'])
+def getMetrics():
+    return Response(metrics.render(),mimetype='text/plain; version=0.0.4')
+
+@app.cli.command('add-currency')
+@click.argument('code')
+@click.option('--exponent',type=click.IntRange(0,4),default=None,help='Decimal places of the minor unit; defaults to the ISO 4217 value.')
+def addCurrency(code,exponent):
+    """Add a currency code to the whitelist."""
+    code = code.upper()
+    if len(code) != 3:
+        raise click.BadParameter('Currency codes are 3 letters long')
+    if Currency.query.filter_by(currency=code).first() is not None:
+        click.echo(f'{code} already exists')
+        return
+    if exponent is None:
+        exponent = defaultExponent(code)
+    db.session.add(Currency(currency=code,exponent=exponent))
+    db.session.commit()
+    click.echo(f'Added {code}')
+
+@app.cli.command('rebuild-rollups')
+@click.option('--user','user_id',default=None,help='Only rebuild this user\'s rollups.')
+def rebuildRollupsCommand(user_id):
+    """Recompute daily and monthly rollups from the transactions table."""
+    if user_id is not None:
+        user_id = parseUserId(user_id)
+        if user_id is None:
+            raise click.BadParameter('User must be a UUID',param_hint='--user')
+    rebuildRollups(user_id)
+    db.session.commit()
+    click.echo('Rollups rebuilt')
+
+@app.cli.command('export')
+@click.argument('path',type=click.Path(dir_okay=False,writable=True))
+@click.option('--format','exportFormat',type=click.Choice(sorted(exports.WRITERS)),default=None,help='Defaults to the extension of PATH.')
+@click.option('--user','user_id',default=None,help='Only export this user\'s transactions.')
+@click.option('--since',type=click.DateTime(['%Y-%m-%dT%H:%M:%S','%Y-%m-%d %H:%M:%S']),default=None,help='Only export rows added after this watermark.')
+@click.option('--since-manifest',type=click.Path(exists=True,dir_okay=False),default=None,help='Continue from the watermark in a previous export\'s manifest.')
+def exportCommand(path,exportFormat,user_id,since,since_manifest):
+    """Export transactions to PATH and write PATH.manifest.json next to it."""
+    if exportFormat is None:
+        exportFormat = os.path.splitext(path)[1].lstrip('.').lower()
+        if exportFormat not in exports.WRITERS:
+            raise click.BadParameter(f"Cannot tell the format from the extension, use one of {', '.join(sorted(exports.WRITERS))}",param_hint='--format')
+    if user_id is not None:
+        user_id = parseUserId(user_id)
+        if user_id is None:
+            raise click.BadParameter('User must be a UUID',param_hint='--user')
+    if since_manifest is not None:
+        with open(since_manifest) as manifestFile:
+            since = datetime.fromisoformat(json.load(manifestFile)['until'])
+    with open(path,'wb') as exportFile:
+        manifest = exports.writeExport(exportFile,exportFormat,user_id,since)
+    exports.writeManifest(path,manifest)
+    click.echo(f"Exported {manifest['rows']} transactions to {path}, watermark {manifest['until']}")
+
+@app.cli.command('verify-export')
+@click.argument('path',type=click.Path(exists=True,dir_okay=False))
+def verifyExportCommand(path):
+    """Check an export file against its manifest."""
+    try:
+        with open(exports.manifestPath(path)) as manifestFile:
+            manifest = json.load(manifestFile)
+    except FileNotFoundError:
+        raise click.ClickException(f'No manifest at {exports.manifestPath(path)}')
+    problems = exports.verifyExport(path,manifest)
+    if problems:
+        raise click.ClickException('; '.join(problems))
+    click.echo(f"{path} is intact: {manifest['rows']} transactions, sha256 {manifest['sha256']}")
+
+@app.cli.command('import-transactions')
+@click.argument('path',type=click.Path(exists=True,dir_okay=False))
+@click.option('--user','user_id',required=True,help='User the transactions belong to.')
+@click.option('--format','importFormat',type=click.Choice(sorted(imports.READERS)),default=None,help='Defaults to the extension of PATH.')
+@click.option('--batch-size',type=click.IntRange(1),default=None,help='Rows per INSERT and commit; defaults to IMPORT_BATCH_SIZE.')
+def importTransactionsCommand(path,user_id,importFormat,batch_size):
+    """Import a CSV or OFX bank statement, skipping transactions imported before."""
+    user_id = parseUserId(user_id)
+    if user_id is None or not userExists(user_id):
+        raise click.BadParameter('User not found',param_hint='--user')
+    importFormat = imports.importFormat(path,importFormat)
+    if importFormat is None:
+        raise click.BadParameter(f"Cannot tell the format from the extension, use one of {', '.join(sorted(imports.READERS))}",param_hint='--format')
+    with open(path,encoding='utf-8-sig',errors='replace',newline='') as statement:
+        try:
+            stats = imports.importStatement(user_id,imports.READERS[importFormat](statement),batch_size)
+        except ValidationException as e:
+            db.session.rollback()
+            raise click.ClickException(e.message)
+    for error in stats['errors']:
+        click.echo(f"line {error['line']}: {error['error']}",err=True)
+    click.echo(f"Imported {stats['inserted']} of {stats['rows']} transactions ({stats['duplicates']} duplicates, {stats['invalid']} invalid) in {stats['seconds']}s, {stats['rows_per_second']} rows/s")
+
+@app.cli.command('user-stats')
+@click.option('--start',type=click.DateTime(['%Y-%m-%d']),default=None,help='First day counted; defaults to the earliest.')
+@click.option('--end',type=click.DateTime(['%Y-%m-%d']),default=None,help='Last day counted; defaults to the latest.')
+@click.option('--workers',type=click.IntRange(1),default=os.cpu_count() or 1,show_default='CPU count',help='Worker processes, each with its own database connection.')
+@click.option('--shards',type=click.IntRange(1),default=None,help='User id ranges to split the work into; defaults to 4 per worker.')
+@click.option('--percentile','percentiles',type=click.FloatRange(0,100),multiple=True,default=(50,90,99),show_default=True,help='Percentiles of per-user totals to report; repeatable.')
+@click.option('--output',type=click.Path(dir_okay=False,writable=True),default=None,help='Write the JSON report here instead of to stdout.')
+def userStatsCommand(start,end,workers,shards,percentiles,output):
+    """Report per-user spending statistics across all users, per type and currency."""
+    if workers > 1 and db.engine.url.get_backend_name() == 'sqlite' and db.engine.url.database in (None,'',':memory:'):
+        raise click.BadParameter('An in-memory database cannot be shared with worker processes',param_hint='--workers')
+    partials = userStats.collect(db.engine,start and start.date(),end and end.date(),workers,shards,app.config['STATS_BATCH_SIZE'])
+    scales = {currency:unitScale(currency) for _,currency in partials}
+    report = json.dumps(userStats.report(partials,scales,percentiles),indent=2)
+    if output is None:
+        click.echo(report)
+        return
+    with open(output,'w') as outputFile:
+        outputFile.write(report+'\n')
+    click.echo(f'Wrote statistics of {len(partials)} types and currencies to {output}')
+
+@app.cli.command('load-rates')
+@click.argument('path',type=click.Path(exists=True,dir_okay=False))
+def loadRatesCommand(path):
+    """Load exchange rates from a currency,date,rate CSV file."""
+    try:
+        loaded,skipped = loadRates(path,{code for (code,) in db.session.query(Currency.currency)})
+    except ValidationException as e:
+        db.session.rollback()
+        raise click.ClickException(e.message)
+    db.session.commit()
+    click.echo(f'Loaded {loaded} exchange rates, skipped {skipped} for unknown currencies')
+
+@app.cli.group('partitions')
+@with_appcontext
+def partitionsCommand():
+    """Maintain the monthly partitions of the transactions table (Postgres)."""
+    if not partitions.isPartitioned():
+        raise click.ClickException('The transactions table is not partitioned')
+
+@partitionsCommand.command('create')
+@click.option('--ahead',default=3,show_default=True,help='Months to create past the current one.')
+def createPartitionsCommand(ahead):
+    """Create the missing partitions up to --ahead months from now."""
+    created = partitions.ensurePartitions(date.today(),ahead)
+    db.session.commit()
+    click.echo(f"Created {len(created)} partitions{': '+', '.join(created) if created else ''}")
+
+@partitionsCommand.command('detach')
+@click.option('--before',required=True,type=click.DateTime(['%Y-%m']),help='Detach partitions of months before this YYYY-MM.')
+@click.option('--archive-schema',default=None,help='Move detached partitions into this schema.')
+def detachPartitionsCommand(before,archive_schema):
+    """Detach old partitions; their rows stay counted in the rollups."""
+    detached = partitions.detachPartitions(before.date(),archive_schema)
+    db.session.commit()
+    click.echo(f"Detached {len(detached)} partitions{': '+', '.join(detached) if detached else ''}")
+
+@partitionsCommand.command('explain')
+@click.option('--user','user_id',required=True,help='User whose range totals are explained.')
+@click.option('--start',required=True,type=click.DateTime(),help='Start of the range.')
+@click.option('--end',required=True,type=click.DateTime(),help='End of the range.')
+def explainPartitionsCommand(user_id,start,end):
+    """Check that the get* range totals only scan the partitions their range touches."""
+    user_id = parseUserId(user_id)
+    if user_id is None:
+        raise click.BadParameter('User must be a UUID',param_hint='--user')
+    failed = False
+    for noun,model in (('expense',Expense),('income',Income),('investment',Investment)):
+        for query,(scanned,allowed) in partitions.checkPruning(model,user_id,start,end).items():
+            extra = scanned-allowed
+            failed = failed or bool(extra)
+            click.echo(f"{noun} {query}: scans {', '.join(sorted(scanned)) or 'no partitions'}"+(f" (not pruned: {', '.join(sorted(extra))})" if extra else ''))
+    if failed:
+        raise click.ClickException('Some queries scan partitions outside the range')
+
+if app.config['WRITE_BEHIND_ENABLED']:
+    writeBehind.startWorker(app)
+
+if app.config['PROFILING_ENABLED']:
+    profiling.init(app)
 
 if __name__ == "__main__":
     with app.app_context():
@@ -0,0 +1,101 @@
+"""Throughput of NUMERIC versus BIGINT minor unit amounts.
+
+    python -m benchmarks.amounts [--rows 1000000] [--currencies 5] [--repeat 5] [--database sqlite://]
+
+Measures parsing request amounts (Decimal versus parseMinorUnits) and
+summing a table of rows per currency into response values (float of a
+NUMERIC sum versus an exact string of a BIGINT sum). The database defaults
+to in-memory SQLite; point --database at Postgres for production numbers.
+The bench_amounts_* tables are dropped afterwards. Prints one JSON object
+per measurement.
+"""
+import argparse
+import json
+import random
+import time
+from decimal import Decimal
+from sqlalchemy import BigInteger, Column, Integer, MetaData, Numeric, String, Table, create_engine, func, select
+from money import parseMinorUnits, formatMinorUnits
+
+def makeTables(metadata):
+    return {
+        'numeric': Table('bench_amounts_numeric', metadata,
+            Column('id', Integer, primary_key=True),
+            Column('currency', String(3), nullable=False),
+            Column('amount', Numeric(precision=10, scale=2), nullable=False)),
+        'minor': Table('bench_amounts_minor', metadata,
+            Column('id', Integer, primary_key=True),
+            Column('currency', String(3), nullable=False),
+            Column('amount', BigInteger, nullable=False)),
+    }
+
+def sampleAmounts(rows, seed=42):
+    generator = random.Random(seed)
+    return [f'{generator.randint(1, 99999)/100:.2f}' for _ in range(rows)]
+
+def best(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter()-started)
+    return min(timings)
+
+def report(measurement, storage, rows, seconds):
+    return {'measurement':measurement,'storage':storage,'rows':rows,'seconds':round(seconds, 4),'rows_per_second':round(rows/seconds)}
+
+def measureParsing(amounts, repeat):
+    yield report('parse', 'numeric', len(amounts), best(lambda: [Decimal(amount) for amount in amounts], repeat))
+    yield report('parse', 'minor', len(amounts), best(lambda: [parseMinorUnits(amount, 2) for amount in amounts], repeat))
+
+def measureSums(engine, tables, amounts, currencies, repeat):
+    codes = [f'C{index:02d}' for index in range(currencies)]
+    with engine.begin() as connection:
+        for storage, table in tables.items():
+            batch = []
+            for index, amount in enumerate(amounts):
+                value = Decimal(amount) if storage == 'numeric' else parseMinorUnits(amount, 2)
+                batch.append({'currency':codes[index%currencies],'amount':value})
+                if len(batch) == 10000:
+                    connection.execute(table.insert(), batch)
+                    batch = []
+            if batch:
+                connection.execute(table.insert(), batch)
+
+    def numericTotals():
+        with engine.connect() as connection:
+            statement = select(tables['numeric'].c.currency, func.sum(tables['numeric'].c.amount)).group_by(tables['numeric'].c.currency)
+            return {currency:float(total) for currency, total in connection.execute(statement)}
+
+    def minorTotals():
+        with engine.connect() as connection:
+            statement = select(tables['minor'].c.currency, func.sum(tables['minor'].c.amount)).group_by(tables['minor'].c.currency)
+            return {currency:formatMinorUnits(int(total), 2) for currency, total in connection.execute(statement)}
+
+    yield report('sum', 'numeric', len(amounts), best(numericTotals, repeat))
+    yield report('sum', 'minor', len(amounts), best(minorTotals, repeat))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--currencies', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', default='sqlite://')
+    args = parser.parse_args()
+
+    amounts = sampleAmounts(args.rows)
+    for result in measureParsing(amounts, args.repeat):
+        print(json.dumps(result))
+
+    engine = create_engine(args.database)
+    metadata = MetaData()
+    tables = makeTables(metadata)
+    metadata.create_all(engine)
+    try:
+        for result in measureSums(engine, tables, amounts, args.currencies, args.repeat):
+            print(json.dumps(result))
+    finally:
+        metadata.drop_all(engine)
+
+if __name__ == '__main__':
+    main()
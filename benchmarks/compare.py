@@ -0,0 +1,52 @@
+"""Compare benchmarks.endpoints results with a stored baseline.
+
+    python -m benchmarks.compare RESULTS [--baseline benchmarks/baseline.json] [--tolerance 0.25]
+
+Fails (exit status 1) when a scenario's requests per second dropped, or its
+p90 latency grew, by more than --tolerance relative to the baseline, or
+when a baseline scenario is missing. Both files must come from runs with the
+same settings. To accept new numbers, copy the results over the baseline.
+"""
+import argparse
+import json
+import sys
+
+def regressions(baseline, results, tolerance):
+    """Human readable regressions of results against baseline."""
+    found = []
+    if baseline['settings'] != results['settings']:
+        found.append(f"settings differ: baseline {baseline['settings']}, results {results['settings']}")
+        return found
+    current = {result['scenario']: result for result in results['results']}
+    for expected in baseline['results']:
+        scenario = expected['scenario']
+        result = current.get(scenario)
+        if result is None:
+            found.append(f'{scenario}: missing from the results')
+            continue
+        if result['requests_per_second'] < expected['requests_per_second']*(1-tolerance):
+            found.append(f"{scenario}: {result['requests_per_second']} requests/s, baseline {expected['requests_per_second']}")
+        if result['p90_ms'] > expected['p90_ms']*(1+tolerance):
+            found.append(f"{scenario}: p90 {result['p90_ms']} ms, baseline {expected['p90_ms']}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('results')
+    parser.add_argument('--baseline', default='benchmarks/baseline.json')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    with open(args.baseline) as baselineFile:
+        baseline = json.load(baselineFile)
+    with open(args.results) as resultsFile:
+        results = json.load(resultsFile)
+    found = regressions(baseline, results, args.tolerance)
+    for regression in found:
+        print(regression)
+    if found:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} in {len(baseline['results'])} scenarios")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Seeded synthetic users and transactions for the benchmarks.
+
+    python -m benchmarks.data [--users 10] [--transactions 10000] [--seed 42] [--database sqlite:////tmp/bench.sqlite]
+
+Creates the currencies, --users users and --transactions transactions per
+user spread over expenses, incomes and investments, currencies and the
+years 2021-2024. Rows go through ingest.insertTransactions, so the rollups
+match them. The same seed always produces the same data, user ids included.
+"""
+import argparse
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+CURRENCIES = ('USD', 'EUR', 'GBP')
+DESCRIPTIONS = ('', 'Groceries', 'Rent', 'Salary', 'Coffee', 'Index fund', 'Train ticket', 'Dividend')
+START = datetime(2021, 1, 1)
+SPAN_MINUTES = 4*365*24*60
+BATCH_SIZE = 5000
+
+def useDatabase(uri):
+    """Point the app at uri; must run before app is imported, which reads its configuration at import time."""
+    os.environ['DATABASE_URI'] = uri
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+def randomAmount(generator, currency, exponents):
+    cents = generator.randint(1, 250000)
+    if exponents is None:
+        return Decimal(cents)/100
+    return cents*10**exponents[currency]//100
+
+def generate(users, transactions, seed=42):
+    """Create the data inside an app context; returns the user ids."""
+    from models import db, Currency, User, Expense, Income, Investment
+    from ingest import insertTransactions
+    from money import amountExponents, defaultExponent
+
+    generator = random.Random(seed)
+    db.create_all()
+    for code in CURRENCIES:
+        if Currency.query.filter_by(currency=code).first() is None:
+            db.session.add(Currency(currency=code, exponent=defaultExponent(code)))
+    db.session.commit()
+    exponents = amountExponents()
+
+    userIds = []
+    for index in range(users):
+        user_id = uuid.UUID(int=generator.getrandbits(128), version=4)
+        db.session.add(User(id=user_id, name=f'bench{seed}_{index}', hashText='-'))
+        userIds.append(user_id)
+    db.session.commit()
+
+    models = (Expense, Expense, Expense, Income, Investment)
+    for user_id in userIds:
+        batches = {model: [] for model in dict.fromkeys(models)}
+        for _ in range(transactions):
+            model = generator.choice(models)
+            currency = generator.choice(CURRENCIES)
+            batches[model].append({
+                'user_id':user_id,
+                'amount':randomAmount(generator, currency, exponents),
+                'currency':currency,
+                'date':START+timedelta(minutes=generator.randrange(SPAN_MINUTES)),
+                'description':generator.choice(DESCRIPTIONS),
+                'id':uuid.UUID(int=generator.getrandbits(128), version=4),
+            })
+            if len(batches[model]) == BATCH_SIZE:
+                insertTransactions(model, batches[model])
+                db.session.commit()
+                batches[model] = []
+        for model, rows in batches.items():
+            if rows:
+                insertTransactions(model, rows)
+        db.session.commit()
+    return userIds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--transactions', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default='sqlite:////tmp/bench.sqlite')
+    args = parser.parse_args()
+
+    useDatabase(args.database)
+    from app import app
+    with app.app_context():
+        userIds = generate(args.users, args.transactions, args.seed)
+    print(json.dumps({'users':[str(user_id) for user_id in userIds],'transactions_per_user':args.transactions}))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Rows per second serialized by each /getAll response encoder.
+
+    python -m benchmarks.encoders [--rows 100000] [--repeat 5]
+
+Encodes synthetic listing rows with every available encoder, the stdlib JSON
+fallback, and the dict-per-row jsonify path /getAll used before encoders.py
+as a baseline. Prints one JSON object per encoder.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+import encoders
+
+COLUMNS = ('date', 'amount', 'currency', 'description', 'transactionType')
+
+def sampleRows(rows, seed=42):
+    generator = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [(
+        start+timedelta(minutes=index),
+        Decimal(generator.randint(1, 99999))/100,
+        generator.choice(['USD', 'EUR', 'GBP']),
+        generator.choice(['', 'Groceries', 'Rent', 'Salary']),
+        generator.choice(['expense', 'income', 'investment']),
+    ) for index in range(rows)]
+
+def legacyJsonify(rows):
+    records = [{
+        'date':row[0].isoformat(),
+        'amount':float(row[1]),
+        'currency':row[2],
+        'description':row[3],
+        'transactionType':row[4],
+    } for row in rows]
+    return json.dumps(records, sort_keys=True).encode()
+
+def stdlibRecords(rows):
+    records = [dict(zip(COLUMNS, row)) for row in rows]
+    return json.dumps(records, default=encoders.jsonDefault, separators=(',', ':')).encode()
+
+def measure(name, encode, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encode(rows)
+        timings.append(time.perf_counter()-started)
+    seconds = min(timings)
+    return {'encoder':name,'rows':len(rows),'bytes':len(body),'seconds':round(seconds, 4),'rows_per_second':round(len(rows)/seconds)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = sampleRows(args.rows)
+    candidates = [('legacy jsonify', legacyJsonify), ('stdlib json records', stdlibRecords)]
+    for encoder in encoders.ENCODERS:
+        candidates.append((encoder.mimetype, lambda rows, encoder=encoder: encoder.encode(COLUMNS, rows)))
+    for name, encode in candidates:
+        print(json.dumps(measure(name, encode, rows, args.repeat)))
+
+if __name__ == '__main__':
+    main()
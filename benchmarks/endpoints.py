@@ -0,0 +1,193 @@
+"""Throughput and latency of the real endpoints, next to raw SQL baselines.
+
+    python -m benchmarks.endpoints [--users 5] [--transactions 20000] [--requests 200] [--seed 42]
+                                   [--database sqlite:////tmp/bench_endpoints.sqlite] [--output results.json]
+
+Fills a fresh database with benchmarks.data, then drives /getExpense,
+/getAll, /timeseries (weekly, with running balances), /addExpense and
+/addExpenses through Flask's test client as logged in users. raw_range_sum
+and raw_listing run the SQL those read endpoints stand in for (a SUM over
+the raw rows, the first page of 1000 rows) straight through SQLAlchemy
+Core, to show what the app adds on top. Request arguments are drawn from
+--seed, so two runs do the same work.
+
+Prints one JSON object per scenario with requests and rows per second and
+latency percentiles in milliseconds; --output also writes them, with the
+settings, as one JSON document for benchmarks.compare. The database is
+dropped afterwards, so never point --database at one holding real data.
+"""
+import argparse
+import json
+import platform
+import random
+import time
+from datetime import timedelta
+from benchmarks import data
+
+PAGE_SIZE = 1000
+BULK_SIZE = 500
+# Calls repeated untimed first, to fill connection pools and statement caches.
+WARMUP = 5
+
+def percentile(ordered, fraction):
+    index = min(len(ordered)-1, max(0, round(fraction*(len(ordered)-1))))
+    return ordered[index]
+
+def summarize(scenario, measured):
+    latencies, rows = measured
+    ordered = sorted(latencies)
+    seconds = sum(ordered)
+    return {
+        'scenario':scenario,
+        'requests':len(ordered),
+        'requests_per_second':round(len(ordered)/seconds, 1),
+        'rows_per_second':round(rows/seconds, 1),
+        'p50_ms':round(percentile(ordered, .5)*1000, 3),
+        'p90_ms':round(percentile(ordered, .9)*1000, 3),
+        'p99_ms':round(percentile(ordered, .99)*1000, 3),
+        'max_ms':round(ordered[-1]*1000, 3),
+    }
+
+def timed(calls):
+    """(latency of each call, total rows the calls returned)."""
+    for call in calls[:WARMUP]:
+        call()
+    latencies = []
+    rows = 0
+    for call in calls:
+        started = time.perf_counter()
+        result = call()
+        latencies.append(time.perf_counter()-started)
+        rows += result
+    return latencies, rows
+
+def expectStatus(response, status):
+    if response.status_code != status:
+        raise RuntimeError(f'{response.request.path} answered {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response
+
+def randomRange(generator):
+    start = data.START+timedelta(minutes=generator.randrange(data.SPAN_MINUTES//2))
+    return start, start+timedelta(days=generator.randint(7, 730))
+
+def runScenarios(app, userIds, requests, seed):
+    from sqlalchemy import func, select
+    from models import db, Transaction
+
+    generator = random.Random(seed)
+    client = app.test_client()
+
+    def logIn(user_id):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+
+    def rangeCalls(build):
+        calls = []
+        for _ in range(requests):
+            user_id = generator.choice(userIds)
+            start, end = randomRange(generator)
+            calls.append(build(user_id, start, end))
+        return calls
+
+    def getExpense(user_id, start, end):
+        def call():
+            logIn(user_id)
+            expectStatus(client.get('/getExpense', json={'user_id':str(user_id),'start_date':start.isoformat(),'end_date':end.isoformat()}), 200)
+            return 1
+        return call
+
+    def getAll(user_id, start, end):
+        def call():
+            logIn(user_id)
+            response = expectStatus(client.get('/getAll', json={'user_id':str(user_id),'start_date':start.isoformat(),'end_date':end.isoformat(),'limit':PAGE_SIZE}), 200)
+            return len(response.get_json()['items'])
+        return call
+
+    def getTimeseries(user_id, start, end):
+        def call():
+            logIn(user_id)
+            payload = {'user_id':str(user_id),'start_date':start.isoformat(),'end_date':end.isoformat(),'granularity':'week','running_balance':True}
+            response = expectStatus(client.get('/timeseries', json=payload), 200)
+            return len(response.get_json()['buckets'])
+        return call
+
+    def rawRangeSum(user_id, start, end):
+        statement = select(Transaction.currency, func.sum(Transaction.amount)).where(
+            Transaction.user_id == user_id, Transaction.type == 'expense', Transaction.date.between(start, end),
+        ).group_by(Transaction.currency)
+        def call():
+            db.session.execute(statement).all()
+            return 1
+        return call
+
+    def rawListing(user_id, start, end):
+        statement = select(Transaction.date, Transaction.amount, Transaction.currency, Transaction.description, Transaction.type).where(
+            Transaction.user_id == user_id, Transaction.date.between(start, end),
+        ).order_by(Transaction.date, Transaction.id).limit(PAGE_SIZE)
+        return lambda: len(db.session.execute(statement).all())
+
+    def record(user_id):
+        currency = generator.choice(data.CURRENCIES)
+        date = data.START+timedelta(minutes=generator.randrange(data.SPAN_MINUTES))
+        return {'amount':f'{generator.randint(1, 250000)/100:.2f}','currency':currency,'date':date.isoformat(),'description':generator.choice(data.DESCRIPTIONS)}
+
+    def addExpense(user_id):
+        payload = {'user':str(user_id), **record(user_id)}
+        def call():
+            logIn(user_id)
+            expectStatus(client.post('/addExpense', json=payload), 201)
+            return 1
+        return call
+
+    def addExpenses(user_id):
+        payload = {'user':str(user_id),'records':[record(user_id) for _ in range(BULK_SIZE)]}
+        def call():
+            logIn(user_id)
+            expectStatus(client.post('/addExpenses', json=payload), 201)
+            return BULK_SIZE
+        return call
+
+    # Reads first, so every run reads the same data.
+    yield summarize('get_expense', timed(rangeCalls(getExpense)))
+    yield summarize('raw_range_sum', timed(rangeCalls(rawRangeSum)))
+    yield summarize('get_all', timed(rangeCalls(getAll)))
+    yield summarize('raw_listing', timed(rangeCalls(rawListing)))
+    yield summarize('timeseries', timed(rangeCalls(getTimeseries)))
+    yield summarize('add_expense', timed([addExpense(generator.choice(userIds)) for _ in range(requests)]))
+    yield summarize('add_expenses', timed([addExpenses(generator.choice(userIds)) for _ in range(max(1, requests//10))]))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--transactions', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default='sqlite:////tmp/bench_endpoints.sqlite')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    data.useDatabase(args.database)
+    from app import app
+    from models import db
+
+    with app.app_context():
+        db.drop_all()
+        try:
+            userIds = data.generate(args.users, args.transactions, args.seed)
+            results = []
+            for result in runScenarios(app, userIds, args.requests, args.seed):
+                print(json.dumps(result))
+                results.append(result)
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+    if args.output is not None:
+        settings = {key:value for key, value in vars(args).items() if key not in ('database', 'output')}
+        settings['dialect'] = args.database.split(':', 1)[0]
+        environment = {'python':platform.python_version(),'machine':platform.machine()}
+        with open(args.output, 'w') as output:
+            json.dump({'settings':settings,'environment':environment,'results':results}, output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Hashes per second for each password hashing setting.
+
+    python -m benchmarks.hashing [--seconds 2] [--workers 1 4] [--method bcrypt:10 scrypt:16384:8:1 ...]
+
+bcrypt settings are written bcrypt:<log rounds>; anything else is passed to
+Werkzeug as the hashing method. Prints one JSON object per setting and
+worker count.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from hashing import computeHash
+
+DEFAULT_SETTINGS = [
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+    'bcrypt:12',
+    'bcrypt:10',
+]
+
+def parseSetting(setting):
+    if setting.startswith('bcrypt'):
+        _, _, rounds = setting.partition(':')
+        return 'bcrypt', int(rounds or 12)
+    return setting, None
+
+def measure(setting, workers, seconds):
+    method, rounds = parseSetting(setting)
+    computeHash('warm up', method, rounds)
+    done = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while time.perf_counter()-started < seconds:
+            list(executor.map(lambda _: computeHash('correct horse battery staple', method, rounds), range(workers)))
+            done += workers
+    elapsed = time.perf_counter()-started
+    return {'setting':setting,'workers':workers,'hashes':done,'seconds':round(elapsed, 3),'hashes_per_second':round(done/elapsed, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--method', nargs='+', default=DEFAULT_SETTINGS)
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+    for setting in args.method:
+        for workers in args.workers:
+            print(json.dumps(measure(setting, workers, args.seconds)))
+
+if __name__ == '__main__':
+    main()
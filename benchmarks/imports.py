@@ -0,0 +1,71 @@
+"""Throughput and memory of streaming statement imports.
+
+    python -m benchmarks.imports [--rows 1000000] [--batch-size 5000] [--database sqlite:////tmp/bench_imports.sqlite]
+
+Writes a CSV statement of --rows lines into a temporary file, imports it for
+a fresh user through imports.importStatement, then imports it again to time
+the all-duplicates path. Prints one JSON object per pass with rows per second
+and the process' peak resident memory, which should stay flat as --rows
+grows. The database is created and dropped by the benchmark, so never point
+--database at one holding real data.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+from datetime import date, timedelta
+
+def writeStatement(path, rows, seed=42):
+    generator = random.Random(seed)
+    start = date(2020, 1, 1)
+    with open(path, 'w', newline='') as statement:
+        statement.write('date,amount,currency,description,reference\n')
+        for index in range(rows):
+            day = start+timedelta(days=generator.randrange(1500))
+            amount = generator.randint(-99999, 99999)/100
+            statement.write(f'{day.isoformat()},{amount:.2f},{generator.choice(("USD", "EUR"))},Payee {index%997},R{index}\n')
+
+def peakMemoryMb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak/(1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--database', default='sqlite:///'+os.path.join(tempfile.gettempdir(), 'bench_imports.sqlite'))
+    args = parser.parse_args()
+
+    # app.py reads its configuration at import time.
+    os.environ['DATABASE_URI'] = args.database
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    from app import app
+    from models import db, Currency, User
+    import imports
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'statement.csv')
+        writeStatement(path, args.rows)
+        with app.app_context():
+            db.create_all()
+            try:
+                user = User(name='bench_imports', hashText='-')
+                db.session.add_all([Currency(currency='USD'), Currency(currency='EUR'), user])
+                db.session.commit()
+                user_id = user.id
+                for run in ('fresh', 'duplicates'):
+                    with open(path, newline='') as statement:
+                        stats = imports.importStatement(user_id, imports.csvRecords(statement), args.batch_size)
+                    print(json.dumps({
+                        'run':run,'rows':stats['rows'],'inserted':stats['inserted'],'duplicates':stats['duplicates'],
+                        'seconds':stats['seconds'],'rows_per_second':stats['rows_per_second'],'peak_rss_mb':peakMemoryMb(),
+                    }))
+            finally:
+                db.session.remove()
+                db.drop_all()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Scaling of the sharded cross-user statistics with worker processes.
+
+    python -m benchmarks.userStats [--users 100000] [--months 24] [--workers 1,2,4] [--database sqlite:////tmp/bench_user_stats.sqlite]
+
+Fills the monthly rollups of a fresh database with --users synthetic users,
+each with expenses in one to three currencies over --months months, then
+runs userStats.collect once per --workers value. Prints one JSON object per
+run with seconds, users per second and the speedup over the first run, which
+should grow close to linearly up to the number of cores. The database is
+created and dropped by the benchmark, so never point --database at one
+holding real data.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import date
+from decimal import Decimal
+
+BATCH_SIZE = 20000
+
+def fill(engine, users, months, seed=42):
+    from sqlalchemy import insert
+    from models import MonthlyRollup, MINOR_UNITS
+
+    generator = random.Random(seed)
+    table = MonthlyRollup.__table__
+    firsts = [date(2021+month//12, month%12+1, 1) for month in range(months)]
+    rows = []
+    with engine.begin() as connection:
+        for _ in range(users):
+            user_id = uuid.UUID(int=generator.getrandbits(128), version=4)
+            for currency in generator.sample(('USD', 'EUR', 'GBP'), generator.randint(1, 3)):
+                for month in firsts:
+                    cents = generator.randint(100, 500000)
+                    rows.append({
+                        'user_id':user_id,'type':'expense','currency':currency,'month':month,
+                        'total':cents if MINOR_UNITS else Decimal(cents)/100,'count':generator.randint(1, 40),
+                    })
+            if len(rows) >= BATCH_SIZE:
+                connection.execute(insert(table), rows)
+                rows = []
+        if rows:
+            connection.execute(insert(table), rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--database', default='sqlite:///'+os.path.join(tempfile.gettempdir(), 'bench_user_stats.sqlite'))
+    args = parser.parse_args()
+
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    from sqlalchemy import create_engine
+    from models import db, MonthlyRollup
+    import userStats
+
+    engine = create_engine(args.database)
+    tables = [MonthlyRollup.__table__]
+    db.metadata.drop_all(engine, tables=tables)
+    db.metadata.create_all(engine, tables=tables)
+    try:
+        fill(engine, args.users, args.months)
+        baseline = None
+        for workers in (int(value) for value in args.workers.split(',')):
+            started = time.perf_counter()
+            partials = userStats.collect(engine, workers=workers)
+            seconds = time.perf_counter()-started
+            baseline = baseline or seconds
+            print(json.dumps({
+                'workers':workers,
+                'users':args.users,
+                'series':len(partials),
+                'seconds':round(seconds, 3),
+                'users_per_second':round(args.users/seconds, 1),
+                'speedup':round(baseline/seconds, 2),
+            }), flush=True)
+    finally:
+        db.metadata.drop_all(engine, tables=tables)
+        engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from flask_login import UserMixin
+from models import db, Currency, User
+from metrics import Counter
+
+currencyCacheHits = Counter('currency_cache_hits_total', 'Currency lookups answered from the in-process cache')
+currencyCacheMisses = Counter('currency_cache_misses_total', 'Currency lookups that had to reload the currencies table')
+userCacheHits = Counter('user_cache_hits_total', 'User lookups answered from the in-process cache')
+userCacheMisses = Counter('user_cache_misses_total', 'User lookups that had to query the users table')
+
+class LRUCache:
+    """Thread-safe mapping bounded to maxsize entries, each expiring ttl seconds after it was stored."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expiresAt = entry
+            if time.monotonic() >= expiresAt:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic()+self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class CurrencyCache:
+    """Process-local whitelist of valid Currency.currency codes and their exponents.
+
+    The whole table is loaded at once and kept for CURRENCY_CACHE_TTL seconds
+    or until invalidate() is called. Writes through the ORM in this process
+    invalidate it straight away; other processes pick changes up once the TTL
+    runs out.
+    """
+
+    def __init__(self):
+        self._table = None
+        self._loadedAt = 0
+        self._lock = threading.Lock()
+
+    def _fresh(self):
+        return self._table is not None and time.monotonic()-self._loadedAt < current_app.config['CURRENCY_CACHE_TTL']
+
+    def _load(self):
+        """(frozenset of codes, {code: exponent})."""
+        if self._fresh():
+            currencyCacheHits.inc()
+            return self._table
+        with self._lock:
+            if not self._fresh():
+                currencyCacheMisses.inc()
+                exponents = dict(db.session.query(Currency.currency, Currency.exponent))
+                self._table = (frozenset(exponents), exponents)
+                self._loadedAt = time.monotonic()
+            return self._table
+
+    def codes(self):
+        return self._load()[0]
+
+    def exponents(self):
+        return self._load()[1]
+
+    def invalidate(self):
+        with self._lock:
+            self._table = None
+
+currencyCache = CurrencyCache()
+
+# Invalidate once the change is committed; dropping the cache at flush time
+# would let a concurrent request reload it before the new row is visible.
+@event.listens_for(Currency, 'after_insert')
+@event.listens_for(Currency, 'after_update')
+@event.listens_for(Currency, 'after_delete')
+def markCurrenciesChanged(mapper, connection, target):
+    object_session(target).info['currencies_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def invalidateCurrencyCache(session):
+    if session.info.pop('currencies_changed', False):
+        currencyCache.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def discardCurrencyChanges(session):
+    session.info.pop('currencies_changed', None)
+
+class CachedUser(UserMixin):
+    """Detached stand-in for User carrying only what requests need."""
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def __repr__(self):
+        return f'<Name {self.name}>'
+
+class UserCache:
+    """Bounded LRU of CachedUser records keyed by user UUID.
+
+    Sized by USER_CACHE_SIZE and expired after USER_CACHE_TTL seconds.
+    Committed updates and deletes of a User evict it; unknown ids are not
+    cached, so newly registered users are found on first lookup.
+    """
+
+    def __init__(self):
+        self._entries = None
+
+    def _cache(self):
+        if self._entries is None:
+            self._entries = LRUCache(current_app.config['USER_CACHE_SIZE'], current_app.config['USER_CACHE_TTL'])
+        return self._entries
+
+    def get(self, user_id):
+        user = self._cache().get(user_id)
+        if user is not None:
+            userCacheHits.inc()
+            return user
+        userCacheMisses.inc()
+        row = db.session.query(User.id, User.name).filter_by(id=user_id).first()
+        if row is None:
+            return None
+        return self.put(row)
+
+    def put(self, user):
+        cached = CachedUser(user.id, user.name)
+        self._cache().put(user.id, cached)
+        return cached
+
+    def invalidate(self, user_id):
+        if self._entries is not None:
+            self._entries.pop(user_id)
+
+    def clear(self):
+        if self._entries is not None:
+            self._entries.clear()
+
+userCache = UserCache()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def markUserChanged(mapper, connection, target):
+    object_session(target).info.setdefault('changed_users', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def invalidateUserCache(session):
+    for user_id in session.info.pop('changed_users', ()):
+        userCache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def discardUserChanges(session):
+    session.info.pop('changed_users', None)
@@ -1,8 +1,83 @@
 import os
 from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool
+from dbPool import TimedQueuePool
 load_dotenv()
 
+def envFlag(name):
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+def engineOptions(uri):
+    """SQLALCHEMY_ENGINE_OPTIONS from DB_* environment variables.
+
+    DB_EXTERNAL_POOLER hands pooling to PgBouncer or similar by not pooling at
+    all. Otherwise a TimedQueuePool sized by DB_POOL_SIZE, DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT and DB_POOL_RECYCLE is used; unset values keep
+    SQLAlchemy's defaults. SQLite keeps Flask-SQLAlchemy's own pool setup.
+    """
+    if uri is None or uri.startswith('sqlite'):
+        return {}
+    options = {}
+    if envFlag('DB_EXTERNAL_POOLER'):
+        options['poolclass'] = NullPool
+    else:
+        options['poolclass'] = TimedQueuePool
+        for name, option in (
+            ('DB_POOL_SIZE', 'pool_size'),
+            ('DB_MAX_OVERFLOW', 'max_overflow'),
+            ('DB_POOL_TIMEOUT', 'pool_timeout'),
+            ('DB_POOL_RECYCLE', 'pool_recycle'),
+        ):
+            if os.getenv(name) is not None:
+                options[option] = int(os.getenv(name))
+    if envFlag('DB_POOL_PRE_PING'):
+        options['pool_pre_ping'] = True
+    if os.getenv('DB_STATEMENT_TIMEOUT_MS') is not None and uri.startswith('postgres'):
+        options['connect_args'] = {'options': f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT_MS'))}"}
+    return options
+
+def replicaBinds():
+    """SQLALCHEMY_BINDS entries for the comma separated DATABASE_REPLICA_URIS."""
+    uris = [uri.strip() for uri in os.getenv('DATABASE_REPLICA_URIS', '').split(',') if uri.strip()]
+    return {f'replica{index}': dict(engineOptions(uri), url=uri) for index, uri in enumerate(uris)}
+
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI')
+    SQLALCHEMY_ENGINE_OPTIONS = engineOptions(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = replicaBinds()
+    READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = os.getenv('SECRET_KEY')
\ No newline at end of file
+    SECRET_KEY = os.getenv('SECRET_KEY')
+    MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 5000))
+    CURRENCY_CACHE_TTL = int(os.getenv('CURRENCY_CACHE_TTL', 300))
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 1000))
+    STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 1000))
+    SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 50))
+    MAX_TIMESERIES_BUCKETS = int(os.getenv('MAX_TIMESERIES_BUCKETS', 5000))
+    BASE_CURRENCY = os.getenv('BASE_CURRENCY', 'USD')
+    RATE_CACHE_TTL = int(os.getenv('RATE_CACHE_TTL', 3600))
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    HASH_WORKERS = int(os.getenv('HASH_WORKERS', 2))
+    HASH_QUEUE_DEPTH = int(os.getenv('HASH_QUEUE_DEPTH', 8))
+    AMOUNT_STORAGE = os.getenv('AMOUNT_STORAGE', 'numeric')
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 50000))
+    EXPORT_SETTLE_SECONDS = int(os.getenv('EXPORT_SETTLE_SECONDS', 60))
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 5000))
+    STATS_BATCH_SIZE = int(os.getenv('STATS_BATCH_SIZE', 10000))
+    RESPONSE_CACHE_ENABLED = envFlag('RESPONSE_CACHE_ENABLED')
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'local')
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 10000))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+    PROFILING_ENABLED = envFlag('PROFILING_ENABLED')
+    PROFILE_SAMPLE_RATE = int(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_HEADER = os.getenv('PROFILE_HEADER', 'X-Profile')
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    SLOW_QUERY_SECONDS = float(os.getenv('SLOW_QUERY_SECONDS', 0.5))
+    WRITE_BEHIND_ENABLED = envFlag('WRITE_BEHIND_ENABLED')
+    WRITE_BEHIND_PATH = os.getenv('WRITE_BEHIND_PATH', 'write_behind.sqlite')
+    WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', 100000))
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 5000))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 0.5))
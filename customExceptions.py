@@ -1,3 +1,18 @@
 class InternalServerException(Exception):
     "Internal server error occured"
-    pass
\ No newline at end of file
+    pass
+
+class ValidationException(Exception):
+    "Request payload failed validation"
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+class HashingOverloadedException(Exception):
+    "Password hashing queue is full"
+    pass
+
+class WriteBehindFullException(Exception):
+    "Write-behind journal has reached its pending row limit"
+    pass
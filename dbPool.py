@@ -0,0 +1,32 @@
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+from metrics import Counter, Gauge, Histogram
+
+checkoutWait = Histogram('db_pool_checkout_wait_seconds', 'Time spent obtaining a connection from the pool, including new connections and pre-ping')
+checkoutTimeouts = Counter('db_pool_checkout_timeouts_total', 'Pool checkouts that gave up after pool_timeout')
+checkedOut = Gauge('db_pool_checked_out', 'Connections currently checked out of the pool')
+overflow = Gauge('db_pool_overflow', 'Connections open beyond pool_size')
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits, for sizing the pool from data."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            checkoutTimeouts.inc()
+            raise
+        finally:
+            checkoutWait.observe(time.perf_counter()-started)
+        self._recordUsage()
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._recordUsage()
+
+    def _recordUsage(self):
+        checkedOut.set(self.checkedout())
+        overflow.set(max(self.overflow(), 0))
@@ -0,0 +1,104 @@
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# Response encoders for row listings. Rows are plain tuples in the order of
+# a columns tuple; each encoder turns them into one response body. JSON
+# records (a list of objects) is the default and stays what /getAll always
+# returned. Column-oriented JSON, MessagePack and Arrow IPC are picked through
+# the Accept header and skip per-row objects altogether. MessagePack and
+# Arrow are only offered when msgpack or pyarrow are installed, and the JSON
+# encoders use orjson when it is available.
+
+def jsonDefault(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+if orjson is not None:
+    def dumps(value):
+        return orjson.dumps(value, default=jsonDefault)
+else:
+    def dumps(value):
+        return json.dumps(value, default=jsonDefault, separators=(',', ':')).encode()
+
+def columnLists(columns, rows):
+    values = list(zip(*rows)) or [()]*len(columns)
+    return {column: list(value) for column, value in zip(columns, values)}
+
+class Encoder:
+    mimetype = None
+
+    def encode(self, columns, rows, extra=None):
+        """Body for rows; extra holds top-level fields such as next_cursor where the format has room for them."""
+        raise NotImplementedError
+
+class RecordsJsonEncoder(Encoder):
+    mimetype = 'application/json'
+
+    def encode(self, columns, rows, extra=None):
+        records = [dict(zip(columns, row)) for row in rows]
+        if extra is None:
+            return dumps(records)
+        return dumps({'items':records, **extra})
+
+class ColumnsJsonEncoder(Encoder):
+    """{"columns": [...], "data": {column: [values...]}} plus any extra fields."""
+    mimetype = 'application/vnd.columns+json'
+
+    def encode(self, columns, rows, extra=None):
+        return dumps({'columns':list(columns), 'data':columnLists(columns, rows), **(extra or {})})
+
+class MsgpackEncoder(Encoder):
+    """{"columns": [...], "rows": [[...], ...]} plus any extra fields."""
+    mimetype = 'application/msgpack'
+
+    def encode(self, columns, rows, extra=None):
+        return msgpack.packb({'columns':list(columns), 'rows':rows, **(extra or {})}, default=jsonDefault)
+
+class ArrowEncoder(Encoder):
+    """One record batch in the Arrow IPC stream format; extra fields go into the schema metadata."""
+    mimetype = 'application/vnd.apache.arrow.stream'
+
+    def encode(self, columns, rows, extra=None):
+        batch = pyarrow.record_batch(
+            [pyarrow.array(values) for values in columnLists(columns, rows).values()],
+            names=list(columns),
+        )
+        metadata = {key: '' if value is None else str(value) for key, value in (extra or {}).items()}
+        batch = batch.replace_schema_metadata(metadata)
+        sink = io.BytesIO()
+        with pyarrow.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue()
+
+ENCODERS = [RecordsJsonEncoder(), ColumnsJsonEncoder()]
+if msgpack is not None:
+    ENCODERS.append(MsgpackEncoder())
+if pyarrow is not None:
+    ENCODERS.append(ArrowEncoder())
+
+def negotiate(acceptMimetypes):
+    """Best encoder for a request's Accept header, JSON records when nothing else matches."""
+    mimetype = acceptMimetypes.best_match([encoder.mimetype for encoder in ENCODERS], default=RecordsJsonEncoder.mimetype)
+    return next(encoder for encoder in ENCODERS if encoder.mimetype == mimetype)
@@ -0,0 +1,203 @@
+import csv
+import hashlib
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from flask import current_app
+from models import db, Transaction, MINOR_UNITS
+from caches import currencyCache
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Bulk exports of transactions as CSV, Arrow IPC files or Parquet. Rows are
+# read from a server-side cursor EXPORT_BATCH_SIZE at a time and every batch
+# is written out straight away (one Parquet row group or Arrow record batch
+# each), so an export never holds more than one batch in memory.
+#
+# Incremental exports select rows by created_at: an export covers
+# since < created_at <= until, where until is the database clock minus
+# EXPORT_SETTLE_SECONDS so transactions still in flight at export time are
+# picked up by the next export. until is the watermark to pass as since next
+# time.
+#
+# Every export comes with a manifest (rows, SHA-256 and byte size of the
+# file, watermarks), which verifyExport checks against the file offline.
+
+COLUMNS = ('id', 'user_id', 'type', 'amount', 'currency', 'date', 'description', 'created_at')
+# Wide enough for every ISO 4217 exponent, so both amount storages export exactly.
+AMOUNT_SCALE = 4
+
+def exportQuery(user_id, since, until):
+    query = db.session.query(*(getattr(Transaction, column) for column in COLUMNS)).filter(Transaction.created_at <= until)
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    if since is not None:
+        query = query.filter(Transaction.created_at > since)
+    return query.order_by(Transaction.user_id, Transaction.date, Transaction.id)
+
+def exportWatermark():
+    now = db.session.query(db.func.now()).scalar()
+    return now.replace(microsecond=0)-timedelta(seconds=current_app.config['EXPORT_SETTLE_SECONDS'])
+
+def exportBatches(query):
+    """Lists of COLUMNS tuples with exact Decimal amounts, read batch by batch from a server-side cursor."""
+    statement = query.statement.execution_options(yield_per=current_app.config['EXPORT_BATCH_SIZE'])
+    exponents = currencyCache.exponents() if MINOR_UNITS else None
+    for batch in db.session.execute(statement).partitions():
+        if exponents is None:
+            yield [tuple(row) for row in batch]
+        else:
+            yield [(*row[:3], Decimal(row[3]).scaleb(-exponents[row[4]]), *row[4:]) for row in batch]
+
+class CsvWriter:
+    extension = 'csv'
+    mimetype = 'text/csv'
+
+    def __init__(self, sink):
+        self._text = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+        self._writer = csv.writer(self._text)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self._writer.writerows((*row[:5], row[5].isoformat(), row[6], row[7].isoformat()) for row in rows)
+
+    def close(self):
+        self._text.flush()
+        self._text.detach()
+
+def arrowSchema():
+    return pyarrow.schema([
+        ('id', pyarrow.string()),
+        ('user_id', pyarrow.string()),
+        ('type', pyarrow.string()),
+        ('amount', pyarrow.decimal128(18, AMOUNT_SCALE)),
+        ('currency', pyarrow.string()),
+        ('date', pyarrow.timestamp('us')),
+        ('description', pyarrow.string()),
+        ('created_at', pyarrow.timestamp('us')),
+    ])
+
+def arrowBatch(rows, schema):
+    columns = list(zip(*rows))
+    columns[0] = [str(value) for value in columns[0]]
+    columns[1] = [str(value) for value in columns[1]]
+    return pyarrow.record_batch([pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+
+class ArrowWriter:
+    """Arrow IPC file format, one record batch per export batch."""
+    extension = 'arrow'
+    mimetype = 'application/vnd.apache.arrow.file'
+
+    def __init__(self, sink):
+        self._schema = arrowSchema()
+        self._writer = pyarrow.ipc.new_file(sink, self._schema)
+
+    def write(self, rows):
+        self._writer.write_batch(arrowBatch(rows, self._schema))
+
+    def close(self):
+        self._writer.close()
+
+class ParquetWriter:
+    """Parquet, one row group per export batch."""
+    extension = 'parquet'
+    mimetype = 'application/vnd.apache.parquet'
+
+    def __init__(self, sink):
+        self._schema = arrowSchema()
+        self._writer = pyarrow.parquet.ParquetWriter(sink, self._schema)
+
+    def write(self, rows):
+        self._writer.write_batch(arrowBatch(rows, self._schema))
+
+    def close(self):
+        self._writer.close()
+
+WRITERS = {'csv': CsvWriter}
+if pyarrow is not None:
+    WRITERS.update({'arrow': ArrowWriter, 'parquet': ParquetWriter})
+
+class HashingSink(io.RawIOBase):
+    """Binary file wrapper keeping a SHA-256 and byte count of everything written."""
+
+    def __init__(self, target):
+        self._target = target
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._target.write(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        self._target.flush()
+
+def writeExport(target, exportFormat, user_id=None, since=None):
+    """Write one export into the binary file target; returns its manifest."""
+    until = exportWatermark()
+    sink = HashingSink(target)
+    writer = WRITERS[exportFormat](sink)
+    rows = 0
+    for batch in exportBatches(exportQuery(user_id, since, until)):
+        writer.write(batch)
+        rows += len(batch)
+    writer.close()
+    sink.flush()
+    return {
+        'format':exportFormat,
+        'user_id':None if user_id is None else str(user_id),
+        'since':None if since is None else since.isoformat(),
+        'until':until.isoformat(),
+        'rows':rows,
+        'bytes':sink.size,
+        'sha256':sink.sha256.hexdigest(),
+    }
+
+def countRows(path, exportFormat):
+    if exportFormat == 'csv':
+        with open(path, newline='', encoding='utf-8') as exportFile:
+            return sum(1 for _ in csv.reader(exportFile))-1
+    if exportFormat == 'arrow':
+        with pyarrow.memory_map(path) as source:
+            reader = pyarrow.ipc.open_file(source)
+            return sum(reader.get_batch(index).num_rows for index in range(reader.num_record_batches))
+    return pyarrow.parquet.ParquetFile(path).metadata.num_rows
+
+def verifyExport(path, manifest):
+    """Problems found comparing the file at path with its manifest; empty when it checks out."""
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as exportFile:
+        for chunk in iter(lambda: exportFile.read(1 << 20), b''):
+            sha256.update(chunk)
+            size += len(chunk)
+    problems = []
+    if size != manifest['bytes']:
+        problems.append(f"size is {size} bytes, manifest says {manifest['bytes']}")
+    if sha256.hexdigest() != manifest['sha256']:
+        problems.append('SHA-256 does not match the manifest')
+    if not problems:
+        rows = countRows(path, manifest['format'])
+        if rows != manifest['rows']:
+            problems.append(f"file holds {rows} rows, manifest says {manifest['rows']}")
+    return problems
+
+def manifestPath(path):
+    return path+'.manifest.json'
+
+def writeManifest(path, manifest):
+    with open(manifestPath(path), 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=2)
@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from customExceptions import HashingOverloadedException
+
+# Password hashing and verification run on a small dedicated thread pool
+# instead of the request thread. hashlib's scrypt/pbkdf2 and bcrypt release
+# the GIL, so threads give real parallelism here. At most
+# HASH_WORKERS + HASH_QUEUE_DEPTH jobs are admitted at once; anything beyond
+# that is refused straight away so login bursts shed load with a 503 rather
+# than pile up behind key derivation.
+
+class HashingPool:
+    def __init__(self, workers, queueDepth):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hashing')
+        self._slots = threading.BoundedSemaphore(workers+queueDepth)
+
+    def run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingOverloadedException()
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+_pool = None
+_poolLock = threading.Lock()
+
+def hashingPool():
+    global _pool
+    if _pool is None:
+        with _poolLock:
+            if _pool is None:
+                _pool = HashingPool(current_app.config['HASH_WORKERS'], current_app.config['HASH_QUEUE_DEPTH'])
+    return _pool
+
+def _bcryptHash(plainText, rounds):
+    # bcrypt only looks at the first 72 bytes; newer releases refuse longer input.
+    return bcrypt.hashpw(plainText.encode()[:72], bcrypt.gensalt(rounds)).decode()
+
+def _bcryptCheck(hashText, plainText):
+    return bcrypt.checkpw(plainText.encode()[:72], hashText.encode())
+
+def computeHash(plainText, method, rounds):
+    """Hash synchronously with the given settings; used by the pool and the benchmark."""
+    if method == 'bcrypt':
+        return _bcryptHash(plainText, rounds)
+    return generate_password_hash(plainText, method=method)
+
+def _check(hashText, plainText):
+    if hashText.startswith('$2'):
+        return _bcryptCheck(hashText, plainText)
+    return check_password_hash(hashText, plainText)
+
+def hashPassword(plainText):
+    config = current_app.config
+    return hashingPool().run(computeHash, plainText, config['PASSWORD_HASH_METHOD'], config['BCRYPT_LOG_ROUNDS'])
+
+def verifyPassword(hashText, plainText):
+    return hashingPool().run(_check, hashText, plainText)
+
+_methodPrefixes = {}
+
+def _methodPrefix(method):
+    """The parameter prefix Werkzeug writes for method, e.g. 'scrypt' -> 'scrypt:32768:8:1'."""
+    if method not in _methodPrefixes:
+        _methodPrefixes[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return _methodPrefixes[method]
+
+def needsRehash(hashText):
+    """Whether hashText was made with a different algorithm or cost than configured."""
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if method == 'bcrypt':
+        if not hashText.startswith('$2b$'):
+            return True
+        return int(hashText.split('$')[2]) != current_app.config['BCRYPT_LOG_ROUNDS']
+    return hashText.split('$', 1)[0] != _methodPrefix(method)
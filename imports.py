@@ -0,0 +1,162 @@
+import csv
+import hashlib
+import html
+import re
+import time
+from flask import current_app
+from models import db, Expense, Income, Investment, MINOR_UNITS
+from caches import currencyCache
+from customExceptions import ValidationException
+from validation import parseTransaction
+from money import amountExponents
+from ingest import insertNewTransactions
+
+# Bank statement imports from CSV or OFX files. The file is read as a stream
+# of records, each one is validated into a row, and rows are inserted
+# IMPORT_BATCH_SIZE at a time with a commit per batch, so memory stays flat
+# however long the statement is. The available currencies and their
+# exponents are looked up once per file instead of once per row.
+#
+# Every imported row carries a content_hash of its user, type, date, amount,
+# currency, description and bank reference (FITID for OFX, the optional
+# reference column for CSV). The unique (content_hash, date) index makes
+# importing the same statement again, or overlapping statements, insert
+# every transaction only once.
+#
+# CSV files need a header with date, amount and currency columns and may have
+# description, type and reference columns. Without a type, negative amounts
+# are expenses and positive ones incomes; stored amounts are always positive.
+
+TYPES = {'expense': Expense, 'income': Income, 'investment': Investment}
+MAX_REPORTED_ERRORS = 100
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+def csvRecords(stream):
+    """(line number, record) pairs of a CSV text stream with a header row."""
+    reader = csv.DictReader(stream)
+    missing = {'date', 'amount', 'currency'}-set(reader.fieldnames or ())
+    if missing:
+        raise ValidationException(f"CSV header lacks {', '.join(sorted(missing))}")
+    for record in reader:
+        yield reader.line_num, record
+
+def ofxTags(stream, chunkSize=1 << 16):
+    """(closing, tag, text) triples of an OFX (SGML or XML) text stream, read chunk by chunk."""
+    tail = ''
+    while True:
+        chunk = stream.read(chunkSize)
+        text = tail+chunk
+        end = len(text) if not chunk else text.rfind('<')
+        if end == -1:
+            tail = text
+            continue
+        for match in OFX_TAG.finditer(text, 0, end):
+            yield match.group(1) == '/', match.group(2).upper(), html.unescape(match.group(3).strip())
+        if not chunk:
+            return
+        tail = text[end:]
+
+def ofxDate(value):
+    """ISO date of an OFX datetime such as 20240115120000.000[-5:EST]."""
+    digits = value[:8]
+    return f'{digits[:4]}-{digits[4:6]}-{digits[6:8]}' if len(digits) == 8 and digits.isdigit() else value
+
+def ofxRecords(stream):
+    """(transaction number, record) pairs of the STMTTRN entries of an OFX statement."""
+    currency = None
+    transaction = None
+    count = 0
+    for closing, tag, text in ofxTags(stream):
+        if tag == 'CURDEF' and not closing:
+            currency = text.upper()
+        elif tag == 'STMTTRN':
+            if closing and transaction is not None:
+                count += 1
+                yield count, transaction
+                transaction = None
+            elif not closing:
+                transaction = {'currency': currency}
+        elif transaction is not None and not closing:
+            if tag == 'DTPOSTED':
+                transaction['date'] = ofxDate(text)
+            elif tag == 'TRNAMT':
+                transaction['amount'] = text
+            elif tag == 'NAME' or (tag == 'MEMO' and 'description' not in transaction):
+                transaction['description'] = text
+            elif tag == 'FITID':
+                transaction['reference'] = text
+    if transaction is not None:
+        count += 1
+        yield count, transaction
+
+READERS = {'csv': csvRecords, 'ofx': ofxRecords}
+
+def contentHash(user_id, identity, row, reference):
+    amount = row['amount'] if MINOR_UNITS else f"{row['amount']:.2f}"
+    content = '\x1f'.join((str(user_id), identity, row['date'].isoformat(), str(amount), row['currency'], row['description'] or '', reference or ''))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def importRow(user_id, record, currencies, exponents):
+    """(model, row) of one statement record, or a ValidationException."""
+    row = parseTransaction(record, 'transaction', currencies, exponents)
+    recordType = (record.get('type') or '').strip().lower()
+    if recordType:
+        if recordType not in TYPES:
+            raise ValidationException(f"Type must be one of {', '.join(TYPES)}")
+        model = TYPES[recordType]
+    else:
+        model = Expense if row['amount'] < 0 else Income
+    row['amount'] = abs(row['amount'])
+    row['description'] = (row['description'] or '').strip()
+    row['user_id'] = user_id
+    row['content_hash'] = contentHash(user_id, model.__mapper__.polymorphic_identity, row, record.get('reference'))
+    return model, row
+
+def importStatement(user_id, records, batchSize=None):
+    """Validate and insert (line, record) pairs for user_id; returns the import statistics.
+
+    Invalid records are skipped and reported with their line (CSV) or
+    transaction (OFX) number; duplicates of stored rows are counted but not
+    inserted. Every batch is committed on its own.
+    """
+    batchSize = batchSize or current_app.config['IMPORT_BATCH_SIZE']
+    currencies = currencyCache.codes()
+    exponents = amountExponents()
+    started = time.perf_counter()
+    stats = {'rows':0,'inserted':0,'duplicates':0,'invalid':0,'errors':[]}
+    batches = {model: [] for model in TYPES.values()}
+
+    def flush(model):
+        rows = batches[model]
+        inserted = len(insertNewTransactions(model, rows))
+        db.session.commit()
+        stats['inserted'] += inserted
+        stats['duplicates'] += len(rows)-inserted
+        batches[model] = []
+
+    for line, record in records:
+        stats['rows'] += 1
+        try:
+            model, row = importRow(user_id, record, currencies, exponents)
+        except ValidationException as e:
+            stats['invalid'] += 1
+            if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                stats['errors'].append({'line':line,'error':e.message})
+            continue
+        batches[model].append(row)
+        if len(batches[model]) >= batchSize:
+            flush(model)
+    for model in TYPES.values():
+        if batches[model]:
+            flush(model)
+
+    seconds = time.perf_counter()-started
+    stats['seconds'] = round(seconds, 3)
+    stats['rows_per_second'] = round(stats['rows']/seconds) if seconds else None
+    return stats
+
+def importFormat(filename, requested=None):
+    """Format name from an explicit choice or the file extension; None if neither names a reader."""
+    name = (requested or filename.rsplit('.', 1)[-1]).lower()
+    return name if name in READERS else None
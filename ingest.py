@@ -0,0 +1,56 @@
+import uuid
+from sqlalchemy import insert
+from models import db, Transaction
+from rollups import UPSERT_INSERTS, applyToRollups
+from responseCache import noteWrittenUsers
+
+def insertTransactions(model, rows):
+    """Insert validated rows of model in a single executemany INSERT.
+
+    Each row gets its id assigned up front so callers can report it back,
+    and its type discriminator from model. The daily and monthly rollups are
+    updated in the same transaction; the caller owns it and is responsible
+    for committing.
+    """
+    identity = model.__mapper__.polymorphic_identity
+    for row in rows:
+        row.setdefault('id', uuid.uuid4())
+        row['type'] = identity
+    if rows:
+        db.session.execute(insert(model), rows)
+        applyToRollups(rows)
+        noteWrittenUsers(db.session, {row['user_id'] for row in rows})
+    return rows
+
+def insertNewTransactions(model, rows):
+    """insertTransactions for rows carrying a content_hash, skipping those already stored.
+
+    Duplicates are detected by the unique (content_hash, date) index, so
+    re-importing the same rows is a no-op. Returns the rows that were
+    inserted; only they are folded into the rollups.
+    """
+    identity = model.__mapper__.polymorphic_identity
+    for row in rows:
+        row.setdefault('id', uuid.uuid4())
+        row['type'] = identity
+    if not rows:
+        return rows
+    table = Transaction.__table__
+    upsertInsert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if upsertInsert is None:
+        stored = set(db.session.query(Transaction.content_hash, Transaction.date).filter(
+            Transaction.content_hash.in_([row['content_hash'] for row in rows])
+        ))
+        fresh = {}
+        for row in rows:
+            fresh.setdefault((row['content_hash'], row['date']), row)
+        rows = [row for key, row in fresh.items() if key not in stored]
+        if rows:
+            db.session.execute(insert(table), rows)
+    else:
+        statement = upsertInsert(table).on_conflict_do_nothing(index_elements=['content_hash','date']).returning(table.c.id)
+        inserted = set(db.session.execute(statement, rows).scalars())
+        rows = [row for row in rows if row['id'] in inserted]
+    applyToRollups(rows)
+    noteWrittenUsers(db.session, {row['user_id'] for row in rows})
+    return rows
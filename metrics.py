@@ -0,0 +1,86 @@
+import threading
+
+# Process-local metrics rendered in the Prometheus text exposition format at
+# /metrics. Every metric registers itself on creation.
+
+registry = []
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labelText(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        if not self._values and not self.labelnames:
+            yield self.name, 0
+        for key, value in sorted(self._values.items()):
+            yield self.name + self._labelText(key), value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name} {value}' for name, value in self.samples())
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = 'histogram'
+    defaultBuckets = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=defaultBuckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0]*len(self.buckets), 0, 0))
+            counts = [bucket+(value <= bound) for bucket, bound in zip(counts, self.buckets)]
+            self._values[key] = (counts, total+value, count+1)
+
+    def value(self, **labels):
+        """Number of observations."""
+        entry = self._values.get(self._key(labels))
+        return 0 if entry is None else entry[2]
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self._values.items()):
+            for bound, bucket in zip(self.buckets, counts):
+                yield self.name+'_bucket'+self._labelText(key, [('le', bound)]), bucket
+            yield self.name+'_bucket'+self._labelText(key, [('le', '+Inf')]), count
+            yield self.name+'_sum'+self._labelText(key), total
+            yield self.name+'_count'+self._labelText(key), count
+
+def render():
+    return '\n'.join(metric.render() for metric in registry) + '\n'
@@ -0,0 +1,38 @@
+"""add (user_id, date) covering indexes to expense,income and investment
+
+Revision ID: 5c1e0b7f9a2d
+Revises: 046db8ea1f53
+Create Date: 2026-10-18 09:12:41.208315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e0b7f9a2d'
+down_revision = '046db8ea1f53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.create_index('ix_expenses_user_id_date', ['user_id', 'date'], unique=False, postgresql_include=['amount', 'currency'])
+
+    with op.batch_alter_table('incomes', schema=None) as batch_op:
+        batch_op.create_index('ix_incomes_user_id_date', ['user_id', 'date'], unique=False, postgresql_include=['amount', 'currency'])
+
+    with op.batch_alter_table('investments', schema=None) as batch_op:
+        batch_op.create_index('ix_investments_user_id_date', ['user_id', 'date'], unique=False, postgresql_include=['amount', 'currency'])
+
+
+def downgrade():
+    with op.batch_alter_table('investments', schema=None) as batch_op:
+        batch_op.drop_index('ix_investments_user_id_date')
+
+    with op.batch_alter_table('incomes', schema=None) as batch_op:
+        batch_op.drop_index('ix_incomes_user_id_date')
+
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.drop_index('ix_expenses_user_id_date')
@@ -0,0 +1,52 @@
+"""add description search index (tsvector GIN on PostgreSQL, FTS5 on SQLite)
+
+Revision ID: 6b2e9f4c1d07
+Revises: 0a9d4e7c5b18
+Create Date: 2026-10-18 21:04:37.118530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2e9f4c1d07'
+down_revision = '0a9d4e7c5b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Built on every partition in one go; CONCURRENTLY is not available
+        # for partitioned tables.
+        op.execute("CREATE INDEX ix_transactions_description_search ON transactions USING gin (to_tsvector('simple', coalesce(description, '')))")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE transactions_search USING fts5(description, content='transactions', content_rowid='rowid')")
+        op.execute(
+            "CREATE TRIGGER transactions_search_insert AFTER INSERT ON transactions BEGIN "
+            "INSERT INTO transactions_search(rowid, description) VALUES (new.rowid, new.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER transactions_search_delete AFTER DELETE ON transactions BEGIN "
+            "INSERT INTO transactions_search(transactions_search, rowid, description) VALUES ('delete', old.rowid, old.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER transactions_search_update AFTER UPDATE OF description ON transactions BEGIN "
+            "INSERT INTO transactions_search(transactions_search, rowid, description) VALUES ('delete', old.rowid, old.description); "
+            "INSERT INTO transactions_search(rowid, description) VALUES (new.rowid, new.description); END"
+        )
+        # Index the rows already there.
+        op.execute("INSERT INTO transactions_search(transactions_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX ix_transactions_description_search')
+    elif dialect == 'sqlite':
+        op.execute('DROP TRIGGER transactions_search_update')
+        op.execute('DROP TRIGGER transactions_search_delete')
+        op.execute('DROP TRIGGER transactions_search_insert')
+        op.execute('DROP TABLE transactions_search')
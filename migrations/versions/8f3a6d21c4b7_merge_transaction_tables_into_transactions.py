@@ -0,0 +1,78 @@
+"""merge expenses, incomes and investments into a single transactions table
+
+Revision ID: 8f3a6d21c4b7
+Revises: 5c1e0b7f9a2d
+Create Date: 2026-10-18 11:47:05.331902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '8f3a6d21c4b7'
+down_revision = '5c1e0b7f9a2d'
+branch_labels = None
+depends_on = None
+
+# transactionType discriminator -> legacy table
+LEGACY_TABLES = {
+    'expense': 'expenses',
+    'income': 'incomes',
+    'investment': 'investments',
+}
+
+
+def upgrade():
+    op.create_table('transactions',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('type', sa.String(length=20), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('description', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['currency'], ['currencies.currency'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    for transactionType, table in LEGACY_TABLES.items():
+        op.execute(
+            f"INSERT INTO transactions (id, user_id, type, amount, currency, date, description) "
+            f"SELECT id, user_id, '{transactionType}', amount, currency, date, description FROM {table}"
+        )
+
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.create_index('ix_transactions_user_id_date', ['user_id', 'date'], unique=False, postgresql_include=['amount', 'currency', 'type'])
+        batch_op.create_index('ix_transactions_user_id_type_date', ['user_id', 'type', 'date'], unique=False, postgresql_include=['amount', 'currency'])
+
+    for table in LEGACY_TABLES.values():
+        op.drop_table(table)
+
+
+def downgrade():
+    for transactionType, table in LEGACY_TABLES.items():
+        op.create_table(table,
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('date', sa.DateTime(), nullable=True),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['currency'], ['currencies.currency'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.execute(
+            f"INSERT INTO {table} (id, user_id, amount, currency, date, description) "
+            f"SELECT id, user_id, amount, currency, date, description FROM transactions WHERE type = '{transactionType}'"
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(f'ix_{table}_user_id_date', ['user_id', 'date'], unique=False, postgresql_include=['amount', 'currency'])
+
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactions_user_id_type_date')
+        batch_op.drop_index('ix_transactions_user_id_date')
+
+    op.drop_table('transactions')
@@ -0,0 +1,57 @@
+"""add recurring_rules and recurring_exceptions
+
+Revision ID: 9d5a3c7e2f14
+Revises: 6b2e9f4c1d07
+Create Date: 2026-10-18 22:31:05.402118
+
+"""
+import os
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '9d5a3c7e2f14'
+down_revision = '6b2e9f4c1d07'
+branch_labels = None
+depends_on = None
+
+# Same amount storage as transactions.amount, see e7b1c5a93f20.
+MINOR_UNITS = os.getenv('AMOUNT_STORAGE', 'numeric') == 'minor'
+
+
+def upgrade():
+    op.create_table('recurring_rules',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('type', sa.String(length=20), nullable=False),
+    sa.Column('amount', sa.BigInteger() if MINOR_UNITS else sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('description', sa.String(length=255), nullable=True),
+    sa.Column('frequency', sa.String(length=10), nullable=False),
+    sa.Column('interval', sa.Integer(), nullable=False),
+    sa.Column('start', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.Column('until', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['currency'], ['currencies.currency'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('recurring_rules', schema=None) as batch_op:
+        batch_op.create_index('ix_recurring_rules_user_id_start', ['user_id', 'start'], unique=False)
+
+    op.create_table('recurring_exceptions',
+    sa.Column('rule_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('occurrence', sa.DateTime(), nullable=False),
+    sa.Column('transaction_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.ForeignKeyConstraint(['rule_id'], ['recurring_rules.id'], ),
+    sa.PrimaryKeyConstraint('rule_id', 'occurrence')
+    )
+
+
+def downgrade():
+    op.drop_table('recurring_exceptions')
+    with op.batch_alter_table('recurring_rules', schema=None) as batch_op:
+        batch_op.drop_index('ix_recurring_rules_user_id_start')
+    op.drop_table('recurring_rules')
@@ -0,0 +1,49 @@
+"""add daily and monthly rollup tables
+
+Revision ID: a71d4c0e9b35
+Revises: 8f3a6d21c4b7
+Create Date: 2026-10-18 13:05:52.770164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'a71d4c0e9b35'
+down_revision = '8f3a6d21c4b7'
+branch_labels = None
+depends_on = None
+
+# period column -> (rollup table, truncation per dialect)
+ROLLUPS = {
+    'day': ('daily_rollups', {'postgresql': 'CAST(date AS DATE)', 'sqlite': 'date(date)'}),
+    'month': ('monthly_rollups', {'postgresql': "CAST(date_trunc('month', date) AS DATE)", 'sqlite': "date(date, 'start of month')"}),
+}
+
+
+def upgrade():
+    for period, (table, truncations) in ROLLUPS.items():
+        op.create_table(table,
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('type', sa.String(length=20), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column(period, sa.Date(), nullable=False),
+        sa.Column('total', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['currency'], ['currencies.currency'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'type', 'currency', period)
+        )
+
+        truncate = truncations[op.get_bind().dialect.name]
+        op.execute(
+            f"INSERT INTO {table} (user_id, type, currency, {period}, total, count) "
+            f"SELECT user_id, type, currency, {truncate}, SUM(amount), COUNT(*) FROM transactions "
+            f"WHERE date IS NOT NULL GROUP BY user_id, type, currency, {truncate}"
+        )
+
+
+def downgrade():
+    op.drop_table('monthly_rollups')
+    op.drop_table('daily_rollups')
@@ -0,0 +1,103 @@
+"""partition transactions by month of date
+
+Revision ID: d48b2f6a1c93
+Revises: c2e95f1a7d08
+Create Date: 2026-10-18 15:02:48.117260
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'd48b2f6a1c93'
+down_revision = 'c2e95f1a7d08'
+branch_labels = None
+depends_on = None
+
+# Months created past the current one; `flask partitions create` keeps
+# extending this window afterwards.
+MONTHS_AHEAD = 3
+
+COLUMNS = 'id, user_id, type, amount, currency, date, description'
+
+
+def nextMonth(month):
+    return date(month.year+month.month//12, month.month%12+1, 1)
+
+
+def createTransactions(name, partitioned):
+    op.create_table(name,
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('type', sa.String(length=20), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=not partitioned),
+    sa.Column('description', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['currency'], ['currencies.currency'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint(*(['id', 'date'] if partitioned else ['id'])),
+    **({'postgresql_partition_by': 'RANGE (date)'} if partitioned else {})
+    )
+    with op.batch_alter_table(name, schema=None) as batch_op:
+        batch_op.create_index('ix_transactions_user_id_date', ['user_id', 'date'], unique=False, postgresql_include=['amount', 'currency', 'type'])
+        batch_op.create_index('ix_transactions_user_id_type_date', ['user_id', 'type', 'date'], unique=False, postgresql_include=['amount', 'currency'])
+
+
+def renameAway(suffix):
+    op.rename_table('transactions', f'transactions_{suffix}')
+    for index in ('transactions_pkey', 'ix_transactions_user_id_date', 'ix_transactions_user_id_type_date'):
+        op.execute(f'ALTER INDEX {index} RENAME TO {index}_{suffix}')
+
+
+def upgrade():
+    # The partition key has to be part of the primary key, so date becomes
+    # NOT NULL. Rows without a date were never reachable through the
+    # date-ranged endpoints; they are kept aside in transactions_undated.
+    op.execute(f'CREATE TABLE transactions_undated AS SELECT {COLUMNS} FROM transactions WHERE date IS NULL')
+    op.execute('DELETE FROM transactions WHERE date IS NULL')
+
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('transactions', schema=None, recreate='always') as batch_op:
+            batch_op.alter_column('date', existing_type=sa.DateTime(), nullable=False)
+            batch_op.create_primary_key('pk_transactions', ['id', 'date'])
+        return
+
+    renameAway('unpartitioned')
+    createTransactions('transactions', partitioned=True)
+    op.execute('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT')
+
+    first = op.get_bind().execute(sa.text(
+        "SELECT CAST(date_trunc('month', MIN(date)) AS date) FROM transactions_unpartitioned"
+    )).scalar()
+    last = date.today().replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last = nextMonth(last)
+    month = min(first or last, last)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE transactions_y{month.year}m{month.month:02d} PARTITION OF transactions "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{nextMonth(month).isoformat()}')"
+        )
+        month = nextMonth(month)
+
+    op.execute(f'INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_unpartitioned')
+    op.drop_table('transactions_unpartitioned')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('transactions', schema=None, recreate='always') as batch_op:
+            batch_op.alter_column('date', existing_type=sa.DateTime(), nullable=True)
+            batch_op.create_primary_key('pk_transactions', ['id'])
+    else:
+        renameAway('partitioned')
+        createTransactions('transactions', partitioned=False)
+        op.execute(f'INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_partitioned')
+        # Dropping the parent drops its attached partitions; detached ones are left alone.
+        op.drop_table('transactions_partitioned')
+
+    op.execute(f'INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_undated')
+    op.drop_table('transactions_undated')
@@ -0,0 +1,84 @@
+"""add currencies.exponent and optional minor unit amount storage
+
+Revision ID: e7b1c5a93f20
+Revises: d48b2f6a1c93
+Create Date: 2026-10-18 16:10:05.482913
+
+"""
+import os
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e7b1c5a93f20'
+down_revision = 'd48b2f6a1c93'
+branch_labels = None
+depends_on = None
+
+# Amount columns switch to BIGINT minor units when AMOUNT_STORAGE=minor is
+# set while upgrading, matching models.AmountType/TotalType. To change the
+# format of an existing database later, downgrade past this revision and
+# upgrade again with the new setting.
+MINOR_UNITS = os.getenv('AMOUNT_STORAGE', 'numeric') == 'minor'
+
+# ISO 4217 exponents other than 2, as in money.ISO_EXPONENTS.
+ISO_EXPONENTS = {
+    'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0, 'KRW': 0,
+    'PYG': 0, 'RWF': 0, 'UGX': 0, 'UYI': 0, 'VND': 0, 'VUV': 0, 'XAF': 0, 'XOF': 0, 'XPF': 0,
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+    'CLF': 4, 'UYW': 4,
+}
+
+# table -> (amount column, NUMERIC type it had)
+AMOUNT_COLUMNS = {
+    'transactions': ('amount', sa.Numeric(precision=10, scale=2)),
+    'daily_rollups': ('total', sa.Numeric(precision=18, scale=2)),
+    'monthly_rollups': ('total', sa.Numeric(precision=18, scale=2)),
+}
+
+
+def unitFactor():
+    """SQL CASE giving 10**exponent of each row's currency."""
+    exponents = op.get_bind().execute(sa.text('SELECT currency, exponent FROM currencies')).all()
+    whens = ' '.join(f"WHEN '{currency}' THEN {10**exponent}" for currency, exponent in exponents if exponent != 2)
+    return f'(CASE currency {whens} ELSE 100 END)' if whens else '100'
+
+
+def convertAmounts(toMinorUnits):
+    factor = unitFactor()
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for table, (column, numeric) in AMOUNT_COLUMNS.items():
+        if toMinorUnits:
+            using = f'CAST(ROUND({column} * {factor}) AS BIGINT)'
+            oldType, newType = numeric, sa.BigInteger()
+        else:
+            using = f'CAST({column} AS NUMERIC) / {factor}' if postgres else f'{column} * 1.0 / {factor}'
+            oldType, newType = sa.BigInteger(), numeric
+        if postgres:
+            op.alter_column(table, column, existing_type=oldType, type_=newType, existing_nullable=False, postgresql_using=using)
+            continue
+        op.execute(f'UPDATE {table} SET {column} = {using}')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column, existing_type=oldType, type_=newType, existing_nullable=False)
+
+
+def upgrade():
+    with op.batch_alter_table('currencies', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('exponent', sa.Integer(), server_default='2', nullable=False))
+
+    currencies = sa.table('currencies', sa.column('currency', sa.String), sa.column('exponent', sa.Integer))
+    for exponent in sorted(set(ISO_EXPONENTS.values())):
+        op.execute(currencies.update().where(
+            currencies.c.currency.in_([code for code, value in ISO_EXPONENTS.items() if value == exponent])
+        ).values(exponent=exponent))
+
+    if MINOR_UNITS:
+        convertAmounts(toMinorUnits=True)
+
+
+def downgrade():
+    if MINOR_UNITS:
+        convertAmounts(toMinorUnits=False)
+
+    with op.batch_alter_table('currencies', schema=None) as batch_op:
+        batch_op.drop_column('exponent')
@@ -0,0 +1,30 @@
+"""add transactions.created_at
+
+Revision ID: f3c08e6b2d51
+Revises: e7b1c5a93f20
+Create Date: 2026-10-18 17:03:44.290158
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c08e6b2d51'
+down_revision = 'e7b1c5a93f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows get the time of the migration, so the first incremental
+    # export after it includes all of them.
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+        batch_op.create_index('ix_transactions_created_at', ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactions_created_at')
+        batch_op.drop_column('created_at')
@@ -1,12 +1,28 @@
 
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import DateTime, Numeric
+from sqlalchemy import DDL, BigInteger, DateTime, Numeric, event
 from sqlalchemy.dialects.postgresql import UUID 
+from sqlalchemy.ext.compiler import compiles
 import uuid
-from werkzeug.security  import generate_password_hash,check_password_hash
+from hashing import hashPassword,verifyPassword,needsRehash
 from flask_login import UserMixin
+from routing import RoutingSession
+from config import Config
 
-db = SQLAlchemy()
+# AMOUNT_STORAGE=minor stores amounts and rollup totals as BIGINT counts of
+# the currency's minor unit (10**-Currency.exponent); money.py converts them
+# at the edges. The default keeps NUMERIC columns.
+MINOR_UNITS = Config.AMOUNT_STORAGE == 'minor'
+AmountType = BigInteger if MINOR_UNITS else Numeric(precision=10, scale=2)
+TotalType = BigInteger if MINOR_UNITS else Numeric(precision=18, scale=2)
+
+# SQLite would give a column declared UUID numeric affinity and store the
+# odd all-digit hex id as a number; CHAR keeps every id text.
+@compiles(UUID, 'sqlite')
+def compileUuidForSqlite(type_, compiler, **kw):
+    return 'CHAR(32)'
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 class User(db.Model,UserMixin):
     __tablename__ = 'users'
     id = db.Column(UUID(as_uuid=True),primary_key=True,default=uuid.uuid4)
@@ -14,13 +30,16 @@ class User(db.Model,UserMixin):
     hashText = db.Column(db.String(500),nullable = False)
 
     def setHashText(self,plainText):
-        self.hashText = generate_password_hash(plainText)
+        self.hashText = hashPassword(plainText)
     def checkPlainText(self,plainText):
-        return check_password_hash(self.hashText,plainText)
+        return verifyPassword(self.hashText,plainText)
+    def hashNeedsUpgrade(self):
+        return needsRehash(self.hashText)
 
-    expenses = db.relationship('Expense',backref='user',lazy=True)
-    incomes = db.relationship('Income',backref='user',lazy=True)
-    investments = db.relationship('Investment',backref='user',lazy=True)
+    transactions = db.relationship('Transaction',backref='user',lazy=True)
+    expenses = db.relationship('Expense',lazy=True,viewonly=True)
+    incomes = db.relationship('Income',lazy=True,viewonly=True)
+    investments = db.relationship('Investment',lazy=True,viewonly=True)
 
     
     def __repr__(self):
@@ -31,38 +50,131 @@ class Currency(db.Model):
     __tablename__ = 'currencies'
     id = db.Column(db.Integer ,primary_key=True,autoincrement=True, nullable=False)
     currency = db.Column(db.String(3),unique=True,nullable=False)
+    exponent = db.Column(db.Integer,nullable=False,default=2,server_default='2')
 
-    expenses = db.relationship('Expense',backref='currency_ref',lazy=True)
-    incomes = db.relationship('Income',backref='currency_ref',lazy=True)
-    investments = db.relationship('Investment',backref='currency_ref',lazy=True)
+    transactions = db.relationship('Transaction',backref='currency_ref',lazy=True)
+    expenses = db.relationship('Expense',lazy=True,viewonly=True)
+    incomes = db.relationship('Income',lazy=True,viewonly=True)
+    investments = db.relationship('Investment',lazy=True,viewonly=True)
 
     def __repr__(self):
         return f'<Currency {self.currency}>'
     
-class Expense(db.Model):
-    __tablename__ = 'expenses'
+class Transaction(db.Model):
+    __tablename__ = 'transactions'
+    __table_args__ = (
+        db.Index('ix_transactions_user_id_date','user_id','date',postgresql_include=['amount','currency','type']),
+        db.Index('ix_transactions_user_id_type_date','user_id','type','date',postgresql_include=['amount','currency']),
+        db.Index('ix_transactions_created_at','created_at'),
+        db.Index('uq_transactions_content_hash_date','content_hash','date',unique=True),
+        # Monthly partitions are managed by partitions.py; Postgres needs the
+        # partition key in the primary key, the ORM keeps identifying rows by id.
+        {'postgresql_partition_by':'RANGE (date)'},
+    )
     id = db.Column(UUID(as_uuid=True) ,primary_key=True,default=uuid.uuid4)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'),nullable=False)
-    amount = db.Column(Numeric(precision=10, scale=2), nullable=False)
+    type = db.Column(db.String(20),nullable=False)
+    amount = db.Column(AmountType, nullable=False)
     currency = db.Column(db.String(3),db.ForeignKey('currencies.currency'),nullable=False)
-    date = db.Column(DateTime)
+    date = db.Column(DateTime,primary_key=True)
     description = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(DateTime,nullable=False,server_default=db.func.now())
+    # SHA-256 of imported rows' content (see imports.py); NULL for rows added through the API.
+    content_hash = db.Column(db.String(64),nullable=True)
 
-class Income(db.Model):
-    __tablename__ = 'incomes'
-    id = db.Column(UUID(as_uuid=True) ,primary_key=True,default=uuid.uuid4)
-    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'),nullable=False)
-    amount = db.Column(Numeric(precision=10, scale=2), nullable=False)
-    currency = db.Column(db.String(3),db.ForeignKey('currencies.currency'),nullable=False)
-    date = db.Column(DateTime)
-    description = db.Column(db.String(255), nullable=True)
+    __mapper_args__ = {'polymorphic_on': type, 'primary_key': [id]}
 
-class Investment(db.Model):
-    __tablename__ = 'investments'
-    id = db.Column(UUID(as_uuid=True) ,primary_key=True,default=uuid.uuid4)
+event.listen(
+    Transaction.__table__,
+    'after_create',
+    DDL('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT').execute_if(dialect='postgresql')
+)
+
+# Description search (search.py): a GIN expression index on PostgreSQL, an
+# external content FTS5 table kept in step by triggers on SQLite.
+SEARCH_DDL = {
+    'postgresql': [
+        "CREATE INDEX ix_transactions_description_search ON transactions USING gin (to_tsvector('simple', coalesce(description, '')))",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE transactions_search USING fts5(description, content='transactions', content_rowid='rowid')",
+        "CREATE TRIGGER transactions_search_insert AFTER INSERT ON transactions BEGIN "
+        "INSERT INTO transactions_search(rowid, description) VALUES (new.rowid, new.description); END",
+        "CREATE TRIGGER transactions_search_delete AFTER DELETE ON transactions BEGIN "
+        "INSERT INTO transactions_search(transactions_search, rowid, description) VALUES ('delete', old.rowid, old.description); END",
+        "CREATE TRIGGER transactions_search_update AFTER UPDATE OF description ON transactions BEGIN "
+        "INSERT INTO transactions_search(transactions_search, rowid, description) VALUES ('delete', old.rowid, old.description); "
+        "INSERT INTO transactions_search(rowid, description) VALUES (new.rowid, new.description); END",
+    ],
+}
+for dialect, statements in SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Transaction.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+# The triggers go with the table, the FTS5 table has to be dropped explicitly.
+event.listen(Transaction.__table__, 'after_drop', DDL('DROP TABLE IF EXISTS transactions_search').execute_if(dialect='sqlite'))
+
+class Expense(Transaction):
+    __mapper_args__ = {'polymorphic_identity': 'expense'}
+
+class Income(Transaction):
+    __mapper_args__ = {'polymorphic_identity': 'income'}
+
+class Investment(Transaction):
+    __mapper_args__ = {'polymorphic_identity': 'investment'}
+
+class DailyRollup(db.Model):
+    __tablename__ = 'daily_rollups'
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'),primary_key=True)
+    type = db.Column(db.String(20),primary_key=True)
+    currency = db.Column(db.String(3),db.ForeignKey('currencies.currency'),primary_key=True)
+    day = db.Column(db.Date,primary_key=True)
+    total = db.Column(TotalType, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+class MonthlyRollup(db.Model):
+    __tablename__ = 'monthly_rollups'
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'),primary_key=True)
+    type = db.Column(db.String(20),primary_key=True)
+    currency = db.Column(db.String(3),db.ForeignKey('currencies.currency'),primary_key=True)
+    month = db.Column(db.Date,primary_key=True)
+    total = db.Column(TotalType, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+class ExchangeRate(db.Model):
+    """Value of one unit of currency in Config.BASE_CURRENCY on date."""
+    __tablename__ = 'exchange_rates'
+    currency = db.Column(db.String(3),db.ForeignKey('currencies.currency'),primary_key=True)
+    date = db.Column(db.Date,primary_key=True)
+    rate = db.Column(Numeric(precision=18, scale=8), nullable=False)
+
+class RecurringRule(db.Model):
+    """A transaction repeating on an RRULE-style schedule (see recurring.py).
+
+    Occurrences are not stored; they are expanded into reads on the fly.
+    start is the first occurrence and also fixes the time of day, weekday and
+    day of month of all later ones. count and until, either or both, end the
+    schedule; without them it repeats forever.
+    """
+    __tablename__ = 'recurring_rules'
+    __table_args__ = (
+        db.Index('ix_recurring_rules_user_id_start','user_id','start'),
+    )
+    id = db.Column(UUID(as_uuid=True),primary_key=True,default=uuid.uuid4)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'),nullable=False)
-    amount = db.Column(Numeric(precision=10, scale=2), nullable=False)
+    type = db.Column(db.String(20),nullable=False)
+    amount = db.Column(AmountType, nullable=False)
     currency = db.Column(db.String(3),db.ForeignKey('currencies.currency'),nullable=False)
-    date = db.Column(DateTime)
     description = db.Column(db.String(255), nullable=True)
+    frequency = db.Column(db.String(10),nullable=False)
+    interval = db.Column(db.Integer,nullable=False,default=1)
+    start = db.Column(DateTime,nullable=False)
+    count = db.Column(db.Integer,nullable=True)
+    until = db.Column(DateTime,nullable=True)
+    created_at = db.Column(DateTime,nullable=False,server_default=db.func.now())
 
+class RecurringException(db.Model):
+    """An occurrence of a rule that expansion skips: deleted, or materialized as transaction_id when edited."""
+    __tablename__ = 'recurring_exceptions'
+    rule_id = db.Column(UUID(as_uuid=True), db.ForeignKey('recurring_rules.id'),primary_key=True)
+    occurrence = db.Column(DateTime,primary_key=True)
+    transaction_id = db.Column(UUID(as_uuid=True),nullable=True)
@@ -0,0 +1,141 @@
+from decimal import Decimal
+from sqlalchemy import BigInteger, cast, func
+from caches import currencyCache
+from models import MINOR_UNITS
+
+# Helpers for the AMOUNT_STORAGE=minor format, where amounts are integers of
+# a currency's minor unit: 1234 with exponent 2 is 12.34. Input strings are
+# parsed straight into integers and totals are summed and printed as exact
+# decimal strings, so neither Decimal nor float is involved. With the default
+# NUMERIC storage amountOf and jsonAmount keep the old float output.
+
+# ISO 4217 minor unit exponents that differ from the usual 2.
+ISO_EXPONENTS = {
+    'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0, 'KRW': 0,
+    'PYG': 0, 'RWF': 0, 'UGX': 0, 'UYI': 0, 'VND': 0, 'VUV': 0, 'XAF': 0, 'XOF': 0, 'XPF': 0,
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+    'CLF': 4, 'UYW': 4,
+}
+
+def defaultExponent(code):
+    return ISO_EXPONENTS.get(code, 2)
+
+def isDigits(text):
+    return text.isascii() and text.isdigit()
+
+def parseMinorUnits(value, exponent):
+    """Integer count of minor units in value (int, float or decimal string).
+
+    Digits past the exponent are rounded half away from zero, as NUMERIC
+    columns do. Raises ValueError for anything that is not a plain number.
+    """
+    if type(value) is int:
+        return value*10**exponent
+    if type(value) is float:
+        text = repr(value)
+        if 'e' in text or 'n' in text:
+            text = format(value, 'f')
+    elif type(value) is str:
+        text = value.strip()
+    else:
+        raise ValueError(value)
+    whole, _, fraction = text.partition('.')
+    negative = whole.startswith('-')
+    if whole[:1] in ('+', '-'):
+        whole = whole[1:]
+    if not (whole or fraction) or (whole and not isDigits(whole)) or (fraction and not isDigits(fraction)):
+        raise ValueError(value)
+    units = int((whole+fraction[:exponent].ljust(exponent, '0')) or '0')
+    if fraction[exponent:exponent+1] >= '5':
+        units += 1
+    return -units if negative else units
+
+def formatMinorUnits(units, exponent):
+    """Exact decimal string of units minor units, e.g. (-5, 2) -> '-0.05'."""
+    digits = str(abs(units)).rjust(exponent+1, '0')
+    if exponent:
+        digits = digits[:-exponent]+'.'+digits[-exponent:]
+    return '-'+digits if units < 0 else digits
+
+class MinorAmount:
+    """An exact amount of units*10**-exponent; adds across exponents without rounding."""
+    __slots__ = ('units', 'exponent')
+
+    def __init__(self, units, exponent):
+        self.units = units
+        self.exponent = exponent
+
+    def _aligned(self, other):
+        if not isinstance(other, MinorAmount):
+            other = MinorAmount(other, 0)
+        exponent = max(self.exponent, other.exponent)
+        return self.units*10**(exponent-self.exponent), other.units*10**(exponent-other.exponent), exponent
+
+    def __add__(self, other):
+        mine, theirs, exponent = self._aligned(other)
+        return MinorAmount(mine+theirs, exponent)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        mine, theirs, exponent = self._aligned(other)
+        return MinorAmount(mine-theirs, exponent)
+
+    def __rsub__(self, other):
+        mine, theirs, exponent = self._aligned(other)
+        return MinorAmount(theirs-mine, exponent)
+
+    def __eq__(self, other):
+        mine, theirs, _ = self._aligned(other)
+        return mine == theirs
+
+    def __float__(self):
+        return self.units/10**self.exponent
+
+    def __str__(self):
+        return formatMinorUnits(self.units, self.exponent)
+
+    def __repr__(self):
+        return f'MinorAmount({str(self)!r})'
+
+def sumOf(column):
+    """SUM of an amount column; kept BIGINT in minor unit storage, where Postgres would widen it to NUMERIC."""
+    if MINOR_UNITS:
+        return cast(func.sum(column), BigInteger)
+    return func.sum(column)
+
+def amountExponents():
+    """{code: exponent} for parseTransaction when amounts are stored in minor units, else None."""
+    return currencyCache.exponents() if MINOR_UNITS else None
+
+def amountOf(value, currency):
+    """A stored amount or per-currency total of currency as a value that can be added across currencies."""
+    if MINOR_UNITS:
+        return MinorAmount(value, currencyCache.exponents()[currency])
+    return value
+
+def sumAmounts(rows):
+    """Total of (currency, stored total) rows."""
+    return sum((amountOf(total, currency) for currency, total in rows), 0)
+
+def storedAmount(value, currency):
+    """value, a number or decimal string in units of currency, as the amount columns store it."""
+    if MINOR_UNITS:
+        return parseMinorUnits(value, currencyCache.exponents()[currency])
+    return Decimal(str(value))
+
+def unitScale(currency):
+    """Divisor turning a stored amount of currency into currency units."""
+    return 10**currencyCache.exponents()[currency] if MINOR_UNITS else 1
+
+def jsonAmount(value, currency=None):
+    """Response value of an amount: an exact string in minor unit storage, a float otherwise.
+
+    A total nothing was added to is a plain 0; it is printed with currency's
+    exponent, or 2 for totals across currencies, like any other total.
+    """
+    if not MINOR_UNITS:
+        return float(value)
+    if not isinstance(value, MinorAmount):
+        value = MinorAmount(value, 2 if currency is None else currencyCache.exponents()[currency])
+    return str(value)
@@ -0,0 +1,153 @@
+import re
+from datetime import date
+from sqlalchemy import select, text, union_all
+from sqlalchemy.dialects import postgresql
+from models import db, Transaction
+from rollups import firstOfNextMonth, rollupSelects, splitRange
+from queries import rangeFilter
+from responseCache import noteAllUsersWritten
+
+# On Postgres the transactions table is partitioned by RANGE (date), one
+# partition per calendar month named transactions_yYYYYmMM, plus a DEFAULT
+# partition that catches rows outside every monthly range so an insert never
+# fails for lack of a partition. Partitions are created ahead of time by
+# `flask partitions create` and old ones are taken out of the table with
+# `flask partitions detach`. Rollups are left alone when a month is detached,
+# so range totals keep counting it while listings no longer return its rows.
+
+PARENT = Transaction.__tablename__
+DEFAULT_PARTITION = f'{PARENT}_default'
+PARTITION_NAME = re.compile(rf'^{PARENT}_y(\d{{4}})m(\d{{2}})$')
+
+def partitionName(month):
+    return f'{PARENT}_y{month.year}m{month.month:02d}'
+
+def monthOfPartition(name):
+    """First day of the month a partition holds, or None for any other table name."""
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+def monthsBetween(first, last):
+    """First days of every month from first's month through last's month."""
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = firstOfNextMonth(month)
+
+def isPartitioned():
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return False
+    return db.session.execute(text(
+        'SELECT 1 FROM pg_partitioned_table WHERE partrelid = CAST(:parent AS regclass)'
+    ), {'parent':PARENT}).first() is not None
+
+def partitionMonths():
+    """{month: partition name} of the monthly partitions currently attached."""
+    names = db.session.execute(text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE pg_inherits.inhparent = CAST(:parent AS regclass)'
+    ), {'parent':PARENT}).scalars()
+    months = {}
+    for name in names:
+        month = monthOfPartition(name)
+        if month is not None:
+            months[month] = name
+    return months
+
+def createPartition(month):
+    """Attach a partition for month, moving any rows the default partition holds for it."""
+    name = partitionName(month)
+    bounds = {'low':month, 'high':firstOfNextMonth(month)}
+    # Postgres refuses a new partition while the default one holds rows that
+    # belong in it, so those rows are set aside and routed again afterwards.
+    db.session.execute(text(f'CREATE TEMPORARY TABLE {name}_moving (LIKE {PARENT})'))
+    db.session.execute(text(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :low AND date < :high RETURNING *) '
+        f'INSERT INTO {name}_moving SELECT * FROM moved'
+    ), bounds)
+    db.session.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT} "
+        f"FOR VALUES FROM ('{bounds['low'].isoformat()}') TO ('{bounds['high'].isoformat()}')"
+    ))
+    db.session.execute(text(f'INSERT INTO {PARENT} SELECT * FROM {name}_moving'))
+    db.session.execute(text(f'DROP TABLE {name}_moving'))
+    return name
+
+def ensurePartitions(today, ahead):
+    """Create the missing partitions from today's month through ahead months later."""
+    existing = partitionMonths()
+    last = today.replace(day=1)
+    for _ in range(ahead):
+        last = firstOfNextMonth(last)
+    return [createPartition(month) for month in monthsBetween(today, last) if month not in existing]
+
+def detachPartitions(before, archiveSchema=None):
+    """Detach every monthly partition older than before's month.
+
+    Detached partitions stay behind as plain tables, moved into archiveSchema
+    when one is given.
+    """
+    detached = []
+    for month, name in sorted(partitionMonths().items()):
+        if month >= before.replace(day=1):
+            break
+        db.session.execute(text(f'ALTER TABLE {PARENT} DETACH PARTITION {name}'))
+        if archiveSchema is not None:
+            db.session.execute(text(f'CREATE SCHEMA IF NOT EXISTS {archiveSchema}'))
+            db.session.execute(text(f'ALTER TABLE {name} SET SCHEMA {archiveSchema}'))
+        detached.append(name)
+    if detached:
+        # Listings no longer see the detached rows.
+        noteAllUsersWritten(db.session)
+    return detached
+
+def relationsInPlan(plan):
+    """Names of every relation an EXPLAIN (FORMAT JSON) plan node tree reads."""
+    relations = set()
+    if 'Relation Name' in plan:
+        relations.add(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        relations |= relationsInPlan(child)
+    return relations
+
+def scannedPartitions(statement):
+    """Transaction partitions Postgres plans to read for statement."""
+    compiled = statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds':True})
+    (plan,) = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {compiled}')).scalar()
+    return {name for name in relationsInPlan(plan['Plan']) if name.startswith(PARENT+'_')}
+
+def touchedPartitions(ranges):
+    """Partitions a query over the inclusive datetime ranges needs to read."""
+    names = set()
+    for low, high in ranges:
+        names.update(partitionName(month) for month in monthsBetween(low.date(), high.date()))
+    return names
+
+def checkPruning(model, user_id, start_date, end_date):
+    """EXPLAIN the raw and rollup range totals of model and compare the partitions they scan.
+
+    Returns {query: (scanned, allowed)}; a query prunes correctly when every
+    scanned partition is in allowed. The default partition is always allowed
+    because Postgres cannot rule it out for ranges it has no monthly
+    partition for.
+    """
+    raw = splitRange(start_date, end_date)[0]
+    statements = {
+        'raw': (
+            select(db.func.sum(model.amount)).where(*rangeFilter(model, user_id, start_date, end_date)),
+            touchedPartitions([(start_date, end_date)]),
+        ),
+        'rollups': (
+            select(db.func.sum(db.literal_column('total'))).select_from(
+                union_all(*rollupSelects(model, user_id, start_date, end_date)).subquery()
+            ),
+            touchedPartitions(raw),
+        ),
+    }
+    return {
+        query: (scannedPartitions(statement), allowed | {DEFAULT_PARTITION})
+        for query, (statement, allowed) in statements.items()
+    }
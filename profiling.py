@@ -0,0 +1,176 @@
+import cProfile
+import io
+import itertools
+import logging
+import os
+import pstats
+import time
+from flask import g, has_app_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import Histogram
+
+# Opt-in per-request instrumentation, switched on with PROFILING_ENABLED.
+# Every request records, per endpoint, its wall time, how many SQL statements
+# it ran and how long they took (from cursor execute events, so streamed
+# responses count the queries made while streaming), the time spent encoding
+# JSON and the size of the response. The numbers are finalized when the
+# response is closed, after the last byte of a streamed body.
+#
+# One request in PROFILE_SAMPLE_RATE, and every request carrying the
+# PROFILE_HEADER header, also runs under cProfile until its request context
+# is torn down; the stats are written to PROFILE_DIR and the top functions
+# logged. Statements slower than SLOW_QUERY_SECONDS are logged with their
+# EXPLAIN plan.
+
+logger = logging.getLogger(__name__)
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+requestSeconds = Histogram('http_request_duration_seconds', 'Wall time of requests until the response is closed', ('endpoint', 'method', 'status'))
+requestQueries = Histogram('http_request_db_queries', 'SQL statements executed per request', ('endpoint',), QUERY_BUCKETS)
+requestSqlSeconds = Histogram('http_request_db_seconds', 'Time spent executing SQL statements per request', ('endpoint',))
+requestEncodeSeconds = Histogram('http_request_encode_seconds', 'Time spent encoding response bodies per request', ('endpoint',))
+responseBytes = Histogram('http_response_size_bytes', 'Size of response bodies', ('endpoint',), SIZE_BUCKETS)
+
+EXPLAINS = {'sqlite': 'EXPLAIN QUERY PLAN ', 'postgresql': 'EXPLAIN '}
+
+# Set by init; None leaves slow queries unlogged.
+slowQuerySeconds = None
+
+class RequestProfile:
+    """Counters of one request, kept on flask.g while it is being served."""
+    __slots__ = ('started', 'queries', 'sqlSeconds', 'encodeSeconds', 'size', 'profiler', 'profilePath')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sqlSeconds = 0.0
+        self.encodeSeconds = 0.0
+        self.size = 0
+        self.profiler = None
+        self.profilePath = None
+
+def currentProfile():
+    return g.get('profile') if has_app_context() else None
+
+class encoding:
+    """Context manager adding the time spent in its block to the request's encode time."""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        profile = currentProfile()
+        if profile is not None:
+            profile.encodeSeconds += time.perf_counter()-self.started
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, counting jsonify's encoding into the request's encode time."""
+
+    def dumps(self, obj, **kwargs):
+        with encoding():
+            return super().dumps(obj, **kwargs)
+
+# The start time lives on the statement's execution context rather than the
+# connection, so a statement that fails (and never reaches the after event)
+# leaves nothing behind on a pooled connection.
+def beforeCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    context.profilingStarted = time.perf_counter()
+
+def afterCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter()-context.profilingStarted
+    profile = currentProfile()
+    if profile is not None:
+        profile.queries += 1
+        profile.sqlSeconds += seconds
+    if slowQuerySeconds is not None and seconds >= slowQuerySeconds and not executemany and not conn.info.get('explaining'):
+        logger.warning('Slow query (%.3fs): %s\nPlan:\n%s', seconds, statement, explain(conn, statement, parameters))
+
+def explain(conn, statement, parameters):
+    prefix = EXPLAINS.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return '(not available)'
+    conn.info['explaining'] = True
+    try:
+        rows = conn.exec_driver_sql(prefix+statement, parameters).all()
+    except Exception as e:
+        return f'(EXPLAIN failed: {e})'
+    finally:
+        conn.info['explaining'] = False
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+def countedBody(body, profile):
+    for chunk in body:
+        profile.size += len(chunk)
+        yield chunk
+
+def finish(profile, endpoint, method, status):
+    seconds = time.perf_counter()-profile.started
+    requestSeconds.observe(seconds, endpoint=endpoint, method=method, status=status)
+    requestQueries.observe(profile.queries, endpoint=endpoint)
+    requestSqlSeconds.observe(profile.sqlSeconds, endpoint=endpoint)
+    requestEncodeSeconds.observe(profile.encodeSeconds, endpoint=endpoint)
+    responseBytes.observe(profile.size, endpoint=endpoint)
+
+def saveProfile(profile, profileDir):
+    profile.profiler.disable()
+    os.makedirs(profileDir, exist_ok=True)
+    profile.profiler.dump_stats(profile.profilePath)
+    summary = io.StringIO()
+    pstats.Stats(profile.profiler, stream=summary).sort_stats('cumulative').print_stats(20)
+    logger.info('Profile of %s %s saved to %s\n%s', request.method, request.endpoint, profile.profilePath, summary.getvalue())
+
+def init(app):
+    """Instrument app's requests and every engine's SQL statements."""
+    global slowQuerySeconds
+    config = app.config
+    slowQuerySeconds = config['SLOW_QUERY_SECONDS']
+    sampleRate = config['PROFILE_SAMPLE_RATE']
+    requests = itertools.count(1)
+    app.json = TimedJSONProvider(app)
+    if not event.contains(Engine, 'before_cursor_execute', beforeCursorExecute):
+        event.listen(Engine, 'before_cursor_execute', beforeCursorExecute)
+        event.listen(Engine, 'after_cursor_execute', afterCursorExecute)
+
+    @app.before_request
+    def startProfile():
+        profile = g.profile = RequestProfile()
+        sampled = sampleRate > 0 and next(requests) % sampleRate == 0
+        if sampled or config['PROFILE_HEADER'] in request.headers:
+            profile.profilePath = os.path.join(config['PROFILE_DIR'], f'{request.endpoint or "unmatched"}-{time.time_ns()}.prof')
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running in this thread.
+                return
+            profile.profiler = profiler
+
+    @app.after_request
+    def finishProfile(response):
+        profile = g.get('profile')
+        if profile is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        method = request.method
+        status = response.status_code
+        if response.content_length is not None:
+            profile.size = response.content_length
+        elif response.is_streamed:
+            response.response = countedBody(response.response, profile)
+        if profile.profiler is not None:
+            response.headers['X-Profile-File'] = os.path.basename(profile.profilePath)
+        response.call_on_close(lambda: finish(profile, endpoint, method, status))
+        return response
+
+    @app.teardown_request
+    def stopProfiler(exc):
+        # Runs when the request context goes, which stream_with_context holds
+        # until the body has been generated.
+        profile = g.get('profile')
+        if profile is not None and profile.profiler is not None:
+            saveProfile(profile, config['PROFILE_DIR'])
+            profile.profiler = None
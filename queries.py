@@ -0,0 +1,75 @@
+from models import db, Transaction, MINOR_UNITS
+from caches import currencyCache, userCache
+from money import sumOf, sumAmounts
+
+# Every read path filters on user_id plus a date range. Keeping the filter in
+# one place makes sure the predicates always line up with the
+# (user_id, [type,] date) INCLUDE (amount, currency) indexes on transactions,
+# so totals are answered by index-only scans.
+
+# Expense, Income and Investment are single-table subclasses of Transaction;
+# SQLAlchemy adds their type criterion to any query selecting their columns.
+
+def rangeFilter(model, user_id, start_date, end_date):
+    return (
+        model.user_id == user_id,
+        model.date >= start_date,
+        model.date <= end_date,
+    )
+
+def rangeQuery(model, user_id, start_date, end_date, *columns):
+    """Query *columns* of model for one user inside [start_date, end_date]."""
+    return db.session.query(*columns).filter(*rangeFilter(model, user_id, start_date, end_date))
+
+def sumInRange(model, user_id, start_date, end_date):
+    if MINOR_UNITS:
+        # Minor units of different currencies only add up once scaled.
+        return sumAmounts(rangeQuery(
+            model, user_id, start_date, end_date, model.currency, sumOf(model.amount)
+        ).group_by(model.currency))
+    total = rangeQuery(model, user_id, start_date, end_date, sumOf(model.amount)).scalar()
+    if total is None:
+        total = 0
+    return total
+
+def totalsByTypeAndCurrency(user_id, start_date, end_date):
+    """Per (transactionType, currency) totals over all transactions in one statement."""
+    return rangeQuery(
+        Transaction,user_id,start_date,end_date,
+        Transaction.type.label('transactionType'),
+        Transaction.currency.label('currency'),
+        sumOf(Transaction.amount).label('total')
+    ).group_by(Transaction.type, Transaction.currency).all()
+
+def userExists(user_id):
+    return userCache.get(user_id) is not None
+
+def availableCurrencies(codes):
+    """The subset of codes present in the currencies table, answered from the currency cache."""
+    return currencyCache.codes().intersection(code for code in codes if isinstance(code, str))
+
+def listingQuery(user_id, start_date, end_date, after=None, limit=None):
+    """Transactions of every type in the range ordered by (date, id).
+
+    after is a (date, id) keyset cursor: only rows strictly after it are
+    returned. This is a single range scan of the (user_id, date) index.
+    """
+    query = rangeQuery(
+        Transaction,user_id,start_date,end_date,
+        Transaction.id,
+        Transaction.date,
+        Transaction.amount,
+        Transaction.currency,
+        Transaction.description,
+        Transaction.type.label('transactionType')
+    )
+    if after is not None:
+        afterDate, afterId = after
+        query = query.filter(db.or_(
+            Transaction.date > afterDate,
+            db.and_(Transaction.date == afterDate, Transaction.id > afterId)
+        ))
+    query = query.order_by(Transaction.date, Transaction.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
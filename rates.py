@@ -0,0 +1,138 @@
+import csv
+import threading
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+import numpy as np
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from customExceptions import ValidationException
+from models import db, ExchangeRate
+from money import unitScale
+from responseCache import responseCache
+
+# Exchange rates are stored as the value of one unit of a currency in
+# BASE_CURRENCY. Converting into any target currency divides by the target's
+# rate for the same day. A day without a published rate uses the most recent
+# earlier one.
+
+class RateSeries:
+    """Forward-filled daily rates of one currency, indexed by date ordinal."""
+
+    def __init__(self, days, rates):
+        self.firstDay = days[0].toordinal()
+        offsets = np.array([day.toordinal() for day in days])-self.firstDay
+        filled = np.searchsorted(offsets, np.arange(offsets[-1]+1), side='right')-1
+        self.rates = np.asarray(rates, dtype=np.float64)[filled]
+
+    def at(self, ordinals):
+        """Rates for an array of date ordinals; NaN before the first known rate."""
+        offsets = ordinals-self.firstDay
+        result = self.rates[np.clip(offsets, 0, len(self.rates)-1)]
+        return np.where(offsets < 0, np.nan, result)
+
+class RateCache:
+    """Process-local RateSeries per currency, loaded in bulk and kept for RATE_CACHE_TTL seconds."""
+
+    def __init__(self):
+        self._series = {}
+        self._loadedAt = 0
+        self._lock = threading.Lock()
+
+    def series(self, currencies):
+        with self._lock:
+            if time.monotonic()-self._loadedAt >= current_app.config['RATE_CACHE_TTL']:
+                self._series = {}
+                self._loadedAt = time.monotonic()
+            missing = [currency for currency in currencies if currency not in self._series]
+            if missing:
+                history = {currency: ([], []) for currency in missing}
+                rows = db.session.query(ExchangeRate.currency, ExchangeRate.date, ExchangeRate.rate).filter(
+                    ExchangeRate.currency.in_(missing)
+                ).order_by(ExchangeRate.currency, ExchangeRate.date)
+                for currency, day, rate in rows:
+                    history[currency][0].append(day)
+                    history[currency][1].append(rate)
+                for currency, (days, rates) in history.items():
+                    self._series[currency] = RateSeries(days, rates) if days else None
+            return {currency: self._series[currency] for currency in currencies}
+
+    def invalidate(self):
+        with self._lock:
+            self._series = {}
+
+rateCache = RateCache()
+
+@event.listens_for(ExchangeRate, 'after_insert')
+@event.listens_for(ExchangeRate, 'after_update')
+@event.listens_for(ExchangeRate, 'after_delete')
+def markRatesChanged(mapper, connection, target):
+    object_session(target).info['rates_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def invalidateRateCache(session):
+    if session.info.pop('rates_changed', False):
+        rateCache.invalidate()
+        responseCache.bumpEpoch()
+
+@event.listens_for(Session, 'after_rollback')
+def discardRateChanges(session):
+    session.info.pop('rates_changed', None)
+
+def ratesAt(currency, ordinals, series):
+    if currency == current_app.config['BASE_CURRENCY']:
+        return np.ones(len(ordinals))
+    rates = np.full(len(ordinals), np.nan) if series[currency] is None else series[currency].at(ordinals)
+    if np.isnan(rates).any():
+        day = date.fromordinal(int(ordinals[np.isnan(rates)].min()))
+        raise ValidationException(f'No exchange rate for {currency} on {day.isoformat()}', 422)
+    return rates
+
+def convertTotals(rows, target):
+    """Sum (currency, day, total) rows converted into target.
+
+    Rows are grouped per currency and converted with one array operation
+    each, using that day's rates of the currency and of target.
+    """
+    byCurrency = {}
+    for currency, day, total in rows:
+        days, totals = byCurrency.setdefault(currency, ([], []))
+        days.append(day.toordinal())
+        totals.append(total)
+    if not byCurrency:
+        return 0.0
+
+    base = current_app.config['BASE_CURRENCY']
+    series = rateCache.series([currency for currency in set(byCurrency) | {target} if currency != base])
+    converted = 0.0
+    for currency, (days, totals) in byCurrency.items():
+        ordinals = np.array(days)
+        amounts = np.array(totals, dtype=np.float64)/unitScale(currency)
+        if currency != target:
+            amounts = amounts*ratesAt(currency, ordinals, series)/ratesAt(target, ordinals, series)
+        converted += float(amounts.sum())
+    return round(converted, 2)
+
+def loadRates(path, availableCurrencies):
+    """Upsert exchange rates from a currency,date,rate CSV file.
+
+    Rows for currencies outside availableCurrencies are skipped. Returns the
+    number of rows loaded and skipped.
+    """
+    loaded = 0
+    skipped = 0
+    with open(path, newline='') as rateFile:
+        for line, record in enumerate(csv.DictReader(rateFile), start=2):
+            currency = record.get('currency')
+            if currency not in availableCurrencies:
+                skipped += 1
+                continue
+            try:
+                day = date.fromisoformat(record['date'])
+                rate = Decimal(record['rate'])
+            except (KeyError, TypeError, ValueError, InvalidOperation):
+                raise ValidationException(f'Line {line}: invalid date or rate')
+            db.session.merge(ExchangeRate(currency=currency, date=day, rate=rate))
+            loaded += 1
+    return loaded, skipped
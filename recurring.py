@@ -0,0 +1,191 @@
+import heapq
+import uuid
+from calendar import monthrange
+from collections import defaultdict, namedtuple
+from datetime import time, timedelta
+from itertools import chain, islice
+from sqlalchemy import select
+from models import db, RecurringRule, RecurringException
+from money import sumAmounts
+
+# Recurring transactions (rent, salaries, subscriptions) are stored once as a
+# RecurringRule and never copied into the transactions table. Reads expand
+# them for the requested range only:
+#
+# - Totals (get*, /summary, and each period of /timeseries) count a rule's
+#   occurrences in the range in closed form from its start, step and end, so
+#   a rule contributes amount*count whatever the length of the range.
+# - Listings (/getAll) get the occurrences from one generator per rule,
+#   merged with the database rows by (date, id) as they are consumed.
+#
+# Occurrence k of a rule falls k*interval days, weeks, months or years after
+# start. Unlike RFC 5545, which skips months too short for the start day, a
+# monthly or yearly occurrence past the end of its month falls on the month's
+# last day (the 31st gives Feb 28/29, Apr 30, ...), as rent and salaries do.
+#
+# Editing or deleting a single occurrence records a RecurringException that
+# expansion skips; an edit also materializes the occurrence as an ordinary
+# transaction. Occurrences that were never touched keep a stable synthetic
+# id derived from the rule and k, so keyset cursors work across them.
+
+STEP_DAYS = {'daily': 1, 'weekly': 7}
+STEP_MONTHS = {'monthly': 1, 'yearly': 12}
+
+Occurrence = namedtuple('Occurrence', 'id date amount currency description transactionType')
+
+def listingKey(row):
+    return row.date, row.id
+
+def addMonths(moment, months, day):
+    """moment moved by months, on day or the last day of a shorter month."""
+    year, month = divmod(moment.year*12+moment.month-1+months, 12)
+    return moment.replace(year=year, month=month+1, day=min(day, monthrange(year, month+1)[1]))
+
+def occurrenceDate(rule, index):
+    if rule.frequency in STEP_DAYS:
+        return rule.start+timedelta(days=STEP_DAYS[rule.frequency]*rule.interval*index)
+    return addMonths(rule.start, STEP_MONTHS[rule.frequency]*rule.interval*index, rule.start.day)
+
+def firstIndex(rule, moment, inclusive):
+    """Index of the first occurrence at (inclusive) or after moment, ignoring the rule's end."""
+    if moment < rule.start:
+        return 0
+    if rule.frequency in STEP_DAYS:
+        steps, remainder = divmod(moment-rule.start, timedelta(days=STEP_DAYS[rule.frequency]*rule.interval))
+        return steps+1 if remainder or not inclusive else steps
+    months = (moment.year-rule.start.year)*12+moment.month-rule.start.month
+    index = months//(STEP_MONTHS[rule.frequency]*rule.interval)
+    date = occurrenceDate(rule, index)
+    return index+1 if date < moment or (date == moment and not inclusive) else index
+
+def endIndex(rule):
+    """Index one past the last occurrence, or None for a rule without an end."""
+    ends = []
+    if rule.count is not None:
+        ends.append(rule.count)
+    if rule.until is not None:
+        ends.append(firstIndex(rule, rule.until, False))
+    return min(ends) if ends else None
+
+def indexRange(rule, start_date, end_date):
+    """(first, stop) indexes of the occurrences inside [start_date, end_date]."""
+    first = firstIndex(rule, start_date, True)
+    stop = firstIndex(rule, end_date, False)
+    end = endIndex(rule)
+    if end is not None:
+        stop = min(stop, end)
+    return first, max(first, stop)
+
+def occurrenceIndex(rule, moment):
+    """Index of the occurrence at exactly moment, or None when the rule has none then."""
+    index = firstIndex(rule, moment, True)
+    end = endIndex(rule)
+    if occurrenceDate(rule, index) != moment or (end is not None and index >= end):
+        return None
+    return index
+
+def occurrenceId(rule, index):
+    return uuid.uuid5(rule.id, str(index))
+
+def rulesInRange(user_id, start_date, end_date, transactionType=None):
+    """(rule, skipped occurrence dates) of the user's rules that may occur inside the range."""
+    # Plain rows rather than ORM objects: every range read runs this, mostly to find no rules.
+    query = select(*RecurringRule.__table__.c).where(
+        RecurringRule.user_id == user_id,
+        RecurringRule.start <= end_date,
+        db.or_(RecurringRule.until.is_(None), RecurringRule.until >= start_date),
+    )
+    if transactionType is not None:
+        query = query.where(RecurringRule.type == transactionType)
+    rules = db.session.execute(query).all()
+    skipped = defaultdict(set)
+    if rules:
+        exceptions = db.session.query(RecurringException.rule_id, RecurringException.occurrence).filter(
+            RecurringException.rule_id.in_([rule.id for rule in rules]),
+            RecurringException.occurrence.between(start_date, end_date),
+        )
+        for ruleId, occurrence in exceptions:
+            skipped[ruleId].add(occurrence)
+    return [(rule, skipped[rule.id]) for rule in rules]
+
+def skippedCount(rule, skipped, first, stop):
+    """How many skipped dates are occurrences first..stop-1; exceptions outlive a rule's until being moved."""
+    indexes = (occurrenceIndex(rule, occurrence) for occurrence in skipped)
+    return sum(1 for index in indexes if index is not None and first <= index < stop)
+
+def recurringTotals(user_id, start_date, end_date, transactionType=None):
+    """{(type, currency): [total, count]} of the occurrences in the range, in stored units, without enumerating them."""
+    totals = defaultdict(lambda: [0, 0])
+    for rule, skipped in rulesInRange(user_id, start_date, end_date, transactionType):
+        first, stop = indexRange(rule, start_date, end_date)
+        count = stop-first-skippedCount(rule, skipped, first, stop)
+        if count:
+            entry = totals[(rule.type, rule.currency)]
+            entry[0] += rule.amount*count
+            entry[1] += count
+    return totals
+
+def recurringBucketTotals(user_id, periods):
+    """(type, currency, bucket, total, count) rows of the occurrences in each (bucket, low, high) period, like rollups.bucketTotals."""
+    rows = []
+    if not periods:
+        return rows
+    for rule, skipped in rulesInRange(user_id, periods[0][1], periods[-1][2]):
+        for bucket, low, high in periods:
+            first, stop = indexRange(rule, low, high)
+            count = stop-first-skippedCount(rule, skipped, first, stop)
+            if count:
+                rows.append((rule.type, rule.currency, bucket, rule.amount*count, count))
+    return rows
+
+def recurringTotal(transactionType, user_id, start_date, end_date):
+    """Total of one type's occurrences in the range, added up like queries.sumInRange."""
+    totals = recurringTotals(user_id, start_date, end_date, transactionType)
+    return sumAmounts((currency, total) for (_, currency), (total, _) in totals.items())
+
+def occurrences(rule, skipped, start_date, end_date, after=None):
+    """Occurrence rows of rule inside the range in (date, id) order, strictly after the after cursor if given."""
+    first, stop = indexRange(rule, start_date, end_date)
+    if after is not None:
+        first = max(first, firstIndex(rule, after[0], True))
+    for index in range(first, stop):
+        date = occurrenceDate(rule, index)
+        if date in skipped:
+            continue
+        row = Occurrence(occurrenceId(rule, index), date, rule.amount, rule.currency, rule.description, rule.type)
+        if after is not None and listingKey(row) <= after:
+            continue
+        yield row
+
+def expand(rules, start_date, end_date, after=None):
+    """Occurrences of all (rule, skipped) pairs in (date, id) order."""
+    return heapq.merge(*(occurrences(rule, skipped, start_date, end_date, after) for rule, skipped in rules), key=listingKey)
+
+def mergeListing(rows, rules, start_date, end_date, after=None, limit=None):
+    """listingQuery rows with the rules' occurrences merged in, cut to limit."""
+    return list(islice(heapq.merge(rows, expand(rules, start_date, end_date, after), key=listingKey), limit))
+
+def mergeBatches(batches, rules, start_date, end_date, size, after=None, limit=None):
+    """Streamed batches of listingQuery rows re-cut into batches of size with the occurrences merged in, cut to limit."""
+    rows = islice(heapq.merge(chain.from_iterable(batches), expand(rules, start_date, end_date, after), key=listingKey), limit)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def dailyOccurrences(transactionType, user_id, start_date, end_date):
+    """(currency, day, amount) of each occurrence, for conversion at that day's rates."""
+    rules = rulesInRange(user_id, start_date, end_date, transactionType)
+    return [(row.currency, row.date.date(), row.amount) for row in expand(rules, start_date, end_date)]
+
+def formatRecurrenceRule(rule):
+    """RRULE text of rule's schedule."""
+    parts = [f'FREQ={rule.frequency.upper()}']
+    if rule.interval != 1:
+        parts.append(f'INTERVAL={rule.interval}')
+    if rule.count is not None:
+        parts.append(f'COUNT={rule.count}')
+    if rule.until is not None:
+        parts.append(f"UNTIL={rule.until.strftime('%Y%m%d' if rule.until.time() == time.max else '%Y%m%dT%H%M%S')}")
+    return ';'.join(parts)
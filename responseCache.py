@@ -0,0 +1,224 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from functools import wraps
+from flask import Response, current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from caches import LRUCache
+from metrics import Counter
+from routing import onReplica
+from validation import parseUserId
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Cache of range query responses (get*, /getAll, /summary), switched on with
+# RESPONSE_CACHE_ENABLED. Entries are keyed by endpoint, payload, Accept
+# header, the user's current generation and the global epoch. A generation
+# is a random token replaced whenever a commit writes transactions of that
+# user (see noteWrittenUsers), so every write makes all of the user's older
+# entries unreachable and they age out. The epoch does the same for every
+# user at once, for writes that change what all of them read: exchange
+# rates, rebuilt rollups and detached partitions (see noteAllUsersWritten).
+#
+# Each response carries an ETag derived from the same key. A request whose
+# If-None-Match names the ETag of a stored entry gets a 304 without running
+# any SQL or encoding anything.
+#
+# The default backend keeps entries and generations in process, both
+# expiring after RESPONSE_CACHE_TTL, so writes made by other processes (other
+# workers, the flask CLI) are seen once it runs out. Setting
+# RESPONSE_CACHE_BACKEND to a redis:// URL shares both between processes.
+# Generations are random rather than counters, so a lost or evicted
+# generation yields new ETags instead of reviving old ones.
+#
+# A generation also records when it started. Replicas may not have caught up
+# with the write behind a generation for READ_YOUR_WRITES_SECONDS, so a
+# response computed on a replica that soon after is served but not stored:
+# it would otherwise stay cached under the new generation with the old data.
+
+cacheHits = Counter('response_cache_hits_total', 'Range responses served from the response cache')
+cacheMisses = Counter('response_cache_misses_total', 'Range responses that had to be computed')
+notModified = Counter('response_cache_not_modified_total', 'Range requests answered 304 Not Modified from their ETag')
+
+# Generation slot of the epoch; user ids are UUIDs, so it cannot collide.
+EPOCH = 'epoch'
+
+def newGeneration():
+    return f'{time.time():.6f}:{uuid.uuid4().hex}'
+
+def generationStarted(generation):
+    """Unix time generation was created at, 0 for tokens without one."""
+    started, separator, _ = generation.partition(':')
+    return float(started) if separator else 0.0
+
+class LocalBackend:
+    """Entries and generations in this process, both bounded LRUs expiring after ttl."""
+
+    def __init__(self, maxsize, ttl):
+        self._entries = LRUCache(maxsize, ttl)
+        self._generations = LRUCache(maxsize, ttl)
+        self._lock = threading.Lock()
+
+    def generation(self, user_id):
+        with self._lock:
+            generation = self._generations.get(user_id)
+            if generation is None:
+                generation = newGeneration()
+                self._generations.put(user_id, generation)
+            return generation
+
+    def bump(self, user_id):
+        self._generations.put(user_id, newGeneration())
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, entry):
+        self._entries.put(key, entry)
+
+    def clear(self):
+        self._entries.clear()
+        self._generations.clear()
+
+class RedisBackend:
+    """Entries and generations in Redis, shared by every process using the same URL."""
+    prefix = 'response_cache:'
+
+    def __init__(self, url, ttl):
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def generation(self, user_id):
+        key = f'{self.prefix}generation:{user_id}'
+        self._client.set(key, newGeneration(), nx=True)
+        return self._client.get(key).decode()
+
+    def bump(self, user_id):
+        self._client.set(f'{self.prefix}generation:{user_id}', newGeneration())
+
+    def get(self, key):
+        value = self._client.get(self.prefix+key)
+        if value is None:
+            return None
+        contentType, vary, body = value.split(b'\n', 2)
+        return contentType.decode(), vary.decode(), body
+
+    def put(self, key, entry):
+        contentType, vary, body = entry
+        self._client.set(self.prefix+key, contentType.encode()+b'\n'+vary.encode()+b'\n'+body, ex=self.ttl)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix+'*'):
+            self._client.delete(key)
+
+class ResponseCache:
+    """The configured backend, created on first use."""
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    config = current_app.config
+                    url = config['RESPONSE_CACHE_BACKEND']
+                    if url.startswith('redis'):
+                        if redis is None:
+                            raise RuntimeError('RESPONSE_CACHE_BACKEND needs the redis package')
+                        self._backend = RedisBackend(url, config['RESPONSE_CACHE_TTL'])
+                    else:
+                        self._backend = LocalBackend(config['RESPONSE_CACHE_SIZE'], config['RESPONSE_CACHE_TTL'])
+        return self._backend
+
+    def bump(self, userIds):
+        if not userIds or not current_app.config['RESPONSE_CACHE_ENABLED']:
+            return
+        backend = self.backend()
+        for user_id in userIds:
+            backend.bump(user_id)
+
+    def bumpEpoch(self):
+        if current_app.config['RESPONSE_CACHE_ENABLED']:
+            self.backend().bump(EPOCH)
+
+    def clear(self):
+        if self._backend is not None:
+            self._backend.clear()
+
+responseCache = ResponseCache()
+
+def noteWrittenUsers(session, userIds):
+    """Bump these users' generations once session commits."""
+    session.info.setdefault('written_users', set()).update(userIds)
+
+def noteAllUsersWritten(session):
+    """Bump the epoch once session commits."""
+    session.info['all_users_written'] = True
+
+@event.listens_for(Session, 'after_commit')
+def bumpWrittenUsers(session):
+    if session.info.pop('all_users_written', False):
+        responseCache.bumpEpoch()
+    responseCache.bump(session.info.pop('written_users', ()))
+
+@event.listens_for(Session, 'after_rollback')
+def discardWrittenUsers(session):
+    session.info.pop('written_users', None)
+    session.info.pop('all_users_written', None)
+
+def cacheKey(user_id, generation, epoch, data):
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    content = '\x1f'.join((request.endpoint, str(user_id), generation, epoch, payload, request.headers.get('Accept', '')))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def cachedResponse(view):
+    """Serve a range view from the response cache, or 304 when the client's ETag is that of the cached entry.
+
+    Only unstreamed 200 responses are stored; requests without a valid
+    user_id go straight to the view, which rejects them.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config['RESPONSE_CACHE_ENABLED']:
+            return view(*args, **kwargs)
+        data = request.get_json(silent=True)
+        user_id = parseUserId(data.get('user_id')) if isinstance(data, dict) else None
+        if user_id is None or data.get('stream') is not None:
+            return view(*args, **kwargs)
+
+        backend = responseCache.backend()
+        generation, epoch = backend.generation(user_id), backend.generation(EPOCH)
+        key = cacheKey(user_id, generation, epoch, data)
+        etag = key[:32]
+        entry = backend.get(key)
+        if entry is not None and request.if_none_match.contains(etag):
+            notModified.inc()
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        if entry is not None:
+            cacheHits.inc()
+            contentType, vary, body = entry
+            response = Response(body, content_type=contentType)
+            if vary:
+                response.headers['Vary'] = vary
+        else:
+            cacheMisses.inc()
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            if onReplica() and time.time()-max(generationStarted(generation), generationStarted(epoch)) < current_app.config['READ_YOUR_WRITES_SECONDS']:
+                return response
+            backend.put(key, (response.content_type, response.headers.get('Vary', ''), response.get_data()))
+        response.set_etag(etag)
+        return response
+    return wrapper
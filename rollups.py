@@ -0,0 +1,246 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import insert, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Transaction, DailyRollup, MonthlyRollup, MINOR_UNITS
+from money import sumOf, sumAmounts
+from responseCache import noteAllUsersWritten, noteWrittenUsers
+from sqlDates import dayOf, weekOf, monthOf, yearOf
+
+# Per user, type, currency and day/month totals of transactions, kept up to
+# date by every write that goes through ingest.insertTransactions. Range
+# totals read whole months and days from here and only touch raw rows for the
+# partial days at either end of the range.
+
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+def firstOfNextMonth(day):
+    return (day.replace(day=28)+timedelta(days=4)).replace(day=1)
+
+def upsertTotals(rollup, period, totals):
+    """Add totals, keyed by (user_id, type, currency, period value), onto rollup rows."""
+    rows = [
+        {'user_id':user_id,'type':transactionType,'currency':currency,period:value,'total':total,'count':count}
+        for (user_id, transactionType, currency, value), (total, count) in totals.items()
+    ]
+    if not rows:
+        return
+    upsertInsert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if upsertInsert is None:
+        for row in rows:
+            key = (row['user_id'], row['type'], row['currency'], row[period])
+            existing = db.session.get(rollup, key)
+            if existing is None:
+                db.session.add(rollup(**row))
+            else:
+                existing.total += row['total']
+                existing.count += row['count']
+        return
+    # Executed with rows as parameters rather than a multi-VALUES literal, so
+    # the statement compiles once and is reused from the compiled cache.
+    table = rollup.__table__
+    statement = upsertInsert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_id','type','currency',period],
+        set_={
+            'total':table.c.total+statement.excluded.total,
+            'count':table.c.count+statement.excluded.count,
+        }
+    )
+    db.session.execute(statement, rows)
+
+def applyToRollups(rows):
+    """Fold freshly inserted transaction rows into the daily and monthly rollups.
+
+    Runs in the caller's transaction so rollups commit or roll back together
+    with the rows themselves.
+    """
+    daily = defaultdict(lambda: [0, 0])
+    monthly = defaultdict(lambda: [0, 0])
+    for row in rows:
+        if row.get('date') is None:
+            continue
+        day = row['date'].date()
+        for totals, value in ((daily, day), (monthly, day.replace(day=1))):
+            entry = totals[(row['user_id'], row['type'], row['currency'], value)]
+            entry[0] += row['amount']
+            entry[1] += 1
+    upsertTotals(DailyRollup, 'day', daily)
+    upsertTotals(MonthlyRollup, 'month', monthly)
+
+def splitRange(start_date, end_date):
+    """Split the inclusive range [start_date, end_date] into the pieces each source answers.
+
+    Returns (raw, days, months): raw is a list of inclusive datetime ranges
+    that only partially cover a day, days a list of inclusive date ranges of
+    whole days outside whole months, and months an inclusive range of first
+    days of whole months, or None.
+    """
+    firstDay = start_date.date()
+    if start_date.time() != time.min:
+        firstDay += timedelta(days=1)
+    lastDay = end_date.date()
+    if end_date.time() != time.max:
+        lastDay -= timedelta(days=1)
+    if firstDay > lastDay:
+        return [(start_date, end_date)], [], None
+
+    raw = []
+    if start_date < datetime.combine(firstDay, time.min):
+        raw.append((start_date, datetime.combine(firstDay, time.min)-timedelta(microseconds=1)))
+    afterLastDay = datetime.combine(lastDay+timedelta(days=1), time.min)
+    if afterLastDay <= end_date:
+        raw.append((afterLastDay, end_date))
+
+    firstMonth = firstDay if firstDay.day == 1 else firstOfNextMonth(firstDay)
+    endMonth = (lastDay+timedelta(days=1)).replace(day=1)
+    if firstMonth >= endMonth:
+        return raw, [(firstDay, lastDay)], None
+
+    days = []
+    if firstDay < firstMonth:
+        days.append((firstDay, firstMonth-timedelta(days=1)))
+    if endMonth <= lastDay:
+        days.append((endMonth, lastDay))
+    lastMonth = (endMonth-timedelta(days=1)).replace(day=1)
+    return raw, days, (firstMonth, lastMonth)
+
+def rollupSelects(model, user_id, start_date, end_date, *groupBy):
+    """Selects of (*groupBy, total) over raw edges, daily and monthly rollups for the range."""
+    raw, days, months = splitRange(start_date, end_date)
+    identity = model.__mapper__.polymorphic_identity
+    selects = []
+
+    def source(table, amount, criteria):
+        columns = [getattr(table, name).label(name) for name in groupBy]
+        criteria = [table.user_id == user_id]+criteria
+        if identity is not None:
+            criteria.append(table.type == identity)
+        return select(*columns, sumOf(amount).label('total')).where(*criteria).group_by(*columns)
+
+    if raw:
+        selects.append(source(Transaction, Transaction.amount, [db.or_(*(
+            db.and_(Transaction.date >= low, Transaction.date <= high) for low, high in raw
+        ))]))
+    if days:
+        selects.append(source(DailyRollup, DailyRollup.total, [db.or_(*(
+            DailyRollup.day.between(low, high) for low, high in days
+        ))]))
+    if months:
+        selects.append(source(MonthlyRollup, MonthlyRollup.total, [MonthlyRollup.month.between(*months)]))
+    return selects
+
+def totalInRange(model, user_id, start_date, end_date):
+    """Same result as queries.sumInRange, read from the rollups in one round trip."""
+    if MINOR_UNITS:
+        totals = union_all(*rollupSelects(model, user_id, start_date, end_date, 'currency')).subquery()
+        return sumAmounts(db.session.query(totals.c.currency, sumOf(totals.c.total)).group_by(totals.c.currency))
+    totals = union_all(*rollupSelects(model, user_id, start_date, end_date)).subquery()
+    total = db.session.query(sumOf(totals.c.total)).scalar()
+    if total is None:
+        total = 0
+    return total
+
+def dailyTotals(model, user_id, start_date, end_date):
+    """(currency, day, total) rows for the range, from daily rollups and raw edge rows."""
+    raw, days, months = splitRange(start_date, end_date)
+    if months is not None:
+        days = days+[(months[0], firstOfNextMonth(months[1])-timedelta(days=1))]
+    identity = model.__mapper__.polymorphic_identity
+    selects = []
+
+    def source(table, day, amount, criteria):
+        criteria = [table.user_id == user_id]+criteria
+        if identity is not None:
+            criteria.append(table.type == identity)
+        return select(
+            table.currency.label('currency'),
+            day.label('day'),
+            sumOf(amount).label('total')
+        ).where(*criteria).group_by(table.currency, day)
+
+    if raw:
+        selects.append(source(Transaction, dayOf(Transaction.date), Transaction.amount, [db.or_(*(
+            db.and_(Transaction.date >= low, Transaction.date <= high) for low, high in raw
+        ))]))
+    if days:
+        selects.append(source(DailyRollup, DailyRollup.day, DailyRollup.total, [db.or_(*(
+            DailyRollup.day.between(low, high) for low, high in days
+        ))]))
+    return db.session.execute(union_all(*selects)).all()
+
+BUCKETS = {'day': dayOf, 'week': weekOf, 'month': monthOf, 'year': yearOf}
+
+def bucketTotals(user_id, start_date, end_date, granularity):
+    """(type, currency, bucket, total, count) rows of the range per day, week, month or year.
+
+    bucket is the first day of each period. Grouping happens in SQL over the
+    rollups, with raw rows only for the partial days at the edges; monthly
+    rollups stand in for whole months when buckets are months or years.
+    """
+    bucket = BUCKETS[granularity]
+    raw, days, months = splitRange(start_date, end_date)
+    if months is not None and granularity in ('day', 'week'):
+        days = days+[(months[0], firstOfNextMonth(months[1])-timedelta(days=1))]
+        months = None
+    selects = []
+
+    def source(table, period, amount, count, criteria):
+        start = bucket(period)
+        return select(
+            table.type.label('type'),
+            table.currency.label('currency'),
+            start.label('bucket'),
+            sumOf(amount).label('total'),
+            count.label('count'),
+        ).where(table.user_id == user_id, *criteria).group_by(table.type, table.currency, start)
+
+    if raw:
+        selects.append(source(Transaction, Transaction.date, Transaction.amount, db.func.count(), [db.or_(*(
+            db.and_(Transaction.date >= low, Transaction.date <= high) for low, high in raw
+        ))]))
+    if days:
+        selects.append(source(DailyRollup, DailyRollup.day, DailyRollup.total, db.func.sum(DailyRollup.count), [db.or_(*(
+            DailyRollup.day.between(low, high) for low, high in days
+        ))]))
+    if months:
+        selects.append(source(MonthlyRollup, MonthlyRollup.month, MonthlyRollup.total, db.func.sum(MonthlyRollup.count), [
+            MonthlyRollup.month.between(*months)
+        ]))
+    totals = union_all(*selects).subquery()
+    return db.session.execute(
+        select(totals.c.type, totals.c.currency, totals.c.bucket, sumOf(totals.c.total), db.func.sum(totals.c.count))
+        .group_by(totals.c.type, totals.c.currency, totals.c.bucket)
+    ).all()
+
+def rebuildRollups(user_id=None):
+    """Recompute rollups from the transactions table, for one user or everyone."""
+    if user_id is not None:
+        noteWrittenUsers(db.session, {user_id})
+    else:
+        noteAllUsersWritten(db.session)
+    for rollup in (DailyRollup, MonthlyRollup):
+        query = db.session.query(rollup)
+        if user_id is not None:
+            query = query.filter(rollup.user_id == user_id)
+        query.delete(synchronize_session=False)
+
+    for rollup, period, truncate in ((DailyRollup, 'day', dayOf), (MonthlyRollup, 'month', monthOf)):
+        value = truncate(Transaction.date)
+        statement = select(
+            Transaction.user_id,
+            Transaction.type,
+            Transaction.currency,
+            value,
+            db.func.sum(Transaction.amount),
+            db.func.count()
+        ).where(Transaction.date.isnot(None))
+        if user_id is not None:
+            statement = statement.where(Transaction.user_id == user_id)
+        statement = statement.group_by(Transaction.user_id, Transaction.type, Transaction.currency, value)
+        db.session.execute(insert(rollup).from_select(
+            ['user_id','type','currency',period,'total','count'], statement
+        ))
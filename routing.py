@@ -0,0 +1,56 @@
+import itertools
+import time
+from functools import wraps
+from flask import current_app, session
+from flask_sqlalchemy.session import Session
+
+# Read-only endpoints can be served by replicas, configured as the
+# 'replica<N>' binds (see Config). A client that has just written is kept on
+# the primary for READ_YOUR_WRITES_SECONDS so it always sees its own changes;
+# the timestamp lives in the signed session cookie, so this holds whichever
+# worker process serves the next request.
+
+REPLICA_PREFIX = 'replica'
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica while session.info['use_replica'] is set.
+
+    Flushes always go to the primary.
+    """
+
+    _counter = itertools.count()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not self._flushing:
+            replicas = [engine for key, engine in sorted(self._db.engines.items(), key=lambda item: str(item[0]))
+                        if isinstance(key, str) and key.startswith(REPLICA_PREFIX)]
+            if replicas:
+                return replicas[next(self._counter) % len(replicas)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def noteWrite():
+    """Pin this client to the primary for the read-your-writes window."""
+    session['last_write'] = time.time()
+
+def wroteRecently():
+    lastWrite = session.get('last_write')
+    return lastWrite is not None and time.time()-lastWrite < current_app.config['READ_YOUR_WRITES_SECONDS']
+
+def onReplica():
+    """Whether this request's reads go to a replica."""
+    db = current_app.extensions['sqlalchemy']
+    return bool(db.session.info.get('use_replica')) and any(
+        isinstance(key, str) and key.startswith(REPLICA_PREFIX) for key in db.engines)
+
+def readReplica(view):
+    """Serve a read-only view from a replica unless the client wrote recently.
+
+    The flag stays on the request's session until it is removed at teardown,
+    so streamed responses keep reading from the same place.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not wroteRecently():
+            current_app.extensions['sqlalchemy'].session.info['use_replica'] = True
+        return view(*args, **kwargs)
+    return wrapper
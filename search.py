@@ -0,0 +1,88 @@
+import re
+from sqlalchemy import Float, cast, column, func, literal, literal_column, table
+from models import db, Transaction
+
+# Ranked search over transaction descriptions for /search.
+#
+# PostgreSQL matches against to_tsvector('simple', description), answered by
+# the GIN expression index ix_transactions_description_search, and ranks with
+# ts_rank. SQLite matches against transactions_search, an FTS5 table kept in
+# step with transactions by triggers, and ranks with bm25. Both are created
+# with the tables (models.py) and by migration 6b2e9f4c1d07. Either way every
+# term is a prefix that has to match some word of the description, so
+# "coff" finds "Coffee". The 'simple' configuration does not stem or drop
+# stop words, which suits merchant names and behaves like FTS5's default
+# tokenizer. Other databases fall back to an unranked ILIKE per term.
+#
+# Results are ordered by (score, date, id), all descending, and paginated by
+# keyset on the same triple. ts_rank only depends on the row itself; bm25
+# also weighs in how common a term is across the whole table, so on SQLite a
+# page boundary can shift slightly when other rows are written in between.
+
+TERM = re.compile(r'\w+')
+MAX_TERMS = 16
+SQLITE_SEARCH_TABLE = table('transactions_search', column('rowid'))
+
+def searchTerms(text):
+    """Lowercased words of a search string, the only characters that reach either query syntax."""
+    return TERM.findall(text.lower())[:MAX_TERMS]
+
+def postgresqlMatch(query, terms):
+    vector = func.to_tsvector(literal_column("'simple'::regconfig"), func.coalesce(Transaction.description, literal_column("''")))
+    tsquery = func.to_tsquery(literal_column("'simple'::regconfig"), ' & '.join(f'{term}:*' for term in terms))
+    # ts_rank is a float4; the cursor's score comes back as a float8, which
+    # never equals the float4 it was read from.
+    return query.filter(vector.op('@@')(tsquery)), cast(func.ts_rank(vector, tsquery), Float(53))
+
+def sqliteMatch(query, terms):
+    searchTable = literal_column('transactions_search')
+    query = query.join(SQLITE_SEARCH_TABLE, SQLITE_SEARCH_TABLE.c.rowid == literal_column('transactions.rowid'))
+    query = query.filter(searchTable.op('MATCH')(' '.join(f'"{term}"*' for term in terms)))
+    # bm25 is lower for better matches.
+    return query, -func.bm25(searchTable)
+
+def likeMatch(query, terms):
+    query = query.filter(*(Transaction.description.ilike(f'%{term}%') for term in terms))
+    return query, literal(0.0)
+
+MATCHES = {
+    'postgresql': postgresqlMatch,
+    'sqlite': sqliteMatch,
+}
+
+def searchQuery(user_id, terms, start_date=None, end_date=None, transactionType=None, after=None, limit=None):
+    """The user's transactions whose description matches every term, best first, with a score column.
+
+    after is a (score, date, id) keyset cursor: only rows ranked strictly
+    after it are returned.
+    """
+    match = MATCHES.get(db.session.get_bind().dialect.name, likeMatch)
+    query = db.session.query(
+        Transaction.id,
+        Transaction.date,
+        Transaction.amount,
+        Transaction.currency,
+        Transaction.description,
+        Transaction.type.label('transactionType'),
+    ).filter(Transaction.user_id == user_id)
+    query, score = match(query, terms)
+    query = query.add_columns(score.label('score'))
+    if start_date is not None:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date is not None:
+        query = query.filter(Transaction.date <= end_date)
+    if transactionType is not None:
+        query = query.filter(Transaction.type == transactionType)
+    if after is not None:
+        afterScore, afterDate, afterId = after
+        query = query.filter(db.or_(
+            score < afterScore,
+            db.and_(score == afterScore, db.or_(
+                Transaction.date < afterDate,
+                db.and_(Transaction.date == afterDate, Transaction.id < afterId)
+            ))
+        ))
+    query = query.order_by(score.desc(), Transaction.date.desc(), Transaction.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query
@@ -0,0 +1,55 @@
+from sqlalchemy import Date
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+# Calendar truncation of DateTime columns. Postgres is the production
+# database; SQLite is what tests and local runs use.
+
+class dayOf(FunctionElement):
+    type = Date()
+    inherit_cache = True
+
+class monthOf(FunctionElement):
+    type = Date()
+    inherit_cache = True
+
+@compiles(dayOf)
+def compileDayOf(element, compiler, **kw):
+    return 'CAST(%s AS DATE)' % compiler.process(element.clauses, **kw)
+
+@compiles(dayOf, 'sqlite')
+def compileDayOfSqlite(element, compiler, **kw):
+    return 'date(%s)' % compiler.process(element.clauses, **kw)
+
+@compiles(monthOf)
+def compileMonthOf(element, compiler, **kw):
+    return "CAST(date_trunc('month', %s) AS DATE)" % compiler.process(element.clauses, **kw)
+
+@compiles(monthOf, 'sqlite')
+def compileMonthOfSqlite(element, compiler, **kw):
+    return "date(%s, 'start of month')" % compiler.process(element.clauses, **kw)
+
+class weekOf(FunctionElement):
+    """Monday starting the ISO week."""
+    type = Date()
+    inherit_cache = True
+
+class yearOf(FunctionElement):
+    type = Date()
+    inherit_cache = True
+
+@compiles(weekOf)
+def compileWeekOf(element, compiler, **kw):
+    return "CAST(date_trunc('week', %s) AS DATE)" % compiler.process(element.clauses, **kw)
+
+@compiles(weekOf, 'sqlite')
+def compileWeekOfSqlite(element, compiler, **kw):
+    return "date(%s, '-6 days', 'weekday 1')" % compiler.process(element.clauses, **kw)
+
+@compiles(yearOf)
+def compileYearOf(element, compiler, **kw):
+    return "CAST(date_trunc('year', %s) AS DATE)" % compiler.process(element.clauses, **kw)
+
+@compiles(yearOf, 'sqlite')
+def compileYearOfSqlite(element, compiler, **kw):
+    return "date(%s, 'start of year')" % compiler.process(element.clauses, **kw)
@@ -0,0 +1,80 @@
+import uuid
+from sqlalchemy import event
+from app import app, db
+from caches import LRUCache, currencyCache, currencyCacheHits, currencyCacheMisses
+from models import Currency, User, MINOR_UNITS
+
+
+def test_currency_validation_is_served_from_cache(client, user_id):
+    currencyCache.invalidate()
+    misses = currencyCacheMisses.value()
+    hits = currencyCacheHits.value()
+    for _ in range(3):
+        response = client.post('/addExpense', json={'user': user_id, 'amount': 1, 'currency': 'USD', 'date': '2024-01-01'})
+        assert response.status_code == 201
+    # Minor unit storage also looks up the currency's exponent.
+    lookups = 2 if MINOR_UNITS else 1
+    assert currencyCacheMisses.value() == misses+1
+    assert currencyCacheHits.value() == hits+3*lookups-1
+
+
+def test_committed_currency_invalidates_cache(client, user_id):
+    response = client.post('/addExpense', json={'user': user_id, 'amount': 1, 'currency': 'GBP', 'date': '2024-01-01'})
+    assert response.status_code == 500
+
+    result = app.test_cli_runner().invoke(args=['add-currency', 'gbp'])
+    assert 'Added GBP' in result.output
+
+    response = client.post('/addExpense', json={'user': user_id, 'amount': 1, 'currency': 'GBP', 'date': '2024-01-01'})
+    assert response.status_code == 201
+
+
+def test_rolled_back_currency_keeps_cache(client):
+    with app.app_context():
+        codes = currencyCache.codes()
+        db.session.add(Currency(currency='JPY'))
+        db.session.flush()
+        db.session.rollback()
+        assert currencyCache.codes() is codes
+
+
+def test_metrics_endpoint_exposes_cache_counters(client):
+    body = client.get('/metrics').get_data(as_text=True)
+    assert '# TYPE currency_cache_hits_total counter' in body
+    assert 'currency_cache_misses_total ' in body
+
+
+def test_authenticated_write_runs_no_user_queries(client, user_id):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.post('/addExpense', json={'user': user_id, 'amount': 1, 'currency': 'USD', 'date': '2024-01-01'})
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 201
+    assert not [statement for statement in statements if 'FROM users' in statement]
+
+
+def test_user_update_evicts_cached_user(client, user_id):
+    with app.app_context():
+        user = db.session.get(User, uuid.UUID(user_id))
+        user.name = 'renamed'
+        db.session.commit()
+    assert client.get('/currentUser').get_json()['username'] == 'renamed'
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert len(cache) == 2
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import NullPool
+from config import engineOptions
+from dbPool import TimedQueuePool, checkoutTimeouts, checkoutWait
+
+
+def test_engine_options_from_environment(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '20')
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '5')
+    monkeypatch.setenv('DB_POOL_RECYCLE', '1800')
+    monkeypatch.setenv('DB_POOL_PRE_PING', 'true')
+    monkeypatch.setenv('DB_STATEMENT_TIMEOUT_MS', '5000')
+    assert engineOptions('postgresql://db/finances') == {
+        'poolclass': TimedQueuePool,
+        'pool_size': 20,
+        'max_overflow': 5,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'connect_args': {'options': '-c statement_timeout=5000'},
+    }
+
+
+def test_external_pooler_disables_pooling(monkeypatch):
+    monkeypatch.setenv('DB_EXTERNAL_POOLER', '1')
+    monkeypatch.setenv('DB_POOL_SIZE', '20')
+    assert engineOptions('postgresql://db/finances') == {'poolclass': NullPool}
+
+
+def test_sqlite_keeps_default_engine_options(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '20')
+    assert engineOptions('sqlite:///:memory:') == {}
+
+
+def test_timed_pool_records_checkout_wait_and_timeouts(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/pool.db', poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.01)
+    observed = checkoutWait.value()
+    timeouts = checkoutTimeouts.value()
+    with engine.connect():
+        assert checkoutWait.value() == observed+1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    assert checkoutTimeouts.value() == timeouts+1
+    engine.dispose()
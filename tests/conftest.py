@@ -0,0 +1,31 @@
+import os
+import pytest
+
+# app.py reads its configuration at import time, so the test database has to
+# be in place before any test module imports it.
+os.environ.setdefault('DATABASE_URI', 'sqlite:///:memory:')
+os.environ.setdefault('SECRET_KEY', 'test_secret_key')
+
+
+@pytest.fixture
+def client():
+    from app import app, db
+    from models import Currency
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([Currency(currency='USD'), Currency(currency='EUR')])
+            db.session.commit()
+        yield client
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture
+def user_id(client):
+    """Register and log in a user, returning its id."""
+    client.post('/register', json={'username': 'testuser', 'plaintext': 'testpassword'})
+    client.get('/login', json={'username': 'testuser', 'password': 'testpassword'})
+    return client.get('/currentUser').get_json()['id']
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from listing_test import seed, rangePayload
+from encoders import RecordsJsonEncoder, ColumnsJsonEncoder, dumps
+
+COLUMNS = ('date', 'amount', 'currency')
+ROWS = [(datetime(2024, 1, 1, 12, 30), Decimal('10.50'), 'USD'), (datetime(2024, 1, 2), Decimal('3'), 'EUR')]
+
+
+def test_json_encoders_serialize_row_tuples():
+    assert json.loads(RecordsJsonEncoder().encode(COLUMNS, ROWS)) == [
+        {'date': '2024-01-01T12:30:00', 'amount': 10.5, 'currency': 'USD'},
+        {'date': '2024-01-02T00:00:00', 'amount': 3.0, 'currency': 'EUR'},
+    ]
+    assert json.loads(ColumnsJsonEncoder().encode(COLUMNS, ROWS, {'next_cursor': None})) == {
+        'columns': ['date', 'amount', 'currency'],
+        'data': {'date': ['2024-01-01T12:30:00', '2024-01-02T00:00:00'], 'amount': [10.5, 3.0], 'currency': ['USD', 'EUR']},
+        'next_cursor': None,
+    }
+    assert json.loads(ColumnsJsonEncoder().encode(COLUMNS, []))['data'] == {'date': [], 'amount': [], 'currency': []}
+
+
+def test_dumps_converts_decimals_and_datetimes():
+    assert json.loads(dumps({'rows': ROWS[:1], 'text': 'ü'})) == {'rows': [['2024-01-01T12:30:00', 10.5, 'USD']], 'text': 'ü'}
+
+
+def test_get_all_defaults_to_json_records(client, user_id):
+    seed(client, user_id)
+    response = client.get('/getAll', json=rangePayload(user_id), headers={'Accept': '*/*'})
+    assert response.mimetype == 'application/json'
+    assert 'Accept' in response.headers['Vary']
+    assert len(response.get_json()) == 6
+
+
+def test_get_all_columns_json_pages(client, user_id):
+    seed(client, user_id)
+    response = client.get('/getAll', json=rangePayload(user_id, limit=4), headers={'Accept': 'application/vnd.columns+json'})
+    data = response.get_json(force=True)
+    assert response.mimetype == 'application/vnd.columns+json'
+    assert data['columns'] == ['date', 'amount', 'currency', 'description', 'transactionType']
+    assert [float(amount) for amount in data['data']['amount']] == [5.0, 100.0, 10.0, 10.0]
+    assert data['next_cursor'] is not None
+
+
+def test_get_all_msgpack(client, user_id):
+    msgpack = pytest.importorskip('msgpack')
+    seed(client, user_id)
+    response = client.get('/getAll', json=rangePayload(user_id), headers={'Accept': 'application/msgpack'})
+    data = msgpack.unpackb(response.data)
+    assert response.mimetype == 'application/msgpack'
+    date, amount, *rest = data['rows'][0]
+    assert (date, float(amount), *rest) == ('2024-01-01T00:00:00', 5.0, 'EUR', '', 'expense')
+
+
+def test_get_all_arrow(client, user_id):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    seed(client, user_id)
+    response = client.get('/getAll', json=rangePayload(user_id, limit=10), headers={'Accept': 'application/vnd.apache.arrow.stream'})
+    table = pyarrow.ipc.open_stream(response.data).read_all()
+    assert table.num_rows == 6
+    assert table.column('transactionType').to_pylist().count('income') == 2
+    assert table.schema.metadata == {b'next_cursor': b''}
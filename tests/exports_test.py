@@ -0,0 +1,98 @@
+import base64
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from app import app
+from models import db, Transaction
+from listing_test import seed
+
+
+@pytest.fixture
+def settled(client):
+    app.config['EXPORT_SETTLE_SECONDS'] = 0
+    yield
+    app.config['EXPORT_SETTLE_SECONDS'] = 60
+
+
+def backdate(created_at):
+    with app.app_context():
+        db.session.query(Transaction).update({'created_at': created_at})
+        db.session.commit()
+
+
+def test_export_csv_with_digest(client, user_id, settled):
+    seed(client, user_id)
+    backdate(datetime(2024, 1, 1))
+    response = client.get('/export', json={'user_id': user_id})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['X-Export-Rows'] == '6'
+    assert response.headers['Digest'] == 'sha-256='+base64.b64encode(hashlib.sha256(response.data).digest()).decode()
+
+    rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+    assert len(rows) == 6
+    assert {row['user_id'] for row in rows} == {user_id}
+    assert sorted(Decimal(row['amount']) for row in rows if row['type'] == 'income') == [100, 100]
+
+
+def test_export_since_watermark_is_incremental(client, user_id, settled):
+    seed(client, user_id)
+    backdate(datetime(2024, 1, 1))
+    client.post('/addExpense', json={'user': user_id, 'amount': 7, 'currency': 'USD', 'date': '2024-03-01'})
+    with app.app_context():
+        db.session.query(Transaction).filter(Transaction.created_at > datetime(2024, 1, 1)).update({'created_at': datetime(2024, 2, 1)})
+        db.session.commit()
+
+    response = client.get('/export', json={'user_id': user_id, 'since': '2024-01-15T00:00:00'})
+    rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+    assert [(row['type'], row['amount']) for row in rows] == [('expense', '7.00')]
+    assert datetime.fromisoformat(response.headers['X-Export-Watermark']) > datetime(2024, 2, 1)
+
+
+def test_export_rejects_unknown_format(client, user_id):
+    response = client.get('/export', json={'user_id': user_id, 'format': 'xlsx'})
+    assert response.status_code == 400
+
+
+def test_export_arrow_file(client, user_id, settled):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    seed(client, user_id)
+    backdate(datetime(2024, 1, 1))
+    response = client.get('/export', json={'user_id': user_id, 'format': 'arrow'})
+    table = pyarrow.ipc.open_file(pyarrow.BufferReader(response.data)).read_all()
+    assert table.num_rows == 6
+    assert sum(table.column('amount').to_pylist()) == Decimal('275')
+
+
+def test_export_cli_writes_verifiable_parquet(client, user_id, settled, tmp_path):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    seed(client, user_id)
+    backdate(datetime(2024, 1, 1))
+    app.config['EXPORT_BATCH_SIZE'] = 4
+    try:
+        path = str(tmp_path / 'all.parquet')
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['export', path])
+        assert result.exit_code == 0, result.output
+    finally:
+        app.config['EXPORT_BATCH_SIZE'] = 50000
+
+    parquet = pyarrow.parquet.ParquetFile(path)
+    assert parquet.metadata.num_rows == 6
+    assert parquet.metadata.num_row_groups == 2
+    with open(path+'.manifest.json') as manifestFile:
+        assert json.load(manifestFile)['rows'] == 6
+    assert runner.invoke(args=['verify-export', path]).exit_code == 0
+
+    with open(path, 'r+b') as exportFile:
+        exportFile.seek(10)
+        exportFile.write(b'\0')
+    result = runner.invoke(args=['verify-export', path])
+    assert result.exit_code == 1
+    assert 'SHA-256' in result.output
@@ -0,0 +1,57 @@
+import hashing
+from app import app
+from hashing import HashingPool, needsRehash, computeHash
+from models import User
+
+
+def test_login_upgrades_outdated_hash(client):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    try:
+        client.post('/register', json={'username': 'rehash', 'plaintext': 'secret'})
+        with app.app_context():
+            assert User.query.filter_by(name='rehash').one().hashText.startswith('pbkdf2:sha256:1000$')
+
+        app.config['PASSWORD_HASH_METHOD'] = 'bcrypt'
+        app.config['BCRYPT_LOG_ROUNDS'] = 4
+        response = client.get('/login', json={'username': 'rehash', 'password': 'secret'})
+        assert response.status_code == 200
+        with app.app_context():
+            hashText = User.query.filter_by(name='rehash').one().hashText
+        assert hashText.startswith('$2b$04$')
+
+        client.get('/logout')
+        response = client.get('/login', json={'username': 'rehash', 'password': 'secret'})
+        assert response.status_code == 200
+    finally:
+        app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'
+        app.config['BCRYPT_LOG_ROUNDS'] = 12
+
+
+def test_needs_rehash_compares_algorithm_and_cost():
+    with app.app_context():
+        app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+        try:
+            assert not needsRehash(computeHash('x', 'scrypt:32768:8:1', None))
+            assert needsRehash(computeHash('x', 'scrypt:16384:8:1', None))
+            app.config['PASSWORD_HASH_METHOD'] = 'bcrypt'
+            app.config['BCRYPT_LOG_ROUNDS'] = 5
+            assert not needsRehash(computeHash('x', 'bcrypt', 5))
+            assert needsRehash(computeHash('x', 'bcrypt', 4))
+        finally:
+            app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'
+            app.config['BCRYPT_LOG_ROUNDS'] = 12
+
+
+def test_full_hashing_pool_sheds_with_503(client, monkeypatch):
+    pool = HashingPool(workers=1, queueDepth=0)
+    monkeypatch.setattr(hashing, '_pool', pool)
+    assert pool._slots.acquire(blocking=False)
+    try:
+        response = client.post('/register', json={'username': 'busy', 'plaintext': 'secret'})
+    finally:
+        pool._slots.release()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+    response = client.post('/register', json={'username': 'busy', 'plaintext': 'secret'})
+    assert response.status_code == 201
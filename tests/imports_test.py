@@ -0,0 +1,84 @@
+import io
+import uuid
+from datetime import date
+from app import app
+from models import db, Transaction, DailyRollup
+from money import storedAmount
+
+STATEMENT = '''date,amount,currency,description,type
+2024-01-05,-12.50,USD,Coffee beans,
+2024-01-06,2500.00,USD,Salary,
+2024-01-07,300,EUR,Index fund,investment
+2024-01-08,abc,USD,Broken,
+2024-01-09,5,GBP,Unknown currency,
+'''
+
+OFX = '''OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<CURDEF>EUR
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240210120000.000[-5:EST]<TRNAMT>-40.00<FITID>A1<NAME>Groceries &amp; more</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240210120000.000[-5:EST]<TRNAMT>-40.00<FITID>A2<NAME>Groceries &amp; more</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240211<TRNAMT>15.00<FITID>A3<MEMO>Refund</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+'''
+
+
+def upload(client, user_id, content, filename, **fields):
+    data = {'user': user_id, 'file': (io.BytesIO(content.encode()), filename), **fields}
+    return client.post('/import', data=data, content_type='multipart/form-data')
+
+
+def test_import_csv_reports_invalid_lines(client, user_id):
+    response = upload(client, user_id, STATEMENT, 'statement.csv')
+    assert response.status_code == 200
+    stats = response.get_json()
+    assert (stats['rows'], stats['inserted'], stats['duplicates'], stats['invalid']) == (5, 3, 0, 2)
+    assert [error['line'] for error in stats['errors']] == [5, 6]
+
+    with app.app_context():
+        rows = sorted((row.type, row.amount, row.currency) for row in Transaction.query)
+        assert rows == [('expense', storedAmount('12.50', 'USD'), 'USD'), ('income', storedAmount('2500.00', 'USD'), 'USD'),
+                        ('investment', storedAmount('300.00', 'EUR'), 'EUR')]
+
+
+def test_reimport_is_idempotent(client, user_id):
+    upload(client, user_id, STATEMENT, 'statement.csv')
+    stats = upload(client, user_id, STATEMENT, 'statement.csv').get_json()
+    assert (stats['inserted'], stats['duplicates']) == (0, 3)
+
+    with app.app_context():
+        assert Transaction.query.count() == 3
+        day = db.session.get(DailyRollup, (uuid.UUID(user_id), 'expense', 'USD', date(2024, 1, 5)))
+        assert (day.total, day.count) == (storedAmount('12.50', 'USD'), 1)
+
+
+def test_import_ofx_keeps_same_day_transactions_apart_by_fitid(client, user_id):
+    stats = upload(client, user_id, OFX, 'bank.qfx', format='ofx').get_json()
+    assert (stats['rows'], stats['inserted']) == (3, 3)
+    with app.app_context():
+        rows = sorted((row.type, row.amount, row.currency, row.description) for row in Transaction.query)
+        assert rows == [
+            ('expense', storedAmount('40.00', 'EUR'), 'EUR', 'Groceries & more'),
+            ('expense', storedAmount('40.00', 'EUR'), 'EUR', 'Groceries & more'),
+            ('income', storedAmount('15.00', 'EUR'), 'EUR', 'Refund'),
+        ]
+    assert upload(client, user_id, OFX, 'bank.ofx').get_json()['duplicates'] == 3
+
+
+def test_import_rejects_missing_columns_and_formats(client, user_id):
+    assert upload(client, user_id, 'date,amount\n2024-01-01,1\n', 'statement.csv').status_code == 400
+    assert upload(client, user_id, STATEMENT, 'statement.xlsx').status_code == 400
+
+
+def test_import_cli_batches(client, user_id, tmp_path):
+    path = tmp_path / 'statement.csv'
+    path.write_text(STATEMENT)
+    result = app.test_cli_runner().invoke(args=['import-transactions', str(path), '--user', user_id, '--batch-size', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 3 of 5 transactions' in result.output
+    with app.app_context():
+        assert Transaction.query.count() == 3
@@ -0,0 +1,89 @@
+import pytest
+from app import app
+from models import Expense, MINOR_UNITS
+from money import storedAmount
+
+
+def test_add_expense_single_row(client, user_id):
+    response = client.post('/addExpense', json={
+        'user': user_id,
+        'amount': 100,
+        'currency': 'USD',
+        'date': '2023-01-01',
+        'description': 'Groceries'
+    })
+    assert response.status_code == 201
+    assert response.get_json()['message'] == 'Expense added'
+
+
+def test_add_expense_unknown_user(client, user_id):
+    response = client.post('/addExpense', json={
+        'user': '00000000-0000-0000-0000-000000000000',
+        'amount': 100,
+        'currency': 'USD',
+        'date': '2023-01-01'
+    })
+    assert response.status_code == 404
+    assert response.get_json()['error'] == 'User not found'
+
+
+def test_add_expenses_batch_reports_per_row_status(client, user_id):
+    response = client.post('/addExpenses', json={
+        'user': user_id,
+        'records': [
+            {'amount': 10, 'currency': 'USD', 'date': '2024-01-01'},
+            {'amount': 20, 'currency': 'XXX', 'date': '2024-01-02'},
+            {'amount': 30, 'currency': 'EUR', 'date': 'not a date'},
+            {'amount': 40, 'currency': 'EUR', 'date': '2024-01-04', 'description': 'Books'},
+        ]
+    })
+    data = response.get_json()
+    assert response.status_code == 207
+    assert data['created'] == 2
+    assert data['failed'] == 2
+    assert [result['status'] for result in data['results']] == ['created', 'error', 'error', 'created']
+    assert data['results'][1]['error'] == 'Selected currency not available'
+    assert data['results'][2]['error'] == 'Invalid date format'
+
+    with app.app_context():
+        assert sorted(expense.amount for expense in Expense.query.all()) == [storedAmount(10, 'USD'), storedAmount(40, 'EUR')]
+        assert Expense.query.filter_by(description='Books').one().currency == 'EUR'
+
+
+@pytest.mark.parametrize('amount', ['NaN', 'Infinity', '-inf', '1e30', pytest.param(
+    '99999999.995', marks=pytest.mark.skipif(MINOR_UNITS, reason='rounds past NUMERIC(10, 2) only'))])
+def test_add_expenses_batch_rejects_amounts_the_column_cannot_hold(client, user_id, amount):
+    response = client.post('/addExpenses', json={
+        'user': user_id,
+        'records': [
+            {'amount': 12, 'currency': 'USD', 'date': '2024-01-01'},
+            {'amount': amount, 'currency': 'USD', 'date': '2024-01-02'},
+        ]
+    })
+    data = response.get_json()
+    assert response.status_code == 207
+    assert (data['created'], data['failed']) == (1, 1)
+    assert data['results'][1]['error'] == 'Invalid amount'
+    with app.app_context():
+        assert [expense.amount for expense in Expense.query.all()] == [storedAmount(12, 'USD')]
+
+
+def test_add_incomes_batch_all_valid(client, user_id):
+    response = client.post('/addIncomes', json={
+        'user': user_id,
+        'records': [{'amount': i, 'currency': 'USD', 'date': '2024-02-01'} for i in range(50)]
+    })
+    assert response.status_code == 201
+    assert response.get_json()['created'] == 50
+
+
+def test_add_investments_batch_limit(client, user_id):
+    app.config['MAX_BATCH_SIZE'] = 2
+    try:
+        response = client.post('/addInvestments', json={
+            'user': user_id,
+            'records': [{'amount': 1, 'currency': 'USD', 'date': '2024-02-01'}] * 3
+        })
+    finally:
+        app.config['MAX_BATCH_SIZE'] = 5000
+    assert response.status_code == 413
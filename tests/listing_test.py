@@ -0,0 +1,77 @@
+import json
+
+
+def addRecords(client, endpoint, user_id, records):
+    response = client.post(endpoint, json={'user': user_id, 'records': records})
+    assert response.status_code == 201
+
+
+def seed(client, user_id):
+    addRecords(client, '/addExpenses', user_id, [
+        {'amount': 10, 'currency': 'USD', 'date': '2024-01-03'},
+        {'amount': 10, 'currency': 'USD', 'date': '2024-01-03'},
+        {'amount': 5, 'currency': 'EUR', 'date': '2024-01-01'},
+    ])
+    addRecords(client, '/addIncomes', user_id, [
+        {'amount': 100, 'currency': 'USD', 'date': '2024-01-02'},
+        {'amount': 100, 'currency': 'USD', 'date': '2024-01-05'},
+    ])
+    addRecords(client, '/addInvestments', user_id, [
+        {'amount': 50, 'currency': 'USD', 'date': '2024-01-04'},
+    ])
+
+
+def rangePayload(user_id, **extra):
+    return dict({'user_id': user_id, 'start_date': '2024-01-01', 'end_date': '2024-01-31'}, **extra)
+
+
+def test_get_all_keeps_identical_rows(client, user_id):
+    seed(client, user_id)
+    response = client.get('/getAll', json=rangePayload(user_id))
+    data = response.get_json()
+    assert response.status_code == 200
+    assert len(data) == 6
+    assert [row['date'][:10] for row in data] == sorted(row['date'][:10] for row in data)
+
+
+def test_get_all_keyset_pages_cover_listing_once(client, user_id):
+    seed(client, user_id)
+    everything = client.get('/getAll', json=rangePayload(user_id)).get_json()
+
+    pages = []
+    cursor = None
+    while True:
+        payload = rangePayload(user_id, limit=4)
+        if cursor:
+            payload['cursor'] = cursor
+        data = client.get('/getAll', json=payload).get_json()
+        pages.append(data['items'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert [len(page) for page in pages] == [4, 2]
+    assert [row for page in pages for row in page] == everything
+
+
+def test_get_all_rejects_bad_cursor(client, user_id):
+    response = client.get('/getAll', json=rangePayload(user_id, limit=2, cursor='nonsense'))
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
+
+
+def test_get_all_streams_json_and_ndjson(client, user_id):
+    seed(client, user_id)
+    everything = client.get('/getAll', json=rangePayload(user_id)).get_json()
+
+    response = client.get('/getAll', json=rangePayload(user_id, stream='json'))
+    assert json.loads(response.get_data(as_text=True)) == everything
+
+    response = client.get('/getAll', json=rangePayload(user_id, stream='ndjson'))
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == everything
+
+
+def test_get_all_streams_empty_range(client, user_id):
+    response = client.get('/getAll', json=rangePayload(user_id, stream='json'))
+    assert json.loads(response.get_data(as_text=True)) == []
@@ -0,0 +1,80 @@
+import pytest
+from app import app
+from models import MINOR_UNITS
+from money import MinorAmount, parseMinorUnits, formatMinorUnits, defaultExponent
+
+
+def test_parse_minor_units_from_every_input_type():
+    assert parseMinorUnits('12.34', 2) == 1234
+    assert parseMinorUnits(' -0.5 ', 2) == -50
+    assert parseMinorUnits(7, 2) == 700
+    assert parseMinorUnits(0.1, 2) == 10
+    assert parseMinorUnits('1500', 0) == 1500
+    assert parseMinorUnits('.25', 3) == 250
+
+
+def test_parse_minor_units_rounds_half_away_from_zero():
+    assert parseMinorUnits('1.005', 2) == 101
+    assert parseMinorUnits('-1.005', 2) == -101
+    assert parseMinorUnits('1.0049', 2) == 100
+
+
+@pytest.mark.parametrize('value', ['', '.', 'abc', '1e3', '1.2.3', True, float('nan'), None])
+def test_parse_minor_units_rejects_non_numbers(value):
+    with pytest.raises((TypeError, ValueError)):
+        parseMinorUnits(value, 2)
+
+
+def test_format_minor_units_is_exact():
+    assert formatMinorUnits(1234, 2) == '12.34'
+    assert formatMinorUnits(-5, 2) == '-0.05'
+    assert formatMinorUnits(1500, 0) == '1500'
+    assert formatMinorUnits(10**20+1, 2) == '1000000000000000000.01'
+
+
+def test_minor_amounts_add_across_exponents():
+    total = MinorAmount(1050, 2)+MinorAmount(3, 0)+MinorAmount(1, 3)
+    assert str(total) == '13.501'
+    assert str(0-MinorAmount(250, 2)) == '-2.50'
+    assert sum([MinorAmount(1, 2)]*3, 0) == MinorAmount(3, 2)
+
+
+def test_default_exponents_follow_iso_4217():
+    assert defaultExponent('JPY') == 0
+    assert defaultExponent('KWD') == 3
+    assert defaultExponent('EUR') == 2
+
+
+def test_add_currency_uses_iso_exponent(client):
+    result = app.test_cli_runner().invoke(args=['add-currency', 'jpy'])
+    assert result.exit_code == 0
+    with app.app_context():
+        from models import Currency
+        assert Currency.query.filter_by(currency='JPY').one().exponent == 0
+
+
+@pytest.mark.skipif(not MINOR_UNITS, reason='needs AMOUNT_STORAGE=minor')
+def test_minor_unit_storage_end_to_end(client, user_id):
+    from models import Expense
+    response = client.post('/addExpenses', json={
+        'user': user_id,
+        'records': [
+            {'amount': '0.10', 'currency': 'USD', 'date': '2024-01-01'},
+            {'amount': 0.2, 'currency': 'USD', 'date': '2024-01-02'},
+            {'amount': '1.005', 'currency': 'EUR', 'date': '2024-01-03'},
+        ]
+    })
+    assert response.status_code == 201
+    with app.app_context():
+        assert sorted(expense.amount for expense in Expense.query.all()) == [10, 20, 101]
+
+    payload = {'user_id': user_id, 'start_date': '2024-01-01T00:00:00', 'end_date': '2024-01-31T23:59:59.999999'}
+    assert client.get('/getExpense', json=payload).get_json()['total_expense'] == '1.31'
+    summary = client.get('/summary', json=payload).get_json()
+    assert summary['by_currency']['USD']['total_expense'] == '0.30'
+    assert summary['net_balance'] == '-1.31'
+    assert summary['total_income'] == '0.00'
+    assert summary['by_currency']['EUR']['total_income'] == '0.00'
+    empty = dict(payload, start_date='2023-01-01T00:00:00', end_date='2023-01-31T23:59:59')
+    assert client.get('/getExpense', json=empty).get_json()['total_expense'] == '0.00'
+    assert [row['amount'] for row in client.get('/getAll', json=payload).get_json()] == ['0.10', '0.20', '1.01']
@@ -0,0 +1,38 @@
+from datetime import date, datetime
+from app import app
+from partitions import partitionName, monthOfPartition, monthsBetween, relationsInPlan, touchedPartitions
+
+
+def test_partition_names_round_trip():
+    assert partitionName(date(2024, 3, 17)) == 'transactions_y2024m03'
+    assert monthOfPartition('transactions_y2024m03') == date(2024, 3, 1)
+    assert monthOfPartition('transactions_default') is None
+
+
+def test_months_between_crosses_years():
+    assert list(monthsBetween(date(2023, 11, 20), date(2024, 2, 1))) == [
+        date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1)
+    ]
+
+
+def test_touched_partitions_of_ranges():
+    assert touchedPartitions([
+        (datetime(2024, 1, 31, 18), datetime(2024, 2, 1, 6)),
+        (datetime(2024, 4, 10), datetime(2024, 4, 10, 23)),
+    ]) == {'transactions_y2024m01', 'transactions_y2024m02', 'transactions_y2024m04'}
+
+
+def test_relations_in_plan_walks_children():
+    plan = {'Node Type': 'Aggregate', 'Plans': [
+        {'Node Type': 'Append', 'Plans': [
+            {'Node Type': 'Index Only Scan', 'Relation Name': 'transactions_y2024m01'},
+            {'Node Type': 'Seq Scan', 'Relation Name': 'daily_rollups'},
+        ]},
+    ]}
+    assert relationsInPlan(plan) == {'transactions_y2024m01', 'daily_rollups'}
+
+
+def test_partitions_command_needs_partitioned_table(client):
+    result = app.test_cli_runner().invoke(args=['partitions', 'create'])
+    assert result.exit_code == 1
+    assert 'not partitioned' in result.output
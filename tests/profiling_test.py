@@ -0,0 +1,92 @@
+import logging
+import os
+import pytest
+from flask import Flask, Response, jsonify, stream_with_context
+from sqlalchemy import create_engine, text
+import metrics
+import profiling
+
+
+@pytest.fixture
+def profiled(tmp_path, monkeypatch):
+    """A bare app instrumented by profiling.init, with one SQLite engine for its views."""
+    monkeypatch.setattr(profiling, 'slowQuerySeconds', None)
+    app = Flask(__name__)
+    app.config.update(PROFILE_SAMPLE_RATE=0, PROFILE_HEADER='X-Profile', PROFILE_DIR=str(tmp_path), SLOW_QUERY_SECONDS=60)
+    engine = create_engine('sqlite://')
+
+    @app.route('/numbers')
+    def numbers():
+        with engine.connect() as connection:
+            values = [connection.execute(text(f'SELECT {value}')).scalar() for value in range(3)]
+        return jsonify(values)
+
+    @app.route('/stream')
+    def stream():
+        def chunks():
+            with engine.connect() as connection:
+                for value in range(4):
+                    yield str(connection.execute(text(f'SELECT {value}')).scalar()).encode()
+        return Response(stream_with_context(chunks()))
+
+    profiling.init(app)
+    yield app
+    engine.dispose()
+
+
+def sample(name):
+    return next((float(line.split()[-1]) for line in metrics.render().splitlines() if line.startswith(name+' ')), 0)
+
+
+def test_records_queries_sql_time_and_size_per_endpoint(profiled):
+    before = profiling.requestQueries.value(endpoint='numbers')
+    queries = sample('http_request_db_queries_sum{endpoint="numbers"}')
+    with profiled.test_client() as client:
+        response = client.get('/numbers')
+        body = response.data
+        response.close()
+    assert profiling.requestQueries.value(endpoint='numbers') == before+1
+    assert sample('http_request_db_queries_sum{endpoint="numbers"}')-queries == 3
+    assert sample('http_response_size_bytes_sum{endpoint="numbers"}') >= len(body)
+    assert sample('http_request_encode_seconds_count{endpoint="numbers"}') >= 1
+    assert profiling.requestSeconds.value(endpoint='numbers', method='GET', status=200) >= 1
+
+
+def test_streamed_responses_count_queries_made_while_streaming(profiled):
+    with profiled.test_client() as client:
+        response = client.get('/stream')
+        assert response.data == b'0123'
+        response.close()
+    assert sample('http_request_db_queries_sum{endpoint="stream"}') >= 4
+    assert sample('http_response_size_bytes_sum{endpoint="stream"}') >= 4
+
+
+def test_profile_header_saves_cprofile_stats(profiled, tmp_path):
+    with profiled.test_client() as client:
+        response = client.get('/numbers', headers={'X-Profile': '1'})
+        response.close()
+        assert os.path.exists(tmp_path / response.headers['X-Profile-File'])
+        response = client.get('/numbers')
+        response.close()
+        assert 'X-Profile-File' not in response.headers
+
+
+def test_slow_queries_log_their_plan(profiled, monkeypatch, caplog):
+    monkeypatch.setattr(profiling, 'slowQuerySeconds', 0)
+    with caplog.at_level(logging.WARNING, logger='profiling'):
+        with profiled.test_client() as client:
+            client.get('/numbers').close()
+    assert 'Slow query' in caplog.text
+    assert 'Plan:' in caplog.text
+    assert 'EXPLAIN failed' not in caplog.text
+
+
+def test_failed_statements_leave_nothing_on_the_connection(profiled):
+    engine = create_engine('sqlite://')
+    with engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(Exception):
+                connection.execute(text('SELECT * FROM missing'))
+        assert connection.execute(text('SELECT 1')).scalar() == 1
+        assert 'query_started' not in connection.info
+    engine.dispose()
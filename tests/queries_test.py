@@ -0,0 +1,65 @@
+import pytest
+from datetime import datetime
+from app import app, db
+from models import Expense, Income, Transaction, User, Currency
+from money import storedAmount
+from queries import rangeQuery, sumInRange
+
+
+@pytest.fixture
+def user():
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        db.session.add(Currency(currency='USD'))
+        newUser = User(name='queryuser', hashText='x')
+        db.session.add(newUser)
+        db.session.commit()
+        yield newUser
+        db.session.remove()
+        db.drop_all()
+
+
+def test_sum_in_range_only_counts_user_and_range(user):
+    other = User(name='other', hashText='x')
+    db.session.add(other)
+    db.session.flush()
+    db.session.add_all([
+        Expense(user_id=user.id, amount=storedAmount('10.50', 'USD'), currency='USD', date=datetime(2024, 1, 1)),
+        Expense(user_id=user.id, amount=storedAmount('4.50', 'USD'), currency='USD', date=datetime(2024, 1, 31)),
+        Expense(user_id=user.id, amount=storedAmount('99', 'USD'), currency='USD', date=datetime(2024, 2, 1)),
+        Expense(user_id=other.id, amount=storedAmount('99', 'USD'), currency='USD', date=datetime(2024, 1, 15)),
+    ])
+    db.session.commit()
+
+    total = sumInRange(Expense, user.id, datetime(2024, 1, 1), datetime(2024, 1, 31))
+    assert float(total) == 15
+
+
+def test_sum_in_range_defaults_to_zero(user):
+    assert sumInRange(Income, user.id, datetime(2024, 1, 1), datetime(2024, 12, 31)) == 0
+
+
+def test_range_query_selects_requested_columns(user):
+    db.session.add(Expense(user_id=user.id, amount=storedAmount('1', 'USD'), currency='USD', date=datetime(2024, 3, 3), description='Coffee'))
+    db.session.commit()
+
+    rows = rangeQuery(Expense, user.id, datetime(2024, 3, 1), datetime(2024, 3, 31), Expense.description).all()
+    assert [row.description for row in rows] == ['Coffee']
+
+
+def test_transactions_table_has_user_date_indexes():
+    indexes = {index.name: [column.name for column in index.columns] for index in Transaction.__table__.indexes}
+    assert indexes['ix_transactions_user_id_date'] == ['user_id', 'date']
+    assert indexes['ix_transactions_user_id_type_date'] == ['user_id', 'type', 'date']
+
+
+def test_subclass_queries_only_see_their_type(user):
+    db.session.add_all([
+        Expense(user_id=user.id, amount=storedAmount('3', 'USD'), currency='USD', date=datetime(2024, 1, 1)),
+        Income(user_id=user.id, amount=storedAmount('5', 'USD'), currency='USD', date=datetime(2024, 1, 1)),
+    ])
+    db.session.commit()
+
+    assert sumInRange(Expense, user.id, datetime(2024, 1, 1), datetime(2024, 1, 2)) == 3
+    assert sumInRange(Transaction, user.id, datetime(2024, 1, 1), datetime(2024, 1, 2)) == 8
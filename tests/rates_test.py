@@ -0,0 +1,60 @@
+from datetime import date
+import numpy as np
+from app import app
+from rates import RateSeries
+
+
+def loadFixtureRates():
+    result = app.test_cli_runner().invoke(args=['load-rates', 'fixtures/exchange_rates.csv'])
+    assert 'Loaded 24 exchange rates' in result.output
+
+
+def test_rate_series_forward_fills_and_rejects_early_days():
+    series = RateSeries([date(2024, 1, 1), date(2024, 1, 4)], [2, 3])
+    ordinals = np.array([date(2023, 12, 31), date(2024, 1, 1), date(2024, 1, 3), date(2024, 1, 4), date(2024, 2, 1)])
+    rates = series.at(np.array([day.toordinal() for day in ordinals]))
+    assert np.isnan(rates[0])
+    assert rates[1:].tolist() == [2, 2, 3, 3]
+
+
+def test_get_expense_converts_mixed_currencies(client, user_id):
+    loadFixtureRates()
+    client.post('/addExpenses', json={'user': user_id, 'records': [
+        {'amount': 100, 'currency': 'USD', 'date': '2024-01-10'},
+        {'amount': 100, 'currency': 'EUR', 'date': '2024-01-10T12:00:00'},
+        {'amount': 50, 'currency': 'EUR', 'date': '2024-03-02'},
+    ]})
+    payload = {'user_id': user_id, 'start_date': '2024-01-01', 'end_date': '2024-03-31'}
+
+    response = client.get('/getExpense', json=dict(payload, target_currency='USD'))
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['currency'] == 'USD'
+    # EUR was 1.084 on 2024-01-01 and 1.090 on 2024-03-01
+    assert data['total_expense'] == round(100+100*1.084+50*1.09, 2)
+
+    response = client.get('/getExpense', json=dict(payload, target_currency='EUR'))
+    assert response.get_json()['total_expense'] == round(100/1.084+100+50, 2)
+
+
+def test_get_expense_without_rate_is_rejected(client, user_id):
+    loadFixtureRates()
+    client.post('/addExpense', json={'user': user_id, 'amount': 5, 'currency': 'EUR', 'date': '2020-06-01'})
+    response = client.get('/getExpense', json={
+        'user_id': user_id,
+        'start_date': '2020-01-01',
+        'end_date': '2020-12-31',
+        'target_currency': 'USD'
+    })
+    assert response.status_code == 422
+    assert response.get_json()['error'] == 'No exchange rate for EUR on 2020-06-01'
+
+
+def test_get_expense_unknown_target_currency(client, user_id):
+    response = client.get('/getExpense', json={
+        'user_id': user_id,
+        'start_date': '2024-01-01',
+        'end_date': '2024-12-31',
+        'target_currency': 'XXX'
+    })
+    assert response.status_code == 400
@@ -0,0 +1,154 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from customExceptions import ValidationException
+from listing_test import seed, rangePayload
+from models import RecurringRule
+from recurring import indexRange, occurrenceDate, formatRecurrenceRule
+from validation import parseRecurrenceRule
+
+
+def rule(frequency, start, interval=1, count=None, until=None):
+    return RecurringRule(id=uuid.uuid4(), frequency=frequency, interval=interval, start=start, count=count, until=until)
+
+
+def enumerated(rule, start, end):
+    dates, index = [], 0
+    while rule.count is None or index < rule.count:
+        date = occurrenceDate(rule, index)
+        if date > end or (rule.until is not None and date > rule.until):
+            break
+        if date >= start:
+            dates.append(date)
+        index += 1
+    return dates
+
+
+def test_closed_form_ranges_match_enumeration():
+    rng = random.Random(11)
+    for _ in range(300):
+        start = datetime(2020, 1, 1)+timedelta(days=rng.randrange(900), hours=rng.randrange(24))
+        candidate = rule(
+            rng.choice(['daily', 'weekly', 'monthly', 'yearly']), start, rng.randint(1, 3),
+            count=rng.choice([None, rng.randint(1, 40)]),
+            until=rng.choice([None, start+timedelta(days=rng.randrange(2000))]),
+        )
+        low = datetime(2019, 6, 1)+timedelta(days=rng.randrange(2500), minutes=rng.randrange(1440))
+        high = low+timedelta(days=rng.randrange(1500))
+        first, stop = indexRange(candidate, low, high)
+        assert [occurrenceDate(candidate, index) for index in range(first, stop)] == enumerated(candidate, low, high)
+
+
+def test_month_ends_clamp_instead_of_skipping():
+    rent = rule('monthly', datetime(2024, 1, 31, 9))
+    assert [occurrenceDate(rent, index).day for index in range(4)] == [31, 29, 31, 30]
+    assert occurrenceDate(rule('yearly', datetime(2024, 2, 29)), 1) == datetime(2025, 2, 28)
+
+
+def test_rrule_parsing_and_formatting():
+    schedule = parseRecurrenceRule('RRULE:FREQ=WEEKLY;INTERVAL=2;UNTIL=20241231')
+    assert schedule == {'frequency': 'weekly', 'interval': 2, 'count': None, 'until': datetime(2024, 12, 31, 23, 59, 59, 999999)}
+    assert formatRecurrenceRule(rule(**schedule, start=datetime(2024, 1, 1))) == 'FREQ=WEEKLY;INTERVAL=2;UNTIL=20241231'
+    for text in (None, 'FREQ=HOURLY', 'FREQ=DAILY;BYDAY=MO', 'FREQ=DAILY;COUNT=0', 'FREQ=DAILY;UNTIL=tomorrow', 'FREQ'):
+        with pytest.raises(ValidationException):
+            parseRecurrenceRule(text)
+
+
+def addRent(client, user_id, **extra):
+    payload = dict({'user': user_id, 'type': 'expense', 'amount': 1000, 'currency': 'USD', 'date': '2024-01-01T08:00:00',
+                    'description': 'Rent', 'rrule': 'FREQ=MONTHLY'}, **extra)
+    response = client.post('/addRecurring', json=payload)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['id']
+
+
+def total(client, endpoint, payload):
+    data = client.get(endpoint, json=payload).get_json()
+    return float(next(value for key, value in data.items() if key.startswith('total_')))
+
+
+def test_totals_include_occurrences_in_range(client, user_id):
+    seed(client, user_id)
+    addRent(client, user_id)
+    addRent(client, user_id, type='income', amount=3000, description='Salary', rrule='FREQ=MONTHLY;COUNT=2')
+    assert total(client, '/getExpense', rangePayload(user_id)) == 1025
+    assert total(client, '/getExpense', rangePayload(user_id, end_date='2033-12-31T23:59:59')) == 25+1000*120
+    assert total(client, '/getIncome', rangePayload(user_id, end_date='2024-12-31')) == 200+6000
+    converted = rangePayload(user_id, start_date='2024-02-01', end_date='2024-04-30', target_currency='USD')
+    assert total(client, '/getExpense', converted) == 3000
+
+    summary = client.get('/summary', json=rangePayload(user_id, end_date='2024-02-29')).get_json()
+    assert float(summary['by_currency']['USD']['total_expense']) == 20+2000
+    assert float(summary['by_currency']['USD']['total_income']) == 200+6000
+
+
+def test_listing_merges_occurrences_in_order(client, user_id):
+    seed(client, user_id)
+    addRent(client, user_id, date='2024-01-03T00:00:00', rrule='FREQ=WEEKLY;COUNT=4')
+    listing = client.get('/getAll', json=rangePayload(user_id)).get_json()
+    assert len(listing) == 10
+    assert [row['description'] for row in listing].count('Rent') == 4
+    assert [row['date'] for row in listing] == sorted(row['date'] for row in listing)
+
+    pages, cursor = [], None
+    while True:
+        payload = rangePayload(user_id, limit=3, **({'cursor': cursor} if cursor else {}))
+        data = client.get('/getAll', json=payload).get_json()
+        pages.extend(data['items'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert pages == listing
+
+    streamed = client.get('/getAll', json=rangePayload(user_id, stream='json')).get_json()
+    assert streamed == listing
+    first = client.get('/getAll', json=rangePayload(user_id, limit=3)).get_json()
+    page = client.get('/getAll', json=rangePayload(user_id, limit=3, cursor=first['next_cursor'], stream='json')).get_json()
+    assert page == listing[3:6]
+
+
+def test_editing_an_occurrence_materializes_only_that_one(client, user_id):
+    rule_id = addRent(client, user_id)
+    response = client.post('/editOccurrence', json={'user': user_id, 'rule_id': rule_id, 'occurrence': '2024-02-01T08:00:00', 'amount': 1100})
+    assert response.status_code == 201
+    again = client.post('/editOccurrence', json={'user': user_id, 'rule_id': rule_id, 'occurrence': '2024-02-01T08:00:00', 'amount': 900})
+    assert again.status_code == 409
+    deleted = client.post('/editOccurrence', json={'user': user_id, 'rule_id': rule_id, 'occurrence': '2024-03-01T08:00:00', 'delete': True})
+    assert deleted.status_code == 200
+    wrong = client.post('/editOccurrence', json={'user': user_id, 'rule_id': rule_id, 'occurrence': '2024-03-02T08:00:00'})
+    assert wrong.status_code == 400
+
+    payload = rangePayload(user_id, end_date='2024-04-30')
+    assert total(client, '/getExpense', payload) == 1000+1100+1000
+    listing = client.get('/getAll', json=payload).get_json()
+    assert [float(row['amount']) for row in listing] == [1000, 1100, 1000]
+
+
+def test_ending_a_rule_and_listing_rules(client, user_id):
+    rule_id = addRent(client, user_id)
+    response = client.post('/endRecurring', json={'user': user_id, 'rule_id': rule_id, 'until': '2024-03-15'})
+    assert response.status_code == 200
+    assert response.get_json()['rule']['rrule'] == 'FREQ=MONTHLY;UNTIL=20240315T000000'
+    assert total(client, '/getExpense', rangePayload(user_id, end_date='2030-01-01')) == 3000
+
+    rules = client.get('/getRecurring', json={'user_id': user_id}).get_json()['rules']
+    assert [(rule['id'], rule['description'], float(rule['amount'])) for rule in rules] == [(rule_id, 'Rent', 1000)]
+    assert client.post('/endRecurring', json={'user': user_id, 'rule_id': str(uuid.uuid4()), 'until': '2024-03-15'}).status_code == 404
+    assert client.post('/addRecurring', json={'user': user_id, 'type': 'gift', 'amount': 1, 'currency': 'USD',
+                                              'date': '2024-01-01', 'rrule': 'FREQ=DAILY'}).status_code == 400
+
+
+def test_timeseries_counts_occurrences_per_period(client, user_id):
+    rule_id = addRent(client, user_id, date='2024-01-15T08:00:00')
+    client.post('/editOccurrence', json={'user': user_id, 'rule_id': rule_id, 'occurrence': '2024-03-15T08:00:00', 'delete': True})
+    payload = rangePayload(user_id, start_date='2024-01-20', end_date='2024-05-15T08:00:00', granularity='month', running_balance=True)
+    data = client.get('/timeseries', json=payload).get_json()
+    assert data['buckets'] == ['2024-01-01', '2024-02-01', '2024-03-01', '2024-04-01', '2024-05-01']
+    [rent] = data['series']
+    assert (rent['type'], rent['currency']) == ('expense', 'USD')
+    assert rent['totals'] == [0, 1000, 0, 1000, 1000]
+    assert rent['counts'] == [0, 1, 0, 1, 1]
+    assert data['running_balance']['USD'] == [0, -1000, -1000, -2000, -3000]
+    weekly = client.get('/timeseries', json=dict(payload, granularity='week')).get_json()
+    assert sum(weekly['series'][0]['counts']) == 3
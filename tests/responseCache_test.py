@@ -0,0 +1,118 @@
+import uuid
+import pytest
+from sqlalchemy import event
+from app import app, db
+from responseCache import LocalBackend, cacheHits, cacheMisses, notModified, responseCache
+from listing_test import seed, rangePayload
+
+
+@pytest.fixture
+def cached(client):
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    responseCache.clear()
+    yield
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    responseCache.clear()
+
+
+def statementsOf(client, *args, **kwargs):
+    """(response, SQL statements it ran)."""
+    statements = []
+
+    def record(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        return client.get(*args, **kwargs), statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_repeated_range_is_served_from_cache(client, user_id, cached):
+    seed(client, user_id)
+    first = client.get('/getExpense', json=rangePayload(user_id))
+    hits = cacheHits.value()
+    second, statements = statementsOf(client, '/getExpense', json=rangePayload(user_id))
+    assert second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert cacheHits.value() == hits+1
+    assert not [statement for statement in statements if 'transactions' in statement or 'rollups' in statement]
+
+
+def test_write_invalidates_the_users_entries(client, user_id, cached):
+    seed(client, user_id)
+    before = float(client.get('/getExpense', json=rangePayload(user_id)).get_json()['total_expense'])
+    client.post('/addExpense', json={'user': user_id, 'amount': 7, 'currency': 'USD', 'date': '2024-01-10'})
+    misses = cacheMisses.value()
+    after = float(client.get('/getExpense', json=rangePayload(user_id)).get_json()['total_expense'])
+    assert after == before+7
+    assert cacheMisses.value() == misses+1
+
+
+def test_if_none_match_returns_304_until_a_write(client, user_id, cached):
+    seed(client, user_id)
+    response = client.get('/getAll', json=rangePayload(user_id))
+    etag = response.headers['ETag']
+    assert response.headers['Vary'].startswith('Accept')
+
+    again = client.get('/getAll', json=rangePayload(user_id), headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+
+    other = client.get('/getAll', json=rangePayload(user_id), headers={'If-None-Match': etag, 'Accept': 'application/vnd.columns+json'})
+    assert other.status_code == 200
+    assert other.headers['ETag'] != etag
+
+    client.post('/addIncome', json={'user': user_id, 'amount': 1, 'currency': 'USD', 'date': '2024-01-10'})
+    changed = client.get('/getAll', json=rangePayload(user_id), headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert len(changed.get_json()) == 7
+
+
+def test_streams_and_disabled_cache_bypass(client, user_id):
+    seed(client, user_id)
+    assert 'ETag' not in client.get('/getAll', json=rangePayload(user_id)).headers
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    try:
+        response = client.get('/getAll', json=rangePayload(user_id, stream='ndjson'))
+        assert 'ETag' not in response.headers
+    finally:
+        app.config['RESPONSE_CACHE_ENABLED'] = False
+
+
+def test_evicted_generation_never_revives_an_etag():
+    backend = LocalBackend(maxsize=1, ttl=60)
+    first, second = uuid.uuid4(), uuid.uuid4()
+    generation = backend.generation(first)
+    backend.generation(second)
+    assert backend.generation(first) != generation
+
+
+def test_304_needs_the_entry_itself(client, user_id, cached):
+    seed(client, user_id)
+    etag = client.get('/getExpense', json=rangePayload(user_id)).headers['ETag']
+    # Another process's write is invisible here; losing the entry must not leave a stale 304 behind.
+    responseCache.backend()._entries.clear()
+    again = client.get('/getExpense', json=rangePayload(user_id), headers={'If-None-Match': etag})
+    assert again.status_code == 200
+
+
+def test_generations_expire_with_the_entries():
+    backend = LocalBackend(maxsize=10, ttl=0)
+    user = uuid.uuid4()
+    assert backend.generation(user) != backend.generation(user)
+
+
+def test_rates_and_rollup_rebuilds_bump_every_users_entries(client, user_id, cached):
+    seed(client, user_id)
+    client.get('/getExpense', json=rangePayload(user_id))
+    for args in (['load-rates', 'fixtures/exchange_rates.csv'], ['rebuild-rollups']):
+        assert app.test_cli_runner().invoke(args=args).exit_code == 0
+        misses, served = cacheMisses.value(), notModified.value()
+        first = client.get('/getExpense', json=rangePayload(user_id))
+        assert cacheMisses.value() == misses+1
+        client.get('/getExpense', json=rangePayload(user_id), headers={'If-None-Match': first.headers['ETag']})
+        assert notModified.value() == served+1
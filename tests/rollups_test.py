@@ -0,0 +1,84 @@
+import random
+import uuid
+from datetime import date, datetime, timedelta
+from app import app, db
+from models import Expense, Income, DailyRollup, MonthlyRollup
+from money import storedAmount
+from queries import sumInRange
+from rollups import splitRange, totalInRange
+
+
+def test_split_range_whole_months_and_edges():
+    raw, days, months = splitRange(datetime(2024, 1, 15, 12), datetime(2024, 4, 10))
+    assert raw == [
+        (datetime(2024, 1, 15, 12), datetime(2024, 1, 15, 23, 59, 59, 999999)),
+        (datetime(2024, 4, 10), datetime(2024, 4, 10)),
+    ]
+    assert days == [(date(2024, 1, 16), date(2024, 1, 31)), (date(2024, 4, 1), date(2024, 4, 9))]
+    assert months == (date(2024, 2, 1), date(2024, 3, 1))
+
+
+def test_split_range_within_a_day_is_all_raw():
+    raw, days, months = splitRange(datetime(2024, 1, 1, 8), datetime(2024, 1, 1, 20))
+    assert raw == [(datetime(2024, 1, 1, 8), datetime(2024, 1, 1, 20))]
+    assert days == [] and months is None
+
+
+def test_split_range_whole_year():
+    raw, days, months = splitRange(datetime(2024, 1, 1), datetime(2024, 12, 31, 23, 59, 59, 999999))
+    assert raw == [] and days == []
+    assert months == (date(2024, 1, 1), date(2024, 12, 1))
+
+
+def randomRecords(count):
+    rng = random.Random(8)
+    start = datetime(2023, 11, 1)
+    return [{
+        'amount': rng.randint(1, 10000)/100,
+        'currency': rng.choice(['USD', 'EUR']),
+        'date': (start+timedelta(minutes=rng.randint(0, 60*24*200))).isoformat()
+    } for _ in range(count)]
+
+
+def test_rollup_totals_match_raw_sums(client, user_id):
+    response = client.post('/addExpenses', json={'user': user_id, 'records': randomRecords(400)})
+    assert response.status_code == 201
+    client.post('/addIncome', json={'user': user_id, 'amount': 7, 'currency': 'USD', 'date': '2024-01-01'})
+
+    rng = random.Random(3)
+    with app.app_context():
+        for _ in range(40):
+            start = datetime(2023, 10, 1)+timedelta(minutes=rng.randint(0, 60*24*250))
+            end = start+timedelta(minutes=rng.randint(0, 60*24*120))
+            for model in (Expense, Income):
+                assert totalInRange(model, uuid.UUID(user_id), start, end) == sumInRange(model, uuid.UUID(user_id), start, end)
+
+
+def test_get_expense_answers_from_rollups(client, user_id):
+    client.post('/addExpenses', json={'user': user_id, 'records': [
+        {'amount': 10, 'currency': 'USD', 'date': '2024-01-01'},
+        {'amount': 15.5, 'currency': 'USD', 'date': '2024-02-10T10:00:00'},
+        {'amount': 4.5, 'currency': 'EUR', 'date': '2024-02-10T11:00:00'},
+    ]})
+    response = client.get('/getExpense', json={'user_id': user_id, 'start_date': '2024-01-01', 'end_date': '2024-12-31'})
+    assert float(response.get_json()['total_expense']) == 30
+
+    with app.app_context():
+        day = db.session.get(DailyRollup, (uuid.UUID(user_id), 'expense', 'USD', date(2024, 2, 10)))
+        assert (day.total, day.count) == (storedAmount('15.5', 'USD'), 1)
+
+
+def test_rebuild_rollups_matches_incremental(client, user_id):
+    client.post('/addExpenses', json={'user': user_id, 'records': randomRecords(100)})
+
+    def snapshot():
+        with app.app_context():
+            return (
+                sorted((r.type, r.currency, r.day, r.total, r.count) for r in DailyRollup.query),
+                sorted((r.type, r.currency, r.month, r.total, r.count) for r in MonthlyRollup.query),
+            )
+
+    incremental = snapshot()
+    result = app.test_cli_runner().invoke(args=['rebuild-rollups', '--user', user_id])
+    assert 'Rollups rebuilt' in result.output
+    assert snapshot() == incremental
@@ -0,0 +1,78 @@
+import time
+import uuid
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, insert
+from app import app, db
+from models import Currency, Transaction, User
+from money import storedAmount
+from responseCache import cacheHits, responseCache
+
+
+@pytest.fixture
+def replica(client, user_id, tmp_path):
+    """A SQLite stand-in replica holding one 999 USD expense the primary does not have."""
+    engine = create_engine(f'sqlite:///{tmp_path}/replica.db')
+    with app.app_context():
+        db.metadata.create_all(engine)
+        db.engines['replica0'] = engine
+        amount = storedAmount(999, 'USD')
+    with engine.begin() as connection:
+        connection.execute(insert(User.__table__), {'id': uuid.UUID(user_id), 'name': 'testuser', 'hashText': 'x'})
+        connection.execute(insert(Currency.__table__), {'currency': 'USD'})
+        connection.execute(insert(Transaction.__table__), {
+            'id': uuid.uuid4(), 'user_id': uuid.UUID(user_id), 'type': 'expense',
+            'amount': amount, 'currency': 'USD', 'date': datetime(2024, 1, 1)
+        })
+    yield engine
+    with app.app_context():
+        del db.engines['replica0']
+    engine.dispose()
+
+
+def rangePayload(user_id):
+    return {'user_id': user_id, 'start_date': '2023-12-01', 'end_date': '2024-02-01'}
+
+
+def test_reads_go_to_replica(client, user_id, replica):
+    response = client.get('/getAll', json=rangePayload(user_id))
+    assert [float(row['amount']) for row in response.get_json()] == [999]
+
+
+def test_recent_writer_reads_from_primary(client, user_id, replica):
+    client.post('/addExpense', json={'user': user_id, 'amount': 5, 'currency': 'USD', 'date': '2024-01-02'})
+    response = client.get('/getAll', json=rangePayload(user_id))
+    assert [float(row['amount']) for row in response.get_json()] == [5]
+
+    with client.session_transaction() as session:
+        session['last_write'] = time.time()-app.config['READ_YOUR_WRITES_SECONDS']-1
+    response = client.get('/getAll', json=rangePayload(user_id))
+    assert [float(row['amount']) for row in response.get_json()] == [999]
+
+
+def test_writes_never_go_to_replica(client, user_id, replica):
+    response = client.post('/addExpense', json={'user': user_id, 'amount': 5, 'currency': 'USD', 'date': '2024-01-02'})
+    assert response.status_code == 201
+    with app.app_context():
+        amount = storedAmount(999, 'USD')
+    with replica.connect() as connection:
+        assert connection.execute(Transaction.__table__.select()).all()[0].amount == amount
+        assert len(connection.execute(Transaction.__table__.select()).all()) == 1
+
+
+def test_replica_reads_right_after_a_write_are_not_cached(client, user_id, replica, monkeypatch):
+    monkeypatch.setitem(app.config, 'RESPONSE_CACHE_ENABLED', True)
+    responseCache.clear()
+    client.post('/addExpense', json={'user': user_id, 'amount': 5, 'currency': 'USD', 'date': '2024-01-02'})
+    with client.session_transaction() as session:
+        session['last_write'] = time.time()-app.config['READ_YOUR_WRITES_SECONDS']-1
+    hits = cacheHits.value()
+    for _ in range(2):
+        assert [float(row['amount']) for row in client.get('/getAll', json=rangePayload(user_id)).get_json()] == [999]
+    assert cacheHits.value() == hits
+
+    monkeypatch.setitem(app.config, 'READ_YOUR_WRITES_SECONDS', 0)
+    for _ in range(2):
+        client.get('/getAll', json=rangePayload(user_id))
+    assert cacheHits.value() == hits+1
+    responseCache.clear()
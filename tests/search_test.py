@@ -0,0 +1,90 @@
+from app import app, db
+from models import Transaction
+from listing_test import addRecords
+from sqlalchemy.dialects import postgresql
+from search import postgresqlMatch, searchTerms
+
+
+def seedDescriptions(client, user_id):
+    addRecords(client, '/addExpenses', user_id, [
+        {'amount': 4, 'currency': 'USD', 'date': '2024-01-03', 'description': 'Coffee'},
+        {'amount': 5, 'currency': 'USD', 'date': '2024-01-10', 'description': 'Coffee and cake at the corner coffee shop'},
+        {'amount': 3, 'currency': 'EUR', 'date': '2024-02-01', 'description': 'Airport coffee'},
+        {'amount': 60, 'currency': 'USD', 'date': '2024-01-05', 'description': 'Groceries'},
+        {'amount': 9, 'currency': 'USD', 'date': '2024-01-06'},
+    ])
+    addRecords(client, '/addIncomes', user_id, [
+        {'amount': 20, 'currency': 'USD', 'date': '2024-01-07', 'description': 'Coffee machine sold'},
+    ])
+
+
+def search(client, user_id, **extra):
+    response = client.get('/search', json=dict({'user_id': user_id}, **extra))
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_terms_are_plain_words():
+    assert searchTerms('  Coffee* "shop" OR -x:1 ') == ['coffee', 'shop', 'or', 'x', '1']
+
+
+def test_postgresql_scores_are_double_precision(client):
+    # The score round-trips through the cursor as a float8; a float4 ts_rank would never equal it again.
+    with app.app_context():
+        _, score = postgresqlMatch(db.session.query(Transaction.id), ['coffee'])
+    assert str(score.compile(dialect=postgresql.dialect())).startswith('CAST(ts_rank(')
+    assert score.type.precision == 53
+
+
+def test_prefix_matches_ranked_with_filters(client, user_id):
+    seedDescriptions(client, user_id)
+    data = search(client, user_id, query='coff')
+    assert len(data['items']) == 4 and data['next_cursor'] is None
+    scores = [item['score'] for item in data['items']]
+    assert scores == sorted(scores, reverse=True)
+
+    both = search(client, user_id, query='coffee shop')
+    assert [item['description'] for item in both['items']] == ['Coffee and cake at the corner coffee shop']
+
+    january = search(client, user_id, query='coffee', type='expense', start_date='2024-01-01', end_date='2024-01-31')
+    assert sorted(item['description'] for item in january['items']) == ['Coffee', 'Coffee and cake at the corner coffee shop']
+    assert search(client, user_id, query='tea')['items'] == []
+
+
+def test_keyset_pages_cover_results_once(client, user_id):
+    seedDescriptions(client, user_id)
+    everything = search(client, user_id, query='coffee')['items']
+    pages, cursor = [], None
+    while True:
+        payload = {'query': 'coffee', 'limit': 1}
+        if cursor is not None:
+            payload['cursor'] = cursor
+        data = search(client, user_id, **payload)
+        pages.extend(data['items'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+    assert pages == everything
+
+
+def test_only_the_users_own_rows_and_updates_reindex(client, user_id):
+    seedDescriptions(client, user_id)
+    client.post('/register', json={'username': 'other', 'plaintext': 'otherpassword'})
+    client.get('/login', json={'username': 'other', 'password': 'otherpassword'})
+    other = client.get('/currentUser').get_json()['id']
+    assert search(client, other, query='coffee')['items'] == []
+
+    with app.app_context():
+        db.session.query(Transaction).filter(Transaction.description == 'Groceries').update({'description': 'Bakery'})
+        db.session.commit()
+    client.get('/login', json={'username': 'testuser', 'password': 'testpassword'})
+    assert search(client, user_id, query='groceries')['items'] == []
+    assert [float(item['amount']) for item in search(client, user_id, query='bakery')['items']] == [60]
+
+
+def test_rejects_bad_arguments(client, user_id):
+    assert client.get('/search', json={'user_id': user_id}).status_code == 400
+    assert client.get('/search', json={'user_id': user_id, 'query': '***'}).status_code == 400
+    assert client.get('/search', json={'user_id': user_id, 'query': 'x', 'type': 'gift'}).status_code == 400
+    assert client.get('/search', json={'user_id': user_id, 'query': 'x', 'start_date': 'soon'}).status_code == 400
+    assert client.get('/search', json={'user_id': user_id, 'query': 'x', 'cursor': 'bogus'}).status_code == 400
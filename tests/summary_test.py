@@ -0,0 +1,51 @@
+import uuid
+from datetime import datetime
+from app import app, db
+from models import Expense, Income, Investment
+from money import storedAmount
+
+
+def addTransactions(user_id, *rows):
+    with app.app_context():
+        for model, amount, currency, date in rows:
+            db.session.add(model(user_id=uuid.UUID(user_id), amount=storedAmount(amount, currency), currency=currency, date=datetime.fromisoformat(date)))
+        db.session.commit()
+
+
+def test_summary_totals_and_net_balance(client, user_id):
+    addTransactions(
+        user_id,
+        (Income, 1000, 'USD', '2024-01-05'),
+        (Expense, 200, 'USD', '2024-01-06'),
+        (Expense, 50, 'EUR', '2024-01-07'),
+        (Investment, 300, 'USD', '2024-01-08'),
+        (Expense, 999, 'USD', '2024-02-01'),
+    )
+
+    response = client.get('/summary', json={
+        'user_id': user_id,
+        'start_date': '2024-01-01',
+        'end_date': '2024-01-31'
+    })
+    data = response.get_json()
+    assert response.status_code == 200
+    assert float(data['total_expense']) == 250
+    assert float(data['total_income']) == 1000
+    assert float(data['total_investment']) == 300
+    assert float(data['net_balance']) == 450
+    assert float(data['by_currency']['USD']['net_balance']) == 500
+    assert {key: float(value) for key, value in data['by_currency']['EUR'].items()} == {
+        'total_expense': 50,
+        'total_income': 0,
+        'total_investment': 0,
+        'net_balance': -50
+    }
+
+
+def test_summary_reuses_range_validation(client, user_id):
+    response = client.get('/summary', json={'user_id': user_id, 'start_date': '2024-01-01'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Start date and end date are required.'
+
+    response = client.get('/summary', json={'start_date': '2024-01-01', 'end_date': '2024-01-31'})
+    assert response.status_code == 404
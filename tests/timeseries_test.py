@@ -0,0 +1,66 @@
+from datetime import date, datetime
+import numpy as np
+from listing_test import addRecords, seed, rangePayload
+from timeseries import bucketCount, buckets, movingAverage
+
+
+def series(data, transactionType, currency):
+    return next(entry for entry in data['series'] if (entry['type'], entry['currency']) == (transactionType, currency))
+
+
+def test_buckets_cover_the_range():
+    start, end = datetime(2024, 1, 31, 12), datetime(2024, 3, 1)
+    assert buckets('month', start, end) == [date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)]
+    assert buckets('week', start, end)[0] == date(2024, 1, 29)
+    for granularity in ('day', 'week', 'month', 'year'):
+        assert bucketCount(granularity, start, end) == len(buckets(granularity, start, end))
+
+
+def test_moving_average_uses_trailing_window():
+    averages = movingAverage(np.array([[2.0, 4.0, 6.0, 8.0]]), 2)
+    assert averages.tolist() == [[2.0, 3.0, 5.0, 7.0]]
+
+
+def test_daily_totals_per_type_and_currency(client, user_id):
+    seed(client, user_id)
+    data = client.get('/timeseries', json=rangePayload(user_id, end_date='2024-01-05T23:59:59', granularity='day')).get_json()
+    assert data['buckets'] == ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05']
+    assert series(data, 'expense', 'USD')['totals'] == [0, 0, 20, 0, 0]
+    assert series(data, 'expense', 'USD')['counts'] == [0, 0, 2, 0, 0]
+    assert series(data, 'expense', 'EUR')['totals'] == [5, 0, 0, 0, 0]
+    assert series(data, 'income', 'USD')['totals'] == [0, 100, 0, 0, 100]
+    assert 'running_balance' not in data
+
+
+def test_monthly_running_balance_and_moving_average(client, user_id):
+    seed(client, user_id)
+    addRecords(client, '/addExpenses', user_id, [
+        {'amount': 30, 'currency': 'USD', 'date': '2024-02-10'},
+        {'amount': 12.5, 'currency': 'USD', 'date': '2024-03-31T10:00:00'},
+    ])
+    payload = rangePayload(user_id, end_date='2024-03-31T12:00:00', moving_average=2, running_balance=True)
+    data = client.get('/timeseries', json=payload).get_json()
+    assert data['granularity'] == 'month'
+    assert data['buckets'] == ['2024-01-01', '2024-02-01', '2024-03-01']
+    expenses = series(data, 'expense', 'USD')
+    assert expenses['totals'] == [20, 30, 12.5]
+    assert expenses['moving_average'] == [20, 25, 21.25]
+    assert data['running_balance'] == {'EUR': [-5, -5, -5], 'USD': [130, 100, 87.5]}
+
+
+def test_weeks_and_years_group_in_sql(client, user_id):
+    seed(client, user_id)
+    weeks = client.get('/timeseries', json=rangePayload(user_id, granularity='week')).get_json()
+    assert weeks['buckets'][0] == '2024-01-01'
+    assert series(weeks, 'income', 'USD')['totals'][0] == 200
+    years = client.get('/timeseries', json=rangePayload(user_id, start_date='2023-06-01', granularity='year')).get_json()
+    assert years['buckets'] == ['2023-01-01', '2024-01-01']
+    assert series(years, 'investment', 'USD')['totals'] == [0, 50]
+
+
+def test_rejects_bad_arguments(client, user_id):
+    assert client.get('/timeseries', json=rangePayload(user_id, granularity='hour')).status_code == 400
+    assert client.get('/timeseries', json=rangePayload(user_id, moving_average=0)).status_code == 400
+    assert client.get('/timeseries', json=rangePayload(user_id, running_balance='yes')).status_code == 400
+    tooLong = rangePayload(user_id, start_date='1900-01-01', granularity='day')
+    assert client.get('/timeseries', json=tooLong).status_code == 400
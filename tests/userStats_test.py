@@ -0,0 +1,86 @@
+import json
+import random
+import uuid
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import create_engine, insert
+from app import app, db
+from models import MonthlyRollup, MINOR_UNITS
+from listing_test import addRecords, seed
+from userStats import LogSketch, SKETCH_ACCURACY, collect, shardBounds
+
+
+def test_sketch_quantiles_within_accuracy_and_merge():
+    rng = random.Random(3)
+    values = [rng.lognormvariate(4, 2) for _ in range(5000)]
+    whole, left, right = LogSketch(), LogSketch(), LogSketch()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (left if index % 2 else right).add(value)
+    left.merge(right)
+    ordered = sorted(values)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        exact = ordered[int(q*(len(values)-1))]
+        assert abs(whole.quantile(q)-exact) <= exact*SKETCH_ACCURACY*1.01
+        assert left.quantile(q) == whole.quantile(q)
+
+
+def test_shards_partition_the_uuid_space():
+    bounds = shardBounds(7)
+    assert bounds[0][0] == uuid.UUID(int=0) and bounds[-1][1] is None
+    for _ in range(100):
+        user_id = uuid.uuid4()
+        assert sum(lower <= user_id and (upper is None or user_id < upper) for lower, upper in bounds) == 1
+
+
+def test_cli_reports_per_user_totals(client, user_id):
+    seed(client, user_id)
+    client.post('/register', json={'username': 'other', 'plaintext': 'otherpassword'})
+    client.get('/login', json={'username': 'other', 'password': 'otherpassword'})
+    other = client.get('/currentUser').get_json()['id']
+    addRecords(client, '/addExpenses', other, [
+        {'amount': 40, 'currency': 'USD', 'date': '2024-01-10'},
+        {'amount': 60, 'currency': 'USD', 'date': '2024-02-10'},
+    ])
+
+    result = app.test_cli_runner().invoke(args=['user-stats', '--workers', '1', '--shards', '3', '--percentile', '0', '--percentile', '100'])
+    assert result.exit_code == 0, result.output
+    stats = {(row['type'], row['currency']): row for row in json.loads(result.output)}
+    expenses = stats[('expense', 'USD')]
+    assert (expenses['users'], expenses['transactions'], expenses['total']) == (2, 4, 120)
+    assert expenses['mean_per_user'] == 60 and expenses['mean_per_transaction'] == 30
+    assert expenses['percentiles'] == {'p0': 20, 'p100': 100}
+    assert sum(entry['users'] for entry in expenses['distribution']) == 2
+    assert stats[('income', 'USD')]['users'] == 1
+
+    january = app.test_cli_runner().invoke(args=['user-stats', '--workers', '1', '--start', '2024-01-02', '--end', '2024-01-31'])
+    stats = {(row['type'], row['currency']): row for row in json.loads(january.output)}
+    assert stats[('expense', 'USD')]['total'] == 60
+    assert ('expense', 'EUR') not in stats
+
+
+def test_in_memory_database_refuses_workers(client):
+    result = app.test_cli_runner().invoke(args=['user-stats', '--workers', '2'])
+    assert result.exit_code != 0
+
+
+def test_worker_processes_match_a_single_pass(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path/'stats.sqlite'}")
+    db.metadata.create_all(engine, tables=[MonthlyRollup.__table__])
+    rng = random.Random(5)
+    rows = [{
+        'user_id': uuid.UUID(int=rng.getrandbits(128), version=4), 'type': rng.choice(['expense', 'income']),
+        'currency': 'USD', 'month': date(2024, month, 1), 'count': 3,
+        'total': rng.randint(100, 100000) if MINOR_UNITS else Decimal(rng.randint(100, 100000))/100,
+    } for _ in range(300) for month in (1, 2)]
+    with engine.begin() as connection:
+        connection.execute(insert(MonthlyRollup.__table__).prefix_with('OR IGNORE'), rows)
+
+    single = collect(engine, workers=1, shards=1)
+    pooled = collect(engine, workers=2, shards=5)
+    assert sorted(single) == sorted(pooled)
+    for key, partial in single.items():
+        other = pooled[key]
+        assert (other.users, other.transactions, other.total) == (partial.users, partial.transactions, partial.total)
+        assert other.sketch.quantile(0.5) == partial.sketch.quantile(0.5)
+    engine.dispose()
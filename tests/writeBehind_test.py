@@ -0,0 +1,84 @@
+import pytest
+import writeBehind
+from app import app
+from models import Expense, Income, DailyRollup
+from money import storedAmount
+from writeBehind import WriteBehindJournal, flushPending
+
+
+@pytest.fixture
+def journal_path(client, tmp_path):
+    path = str(tmp_path / 'journal.sqlite')
+    app.config['WRITE_BEHIND_ENABLED'] = True
+    app.config['WRITE_BEHIND_PATH'] = path
+    writeBehind._journal = None
+    yield path
+    app.config['WRITE_BEHIND_ENABLED'] = False
+    app.config['WRITE_BEHIND_MAX_PENDING'] = 100000
+    if writeBehind._journal is not None:
+        writeBehind._journal.close()
+        writeBehind._journal = None
+
+
+def test_add_is_queued_until_flushed(client, user_id, journal_path):
+    response = client.post('/addExpense', json={
+        'user': user_id, 'amount': 12.5, 'currency': 'USD', 'date': '2024-03-01'
+    })
+    assert response.status_code == 202
+    assert response.get_json()['message'] == 'Expense queued'
+
+    response = client.post('/addIncomes', json={
+        'user': user_id,
+        'records': [
+            {'amount': 100, 'currency': 'EUR', 'date': '2024-03-02'},
+            {'amount': 1, 'currency': 'XXX', 'date': '2024-03-02'},
+        ]
+    })
+    data = response.get_json()
+    assert response.status_code == 207
+    assert data['queued'] == 1
+    assert [result['status'] for result in data['results']] == ['queued', 'error']
+
+    with app.app_context():
+        assert Expense.query.count() == 0
+        assert flushPending() == 2
+        assert Expense.query.one().amount == storedAmount('12.5', 'USD')
+        assert Income.query.one().id.hex == data['results'][0]['id'].replace('-', '')
+        assert DailyRollup.query.count() == 2
+        assert flushPending() == 0
+
+
+def test_replay_skips_rows_already_flushed(client, user_id, journal_path):
+    client.post('/addExpenses', json={
+        'user': user_id,
+        'records': [{'amount': 5, 'currency': 'USD', 'date': '2024-03-01'}] * 3
+    })
+    with app.app_context():
+        pending = writeBehind.journal().peek(100)
+        assert flushPending() == 3
+
+    # A crash between commit and journal delete leaves the entry behind.
+    replayed = WriteBehindJournal(journal_path)
+    for _, transactionType, rows in pending:
+        replayed.append(transactionType, rows, 100)
+    writeBehind._journal.close()
+    writeBehind._journal = replayed
+
+    with app.app_context():
+        assert flushPending() == 0
+        assert Expense.query.count() == 3
+        assert replayed.stats()[0] == 0
+
+
+def test_full_journal_rejects_writes(client, user_id, journal_path):
+    app.config['WRITE_BEHIND_MAX_PENDING'] = 2
+    records = [{'amount': 5, 'currency': 'USD', 'date': '2024-03-01'}] * 2
+    assert client.post('/addExpenses', json={'user': user_id, 'records': records}).status_code == 202
+
+    response = client.post('/addExpense', json={
+        'user': user_id, 'amount': 1, 'currency': 'USD', 'date': '2024-03-01'
+    })
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    with app.app_context():
+        assert writeBehind.journal().stats()[0] == 2
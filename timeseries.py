@@ -0,0 +1,108 @@
+from datetime import datetime, time, timedelta
+import numpy as np
+from money import unitScale
+from rollups import firstOfNextMonth
+
+# Chart series for /timeseries. rollups.bucketTotals groups the range per
+# period in SQL and recurring.recurringBucketTotals counts the occurrences of
+# recurring rules per period; here the rows are laid out as one dense array per type and
+# currency, with zero for empty periods, so running balances and moving
+# averages come out of whole-array cumulative sums instead of per-row loops.
+# Values are floats in currency units, rounded to 4 places like exports.
+
+TYPE_SIGNS = {'income': 1, 'expense': -1, 'investment': -1}
+DECIMALS = 4
+
+def bucketStart(granularity, day):
+    if granularity == 'week':
+        return day-timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+def nextBucket(granularity, start):
+    if granularity == 'day':
+        return start+timedelta(days=1)
+    if granularity == 'week':
+        return start+timedelta(days=7)
+    if granularity == 'month':
+        return firstOfNextMonth(start)
+    return start.replace(year=start.year+1)
+
+def bucketCount(granularity, start_date, end_date):
+    """Number of periods the range touches, without listing them."""
+    first = bucketStart(granularity, start_date.date())
+    last = bucketStart(granularity, end_date.date())
+    if granularity == 'day':
+        return (last-first).days+1
+    if granularity == 'week':
+        return (last-first).days//7+1
+    if granularity == 'month':
+        return (last.year-first.year)*12+last.month-first.month+1
+    return last.year-first.year+1
+
+def buckets(granularity, start_date, end_date):
+    """First days of every period the range touches, in order."""
+    starts = []
+    current = bucketStart(granularity, start_date.date())
+    while current <= end_date.date():
+        starts.append(current)
+        current = nextBucket(granularity, current)
+    return starts
+
+def bucketRanges(granularity, start_date, end_date):
+    """(first day, low, high) of every period the range touches, low and high inclusive and clipped to the range."""
+    starts = buckets(granularity, start_date, end_date)
+    ranges = []
+    for index, start in enumerate(starts):
+        low = max(start_date, datetime.combine(start, time.min))
+        high = end_date if index == len(starts)-1 else min(end_date, datetime.combine(starts[index+1], time.min)-timedelta(microseconds=1))
+        ranges.append((start, low, high))
+    return ranges
+
+def movingAverage(values, window):
+    """Trailing mean over window periods along the last axis; the first periods average what they have."""
+    sums = np.concatenate([np.zeros(values.shape[:-1]+(1,)), np.cumsum(values, axis=-1)], axis=-1)
+    ends = np.arange(1, values.shape[-1]+1)
+    starts = np.maximum(ends-window, 0)
+    return (sums[..., ends]-sums[..., starts])/(ends-starts)
+
+def buildSeries(rows, starts, window=None, runningBalance=False):
+    """Response body parts for (type, currency, bucket, total, count) rows laid out over starts."""
+    keys = sorted({(row[0], row[1]) for row in rows})
+    position = {start: index for index, start in enumerate(starts)}
+    totals = np.zeros((len(keys), len(starts)))
+    counts = np.zeros((len(keys), len(starts)), dtype=np.int64)
+    if rows:
+        keyIndex = {key: index for index, key in enumerate(keys)}
+        rowKeys = np.array([keyIndex[(row[0], row[1])] for row in rows])
+        rowBuckets = np.array([position[row[2]] for row in rows])
+        np.add.at(totals, (rowKeys, rowBuckets), [float(row[3])/unitScale(row[1]) for row in rows])
+        np.add.at(counts, (rowKeys, rowBuckets), [int(row[4]) for row in rows])
+
+    series = []
+    averages = movingAverage(totals, window) if window is not None else None
+    for index, (transactionType, currency) in enumerate(keys):
+        entry = {
+            'type':transactionType,
+            'currency':currency,
+            'totals':np.round(totals[index], DECIMALS).tolist(),
+            'counts':counts[index].tolist(),
+        }
+        if averages is not None:
+            entry['moving_average'] = np.round(averages[index], DECIMALS).tolist()
+        series.append(entry)
+    body = {'buckets':[start.isoformat() for start in starts],'series':series}
+
+    if runningBalance:
+        currencies = sorted({currency for _, currency in keys})
+        currencyIndex = np.array([currencies.index(currency) for _, currency in keys], dtype=np.int64)
+        signs = np.array([TYPE_SIGNS.get(transactionType, 0) for transactionType, _ in keys], dtype=np.float64)
+        net = np.zeros((len(currencies), len(starts)))
+        if keys:
+            np.add.at(net, currencyIndex, signs[:, None]*totals)
+        balances = np.round(np.cumsum(net, axis=1), DECIMALS)
+        body['running_balance'] = {currency: balances[index].tolist() for index, currency in enumerate(currencies)}
+    return body
@@ -0,0 +1,249 @@
+import math
+import multiprocessing
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import create_engine, select, union_all
+from sqlalchemy.pool import NullPool
+from models import DailyRollup, MonthlyRollup
+from money import sumOf
+from rollups import splitRange
+
+# Cross-user spending statistics for internal reporting: per type and
+# currency, how many users spent anything, the sum and means, percentiles and
+# a distribution of per-user totals.
+#
+# The UUID space is cut into contiguous user_id ranges (shards). Each shard
+# is aggregated on its own: the database sums the rollups per user within the
+# shard, the rows come back through a streaming cursor, and every user's
+# total is folded into a Partial per type and currency. Partials only hold
+# sums, counts, extremes and a LogSketch, so merging shards is addition and
+# shards can run in any order in a process pool. Every worker process opens
+# its own engine; nothing is shared with the parent but the URL.
+#
+# Totals stay in stored units (NUMERIC or minor units) until the report,
+# where they are scaled to currency units. The sketch's relative error does
+# not change under that scaling.
+
+SKETCH_ACCURACY = 0.01
+DECIMALS = 4
+
+class LogSketch:
+    """Mergeable quantile sketch with logarithmic buckets (as in DDSketch).
+
+    Every value lands in the bucket ceil(log_gamma(|value|)), so quantiles
+    come back within SKETCH_ACCURACY of a true value whatever the spread of
+    the data, and two sketches merge by adding their bucket counts.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.gamma = (1+accuracy)/(1-accuracy)
+        self._logGamma = math.log(self.gamma)
+        self.positive = defaultdict(int)
+        self.negative = defaultdict(int)
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value > 0:
+            self.positive[math.ceil(math.log(value)/self._logGamma)] += 1
+        elif value < 0:
+            self.negative[math.ceil(math.log(-value)/self._logGamma)] += 1
+        else:
+            self.zeros += 1
+
+    def merge(self, other):
+        for index, count in other.positive.items():
+            self.positive[index] += count
+        for index, count in other.negative.items():
+            self.negative[index] += count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def bucketValue(self, index):
+        return 2*self.gamma**index/(self.gamma+1)
+
+    def buckets(self):
+        """(representative value, count) of every non-empty bucket in ascending order."""
+        for index in sorted(self.negative, reverse=True):
+            yield -self.bucketValue(index), self.negative[index]
+        if self.zeros:
+            yield 0.0, self.zeros
+        for index in sorted(self.positive):
+            yield self.bucketValue(index), self.positive[index]
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q*(self.count-1)
+        seen = 0
+        for value, count in self.buckets():
+            seen += count
+            if seen > rank:
+                return value
+        return value
+
+class Partial:
+    """Mergeable statistics of per-user totals of one type and currency."""
+
+    def __init__(self):
+        self.users = 0
+        self.transactions = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.sketch = LogSketch()
+
+    def add(self, total, count):
+        self.users += 1
+        self.transactions += count
+        self.total += total
+        self.minimum = total if self.minimum is None else min(self.minimum, total)
+        self.maximum = total if self.maximum is None else max(self.maximum, total)
+        self.sketch.add(float(total))
+
+    def merge(self, other):
+        self.users += other.users
+        self.transactions += other.transactions
+        self.total += other.total
+        for bound in (other.minimum, other.maximum):
+            if bound is not None:
+                self.minimum = bound if self.minimum is None else min(self.minimum, bound)
+                self.maximum = bound if self.maximum is None else max(self.maximum, bound)
+        self.sketch.merge(other.sketch)
+
+    def quantile(self, q):
+        """Sketch estimate kept within the exact extremes, which p0 and p100 return as they are."""
+        if q <= 0:
+            return float(self.minimum)
+        if q >= 1:
+            return float(self.maximum)
+        return min(max(self.sketch.quantile(q), float(self.minimum)), float(self.maximum))
+
+def shardBounds(shards):
+    """(lower, upper) user_id bounds splitting the UUID space into shards ranges; upper is None for the last."""
+    step = (1 << 128)//shards
+    lowers = [uuid.UUID(int=index*step) for index in range(shards)]
+    return list(zip(lowers, lowers[1:]+[None]))
+
+def userTotalsQuery(lower, upper, start, end):
+    """(user_id, type, currency, total, count) per user of the shard, over whole days start..end (dates or None)."""
+    def source(table, criteria):
+        criteria = [table.user_id >= lower, *criteria]
+        if upper is not None:
+            criteria.append(table.user_id < upper)
+        return select(
+            table.user_id, table.type, table.currency, sumOf(table.total).label('total'), sumOf(table.count).label('count')
+        ).where(*criteria).group_by(table.user_id, table.type, table.currency)
+
+    if start is None and end is None:
+        return source(MonthlyRollup, [])
+    # An open end stops a day short of date.max so splitRange can step past it.
+    first = datetime.combine(start or date.min, time.min)
+    last = datetime.combine(end or date.max-timedelta(days=1), time.max)
+    _, days, months = splitRange(first, last)
+    selects = [source(DailyRollup, [DailyRollup.day.between(low, high)]) for low, high in days]
+    if months:
+        selects.append(source(MonthlyRollup, [MonthlyRollup.month.between(*months)]))
+    if not selects:
+        return None
+    if len(selects) == 1:
+        return selects[0]
+    totals = union_all(*selects).subquery()
+    return select(
+        totals.c.user_id, totals.c.type, totals.c.currency, sumOf(totals.c.total), sumOf(totals.c['count'])
+    ).group_by(totals.c.user_id, totals.c.type, totals.c.currency)
+
+def aggregateShard(connection, lower, upper, start, end, batchSize):
+    """{(type, currency): Partial} of one shard, read through a streaming cursor."""
+    partials = defaultdict(Partial)
+    query = userTotalsQuery(lower, upper, start, end)
+    if query is None:
+        return {}
+    result = connection.execution_options(stream_results=True, yield_per=batchSize).execute(query)
+    for batch in result.partitions():
+        for _, transactionType, currency, total, count in batch:
+            partials[(transactionType, currency)].add(total, count)
+    return dict(partials)
+
+def shardWorker(url, lower, upper, start, end, batchSize):
+    """aggregateShard on an engine of this process' own."""
+    engine = create_engine(url, poolclass=NullPool)
+    try:
+        with engine.connect() as connection:
+            return aggregateShard(connection, lower, upper, start, end, batchSize)
+    finally:
+        engine.dispose()
+
+def mergePartials(into, partials):
+    for key, partial in partials.items():
+        if key in into:
+            into[key].merge(partial)
+        else:
+            into[key] = partial
+    return into
+
+def collect(engine, start=None, end=None, workers=1, shards=None, batchSize=10000):
+    """Merged {(type, currency): Partial} of all users.
+
+    With one worker the shards run one after another on engine; otherwise
+    each shard goes to a process pool whose workers connect to engine's URL
+    themselves. Processes are spawned rather than forked so none inherits the
+    parent's pooled connections.
+    """
+    bounds = shardBounds(shards or workers*4)
+    merged = {}
+    if workers == 1:
+        with engine.connect() as connection:
+            for lower, upper in bounds:
+                mergePartials(merged, aggregateShard(connection, lower, upper, start, end, batchSize))
+        return merged
+    url = engine.url.render_as_string(hide_password=False)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(shardWorker, url, lower, upper, start, end, batchSize) for lower, upper in bounds]
+        for future in as_completed(futures):
+            mergePartials(merged, future.result())
+    return merged
+
+def distribution(sketch, scale):
+    """Users per power of ten of per-user totals, negative totals by magnitude."""
+    bins = defaultdict(int)
+    for value, count in sketch.buckets():
+        value /= scale
+        exponent = math.floor(math.log10(abs(value))) if value else None
+        bins[(value < 0, exponent)] += count
+    entries = []
+    for (negative, exponent), count in bins.items():
+        if exponent is None:
+            entries.append({'from':0,'to':0,'users':count})
+        elif negative:
+            entries.append({'from':-10.0**(exponent+1),'to':-10.0**exponent,'users':count})
+        else:
+            entries.append({'from':10.0**exponent,'to':10.0**(exponent+1),'users':count})
+    return sorted(entries, key=lambda entry: entry['from'])
+
+def report(partials, scales, percentiles):
+    """JSON ready statistics per type and currency; scales maps a currency to the divisor of its stored amounts."""
+    rows = []
+    for (transactionType, currency), partial in sorted(partials.items()):
+        scale = scales.get(currency, 1)
+        total = float(partial.total)/scale
+        rows.append({
+            'type':transactionType,
+            'currency':currency,
+            'users':partial.users,
+            'transactions':partial.transactions,
+            'total':round(total, DECIMALS),
+            'mean_per_user':round(total/partial.users, DECIMALS),
+            'mean_per_transaction':round(total/partial.transactions, DECIMALS) if partial.transactions else None,
+            'min':round(float(partial.minimum)/scale, DECIMALS),
+            'max':round(float(partial.maximum)/scale, DECIMALS),
+            'percentiles':{
+                f'p{percentile:g}':round(partial.quantile(percentile/100)/scale, DECIMALS)
+                for percentile in percentiles
+            },
+            'distribution':distribution(partial.sketch, scale),
+        })
+    return rows
@@ -0,0 +1,221 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from customExceptions import ValidationException
+from models import AmountType, MINOR_UNITS
+from money import parseMinorUnits
+from search import searchTerms
+
+# Smallest NUMERIC amount that no longer fits the amount column once rounded
+# to its scale (99999999.995 for NUMERIC(10, 2)); None with minor unit
+# storage, whose amounts are checked by parseMinorUnits.
+AMOUNT_LIMIT = None if MINOR_UNITS else Decimal(10)**(AmountType.precision-AmountType.scale)-Decimal(10)**-AmountType.scale/2
+
+def parseUserId(user_id):
+    """Coerce a user id from a payload or the session into a UUID; None if it is not one."""
+    if isinstance(user_id, uuid.UUID):
+        return user_id
+    try:
+        return uuid.UUID(str(user_id))
+    except ValueError:
+        return None
+
+def parseRangeArgs(data):
+    """Validate the (user_id, start_date, end_date) payload shared by the range endpoints."""
+    if data is None:
+        raise ValidationException('No data is provided')
+    user_id = parseUserId(data.get('user_id'))
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+
+    if user_id is None:
+        raise ValidationException('User not found', 404)
+
+    if start_date is None or end_date is None:
+        raise ValidationException('Start date and end date are required.')
+
+    try:
+        start_date = datetime.fromisoformat(start_date)
+        end_date = datetime.fromisoformat(end_date)
+    except ValueError:
+        raise ValidationException('Datetime format is wrong')
+    return user_id, start_date, end_date
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+
+def parseTimeseriesArgs(data):
+    """Validate the optional granularity, moving_average and running_balance of /timeseries."""
+    granularity = data.get('granularity', 'month')
+    window = data.get('moving_average')
+    runningBalance = data.get('running_balance', False)
+    if granularity not in GRANULARITIES:
+        raise ValidationException(f"Granularity must be one of {', '.join(GRANULARITIES)}")
+    if window is not None and (not isinstance(window, int) or isinstance(window, bool) or window < 1):
+        raise ValidationException('Moving average must be a positive number of periods')
+    if not isinstance(runningBalance, bool):
+        raise ValidationException('Running balance must be true or false')
+    return granularity, window, runningBalance
+
+def parseTransaction(data, noun, availableCurrencies, exponents=None):
+    """Validate one transaction record (everything but its user) into insertable column values.
+
+    noun names the transaction type in error messages and availableCurrencies
+    is the set of currency codes the record may use. With exponents, a
+    {code: exponent} mapping, the amount is returned as an integer of minor
+    units instead of a Decimal.
+    """
+    amount = data.get('amount')
+    currency = data.get('currency')
+    date = data.get('date')
+    description = data.get('description', '')
+
+    if amount is None:
+        amount = 0
+    if exponents is None:
+        try:
+            amount = Decimal(amount)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ValidationException('Invalid amount')
+        if not amount.is_finite() or (AMOUNT_LIMIT is not None and abs(amount) >= AMOUNT_LIMIT):
+            raise ValidationException('Invalid amount')
+    if currency is None:
+        raise ValidationException('Currency is required')
+    if currency not in availableCurrencies:
+        raise ValidationException('Selected currency not available', 500)
+    if exponents is not None:
+        try:
+            amount = parseMinorUnits(amount, exponents[currency])
+        except (TypeError, ValueError):
+            raise ValidationException('Invalid amount')
+    if date:
+        try:
+            date = datetime.fromisoformat(date)
+        except (TypeError, ValueError):
+            raise ValidationException('Invalid date format')
+    else:
+        raise ValidationException(f'Date of {noun} is required')
+
+    return {'amount':amount,'currency':currency,'date':date,'description':description}
+
+def encodeCursor(row):
+    """Opaque keyset cursor pointing just past row."""
+    return base64.urlsafe_b64encode(f'{row.date.isoformat()}|{row.id}'.encode()).decode()
+
+def decodeCursor(cursor):
+    try:
+        date, transaction_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(date), uuid.UUID(transaction_id)
+    except (AttributeError, TypeError, ValueError, binascii.Error):
+        raise ValidationException('Invalid cursor')
+
+def encodeSearchCursor(row):
+    """Opaque keyset cursor pointing just past a /search result row."""
+    return base64.urlsafe_b64encode(f'{row.score!r}|{row.date.isoformat()}|{row.id}'.encode()).decode()
+
+def decodeSearchCursor(cursor):
+    try:
+        score, date, transaction_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return float(score), datetime.fromisoformat(date), uuid.UUID(transaction_id)
+    except (AttributeError, TypeError, ValueError, binascii.Error):
+        raise ValidationException('Invalid cursor')
+
+def parsePageArgs(data, maxPageSize, decode=decodeCursor):
+    """Validate the optional limit and cursor of a paginated listing."""
+    limit = data.get('limit')
+    cursor = data.get('cursor')
+    if limit is not None:
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+            raise ValidationException('Limit must be a positive integer')
+        limit = min(limit, maxPageSize)
+    after = decode(cursor) if cursor is not None else None
+    return limit, after
+
+TRANSACTION_TYPES = ('expense', 'income', 'investment')
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+
+def parsePositiveInt(text, name):
+    if not text.isascii() or not text.isdigit() or int(text) < 1:
+        raise ValidationException(f'{name} must be a positive integer')
+    return int(text)
+
+def parseRecurrenceRule(text):
+    """Schedule columns of a RecurringRule from RRULE text such as 'FREQ=MONTHLY;INTERVAL=2;COUNT=6'.
+
+    FREQ, INTERVAL, COUNT and UNTIL (YYYYMMDD or YYYYMMDDTHHMMSS) are
+    supported; by-rules such as BYDAY are not, the start date fixes weekday
+    and day of month instead.
+    """
+    if not isinstance(text, str) or not text.strip():
+        raise ValidationException('Recurrence rule is required')
+    text = text.strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+    parts = {}
+    for part in text.split(';'):
+        key, separator, value = part.partition('=')
+        key = key.strip().upper()
+        if not separator or key in parts:
+            raise ValidationException('Invalid recurrence rule')
+        parts[key] = value.strip()
+    unsupported = set(parts)-{'FREQ', 'INTERVAL', 'COUNT', 'UNTIL'}
+    if unsupported:
+        raise ValidationException(f"Unsupported recurrence rule parts: {', '.join(sorted(unsupported))}")
+    frequency = parts.get('FREQ', '').upper()
+    if frequency not in FREQUENCIES:
+        raise ValidationException(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+    schedule = {'frequency':frequency.lower(),'interval':1,'count':None,'until':None}
+    if 'INTERVAL' in parts:
+        schedule['interval'] = parsePositiveInt(parts['INTERVAL'], 'INTERVAL')
+    if 'COUNT' in parts:
+        schedule['count'] = parsePositiveInt(parts['COUNT'], 'COUNT')
+    if 'UNTIL' in parts:
+        schedule['until'] = parseUntil(parts['UNTIL'])
+    return schedule
+
+def parseUntil(value):
+    for pattern in ('%Y%m%dT%H%M%S', '%Y%m%d'):
+        try:
+            until = datetime.strptime(value.rstrip('Zz'), pattern)
+        except ValueError:
+            continue
+        # A bare date ends the schedule after that whole day.
+        return until.replace(hour=23, minute=59, second=59, microsecond=999999) if pattern == '%Y%m%d' else until
+    raise ValidationException('UNTIL must be YYYYMMDD or YYYYMMDDTHHMMSS')
+
+def parseRecurring(data, availableCurrencies, exponents=None):
+    """Validate a recurring transaction: the fields of parseTransaction, with date as the first occurrence, plus type and rrule."""
+    transactionType = data.get('type')
+    if transactionType not in TRANSACTION_TYPES:
+        raise ValidationException(f"Type must be one of {', '.join(TRANSACTION_TYPES)}")
+    row = parseTransaction(data, transactionType, availableCurrencies, exponents)
+    row['start'] = row.pop('date')
+    row['type'] = transactionType
+    row.update(parseRecurrenceRule(data.get('rrule')))
+    if row['until'] is not None and row['until'] < row['start']:
+        raise ValidationException('UNTIL is before the first occurrence')
+    return row
+
+def parseSearchArgs(data):
+    """Validate the /search payload: user_id, query and the optional start_date, end_date and type filters."""
+    if data is None:
+        raise ValidationException('No data is provided')
+    user_id = parseUserId(data.get('user_id'))
+    if user_id is None:
+        raise ValidationException('User not found', 404)
+    text = data.get('query')
+    terms = searchTerms(text) if isinstance(text, str) else []
+    if not terms:
+        raise ValidationException('Query must contain at least one word')
+    dates = []
+    for key in ('start_date', 'end_date'):
+        value = data.get(key)
+        try:
+            dates.append(datetime.fromisoformat(value) if value is not None else None)
+        except (TypeError, ValueError):
+            raise ValidationException('Datetime format is wrong')
+    transactionType = data.get('type')
+    if transactionType is not None and transactionType not in TRANSACTION_TYPES:
+        raise ValidationException(f"Type must be one of {', '.join(TRANSACTION_TYPES)}")
+    return user_id, terms, dates[0], dates[1], transactionType
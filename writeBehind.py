@@ -0,0 +1,174 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from flask import current_app
+from customExceptions import WriteBehindFullException
+from ingest import insertTransactions
+from metrics import Counter, Gauge
+from models import db, Transaction
+
+# Optional write-behind mode for the add endpoints. Validated rows are
+# appended to a local SQLite journal and acknowledged with 202; a background
+# thread moves them into the main database in batched transactions and only
+# then deletes them from the journal. Rows get their ids when they are queued,
+# so entries replayed after a crash between commit and delete are recognised
+# and skipped.
+
+logger = logging.getLogger(__name__)
+
+pendingRows = Gauge('write_behind_pending_rows', 'Rows waiting in the write-behind journal')
+flushLag = Gauge('write_behind_flush_lag_seconds', 'Age of the oldest row waiting in the write-behind journal')
+flushedRows = Counter('write_behind_flushed_rows_total', 'Rows moved from the write-behind journal into the database')
+flushFailures = Counter('write_behind_flush_failures_total', 'Write-behind batches that failed and will be retried')
+
+def encodeRow(row):
+    return {
+        'id':str(row['id']),
+        'user_id':str(row['user_id']),
+        'amount':row['amount'] if isinstance(row['amount'], int) else str(row['amount']),
+        'currency':row['currency'],
+        'date':row['date'].isoformat(),
+        'description':row['description'],
+    }
+
+def decodeRow(row):
+    return {
+        'id':uuid.UUID(row['id']),
+        'user_id':uuid.UUID(row['user_id']),
+        'amount':row['amount'] if isinstance(row['amount'], int) else Decimal(row['amount']),
+        'currency':row['currency'],
+        'date':datetime.fromisoformat(row['date']),
+        'description':row['description'],
+    }
+
+class WriteBehindJournal:
+    """Durable FIFO of (transaction type, rows) entries in a SQLite file."""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=FULL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS pending ('
+                'seq INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, '
+                'rows TEXT NOT NULL, row_count INTEGER NOT NULL, enqueued_at REAL NOT NULL)'
+            )
+
+    def append(self, transactionType, rows, maxPending):
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                (pending,) = self._connection.execute('SELECT COALESCE(SUM(row_count), 0) FROM pending').fetchone()
+                if pending+len(rows) > maxPending:
+                    raise WriteBehindFullException()
+                self._connection.execute(
+                    'INSERT INTO pending (type, rows, row_count, enqueued_at) VALUES (?, ?, ?, ?)',
+                    (transactionType, json.dumps([encodeRow(row) for row in rows]), len(rows), time.time())
+                )
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+
+    def peek(self, maxRows):
+        """Oldest entries holding up to maxRows rows (always at least one entry)."""
+        with self._lock:
+            entries = []
+            total = 0
+            for seq, transactionType, rows, rowCount in self._connection.execute(
+                'SELECT seq, type, rows, row_count FROM pending ORDER BY seq'
+            ):
+                if entries and total+rowCount > maxRows:
+                    break
+                entries.append((seq, transactionType, [decodeRow(row) for row in json.loads(rows)]))
+                total += rowCount
+            return entries
+
+    def remove(self, seqs):
+        with self._lock:
+            self._connection.executemany('DELETE FROM pending WHERE seq = ?', [(seq,) for seq in seqs])
+
+    def stats(self):
+        """(pending rows, enqueue time of the oldest entry or None)."""
+        with self._lock:
+            return self._connection.execute('SELECT COALESCE(SUM(row_count), 0), MIN(enqueued_at) FROM pending').fetchone()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+_journal = None
+_journalLock = threading.Lock()
+
+def journal():
+    global _journal
+    if _journal is None:
+        with _journalLock:
+            if _journal is None:
+                _journal = WriteBehindJournal(current_app.config['WRITE_BEHIND_PATH'])
+    return _journal
+
+def enqueue(model, rows):
+    """Queue validated rows of model; raises WriteBehindFullException when the journal is full."""
+    for row in rows:
+        row.setdefault('id', uuid.uuid4())
+    journal().append(model.__mapper__.polymorphic_identity, rows, current_app.config['WRITE_BEHIND_MAX_PENDING'])
+    return rows
+
+def recordStats():
+    pending, oldest = journal().stats()
+    pendingRows.set(pending)
+    flushLag.set(0 if oldest is None else round(time.time()-oldest, 3))
+
+def flushPending():
+    """Move one batch of journal entries into the database; returns the rows inserted."""
+    entries = journal().peek(current_app.config['WRITE_BEHIND_BATCH_SIZE'])
+    if not entries:
+        recordStats()
+        return 0
+    ids = [row['id'] for _, _, rows in entries for row in rows]
+    existing = {transaction_id for (transaction_id,) in db.session.query(Transaction.id).filter(Transaction.id.in_(ids))}
+    models = {mapper.polymorphic_identity: mapper.class_ for mapper in Transaction.__mapper__.self_and_descendants}
+
+    inserted = 0
+    try:
+        for _, transactionType, rows in entries:
+            rows = [row for row in rows if row['id'] not in existing]
+            insertTransactions(models[transactionType], rows)
+            inserted += len(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    journal().remove([seq for seq, _, _ in entries])
+    flushedRows.inc(inserted)
+    recordStats()
+    return inserted
+
+def runWorker(app, stop):
+    while not stop.is_set():
+        with app.app_context():
+            try:
+                inserted = flushPending()
+            except Exception:
+                flushFailures.inc()
+                logger.exception('Write-behind flush failed, retrying')
+                inserted = 0
+            finally:
+                db.session.remove()
+        if not inserted:
+            stop.wait(app.config['WRITE_BEHIND_FLUSH_INTERVAL'])
+
+def startWorker(app):
+    """Start the background flusher; rows left in the journal by a previous run are replayed first."""
+    stop = threading.Event()
+    thread = threading.Thread(target=runWorker, args=(app, stop), name='write-behind', daemon=True)
+    thread.start()
+    return stop